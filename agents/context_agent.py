@@ -4,6 +4,8 @@ from google.genai import types
 from google.adk.planners import BuiltInPlanner
 
 from config import BASE_DIR, GEMINI_API_KEY, GEMINI_MODEL
+from utils.rate_limiter import throttle_model_call
+from utils.thinking_budget import forget_model_call, record_model_usage, schedule_thinking
 from tools.gmail_tools import GmailToolset
 
 
@@ -53,6 +55,9 @@ def build_context_agent() -> LlmAgent:
         instruction=instruction,
         tools=tools,
         generate_content_config=generate_cfg,
+        before_model_callback=[schedule_thinking, throttle_model_call],
+        after_model_callback=record_model_usage,
+        on_model_error_callback=forget_model_call,
         planner=planner,
     )
 
@@ -1,22 +1,38 @@
+from typing import List, Optional
+
 from google.adk.agents.llm_agent import LlmAgent
 from google.adk.models import Gemini
 from google.genai import types
 from google.adk.planners import BuiltInPlanner
 
 from config import BASE_DIR, GEMINI_API_KEY, GEMINI_MODEL
+from utils.rate_limiter import throttle_model_call
+from utils.thinking_budget import forget_model_call, record_model_usage, schedule_thinking
 
 # NEW: Import only the DelegationToolset. 
 # The specialized tools are now hidden inside the sub-agents.
 from tools.delegation_tools import DelegationToolset
 
+# The mail content is prefetched in code (utils/prefetch.py) and every label is
+# set in code after the run (main.run_triage), so the manager only gets the Gmail
+# tools for drafts (fewer tool declarations means a smaller request on every
+# model turn). gmail_get_thread stays as a fallback for a body the prefetch
+# marked "[...trunkerat]".
+MANAGER_GMAIL_TOOLS = [
+    "gmail_get_thread",
+    "gmail_create_draft_reply",
+    "gmail_reply_draft_exists",
+]
+
 
-def build_email_hub_agent() -> LlmAgent:
+def build_email_hub_agent(gmail_tool_filter: Optional[List[str]] = MANAGER_GMAIL_TOOLS) -> LlmAgent:
     """
     Create the root ADK agent (THE MANAGER).
     It uses DelegationTools to dispatch tasks to:
     - ContextAgent (Research)
     - RadioAgent (Entertainment)
     - CalendarAgent (Booking)
+    gmail_tool_filter limits which Gmail tools the manager sees (None = all of them).
     """
     
     # Load instructions from external file
@@ -65,7 +81,7 @@ def build_email_hub_agent() -> LlmAgent:
     
     tools = [
         DelegationToolset(), # The new superpowers
-        GmailToolset(),      # Needs this to label "AI-Processed" and create drafts
+        GmailToolset(tool_filter=gmail_tool_filter),  # Drafts and labels; reading is prefetched
     ]
 
     planner = BuiltInPlanner(
@@ -81,6 +97,9 @@ def build_email_hub_agent() -> LlmAgent:
         instruction=instruction.strip(),
         tools=tools,
         generate_content_config=generate_cfg,
+        before_model_callback=[schedule_thinking, throttle_model_call],
+        after_model_callback=record_model_usage,
+        on_model_error_callback=forget_model_call,
         planner=planner,
     )
 
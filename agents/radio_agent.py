@@ -3,6 +3,8 @@ from google.adk.models import Gemini
 from google.genai import types
 
 from config import BASE_DIR, GEMINI_API_KEY, GEMINI_MODEL
+from utils.rate_limiter import throttle_model_call
+from utils.thinking_budget import forget_model_call, record_model_usage, schedule_thinking
 from tools.sr_mcp_tools import SrMcpToolset
 
 from google.adk.planners import BuiltInPlanner
@@ -54,6 +56,9 @@ def build_radio_agent() -> LlmAgent:
         instruction=instruction,
         tools=tools,
         generate_content_config=generate_cfg,
+        before_model_callback=[schedule_thinking, throttle_model_call],
+        after_model_callback=record_model_usage,
+        on_model_error_callback=forget_model_call,
         planner=planner,
     )
 
@@ -0,0 +1,136 @@
+import asyncio
+import threading
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional
+
+from google.adk.agents.llm_agent import LlmAgent
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+from utils.cassette import get_cassette, wrap_agent_models
+from utils.tracing import TracingPlugin, get_tracer
+
+# Process-wide cache of built agents and their runners.
+#
+# Building an agent re-reads its instruction file, creates a Gemini client and
+# its toolsets, so it is done once per agent and reused; every task gets its own
+# short-lived session on the shared runner instead (created, run, deleted).
+#
+# An entry is rebuilt when the day changes (the instructions start with today's
+# date) and when it is asked for from another event loop: the model client and
+# MCP toolsets hold loop-bound connections (each one-off asyncio.run is a new
+# loop; the watch daemon keeps one loop, so its agents stay warm). A runner
+# replaced on its own loop (the day changed) is closed first, so its MCP
+# connections, sessions and plugins don't live on for the rest of a watch run;
+# one from an earlier, finished loop can't be awaited and is dropped. With a
+# cassette active (utils/cassette.py) the agents' models are wrapped to record
+# or replay their calls.
+
+
+class _Entry:
+    def __init__(self, runner: InMemoryRunner, day: date, loop: Optional[asyncio.AbstractEventLoop]):
+        self.runner = runner
+        self.day = day
+        self.loop = loop
+
+
+class AgentRegistry:
+    def __init__(self):
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.reuses = 0
+
+    async def runner(
+        self, name: str, builder: Callable[[], LlmAgent], app_name: Optional[str] = None
+    ) -> InMemoryRunner:
+        """The shared runner for `name`, building the agent with `builder` if needed."""
+        today = date.today()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            old = self._entries.get(name)
+            if old is not None and old.day == today and old.loop is loop:
+                self.reuses += 1
+                return old.runner
+            if old is not None:
+                del self._entries[name]
+        if old is not None and old.loop is loop:
+            await self._close(old)
+        with self._lock:
+            # Another task may have built it while the old runner was closing.
+            entry = self._entries.get(name)
+            if entry is not None and entry.day == today and entry.loop is loop:
+                self.reuses += 1
+                return entry.runner
+            agent = builder()
+            cassette = get_cassette()
+            if cassette is not None:
+                wrap_agent_models(agent, cassette)
+            plugins = [TracingPlugin()] if get_tracer().enabled else []
+            runner = InMemoryRunner(agent=agent, app_name=app_name or name, plugins=plugins)
+            self._entries[name] = _Entry(runner, today, loop)
+            self.builds += 1
+            return runner
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """Drop one cached agent (or all), e.g. after editing an instruction file."""
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+    async def aclose(self) -> None:
+        """Close the runners built on the running loop (MCP connections etc.) and drop all entries."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            if entry.loop is loop:
+                await self._close(entry)
+
+    @staticmethod
+    async def _close(entry: _Entry) -> None:
+        try:
+            await entry.runner.close()
+        except Exception as e:
+            print(f"⚠️ Kunde inte stänga agenten {entry.runner.app_name}: {e}")
+
+    async def run_task(
+        self, name: str, builder: Callable[[], LlmAgent], prompt: str, user_id: str = "delegation"
+    ) -> List[Any]:
+        """Run `prompt` in a fresh session on the shared runner. Returns the events."""
+        runner = await self.runner(name, builder)
+        session = await runner.session_service.create_session(app_name=runner.app_name, user_id=user_id)
+        events: List[Any] = []
+        try:
+            async for event in runner.run_async(
+                user_id=user_id,
+                session_id=session.id,
+                new_message=types.Content(role="user", parts=[types.Part(text=prompt)]),
+            ):
+                events.append(event)
+        finally:
+            # Sessions are single-use; don't let the in-memory service grow per task.
+            await runner.session_service.delete_session(
+                app_name=runner.app_name, user_id=user_id, session_id=session.id
+            )
+        return events
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"agents": len(self._entries), "builds": self.builds, "reuses": self.reuses}
+
+
+_registry: Optional[AgentRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_agent_registry() -> AgentRegistry:
+    """Return the process-wide agent registry."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = AgentRegistry()
+        return _registry
@@ -1,13 +1,36 @@
 import json
+import sys
+import threading
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional
 
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 
-from config import APP_NAME, CREDENTIALS_FILE, PROFILES, SCOPES, TOKEN_FILE
+from config import (
+    APP_NAME,
+    CASSETTE_MODE,
+    CREDENTIALS_FILE,
+    GOOGLE_BACKEND,
+    GOOGLE_HTTP_TIMEOUT,
+    PROFILES,
+    SCOPES,
+    TOKEN_FILE,
+)
+from utils.tracing import TracedHttp
+
+# Process-wide client pool.
+# Credentials are shared per profile (and refreshed under a lock). API clients are
+# kept per thread, because httplib2 connections are not thread-safe; each thread
+# therefore reuses its own keep-alive connection per (profile, API).
+# The fake backend and the cassette are only imported when they are switched on.
+_credentials: Dict[str, Credentials] = {}
+_credentials_lock = threading.Lock()
+_thread_local = threading.local()
+_pool_generation = 0
 
 
 def _load_saved_token(token_file: Path) -> Optional[Credentials]:
@@ -47,16 +70,75 @@ def _get_credentials(profile: str = "default") -> Credentials:
     return creds
 
 
+def _get_shared_credentials(profile: str) -> Credentials:
+    """Return the pooled credentials for a profile, refreshing them on expiry."""
+    with _credentials_lock:
+        creds = _credentials.get(profile)
+        if creds and not creds.valid and creds.refresh_token:
+            creds.refresh(Request())
+        if not creds or not creds.valid:
+            creds = _get_credentials(profile)
+            _credentials[profile] = creds
+        return creds
+
+
+def _get_pooled_service(api: str, version: str, profile: str):
+    clients = getattr(_thread_local, "clients", None)
+    if clients is None or getattr(_thread_local, "generation", None) != _pool_generation:
+        clients = _thread_local.clients = {}
+        _thread_local.generation = _pool_generation
+
+    # Cheap when the token is still valid; refreshes it once for all threads otherwise.
+    creds = _get_shared_credentials(profile)
+    key = (profile, api)
+    service = clients.get(key)
+    if service is None or service._http.credentials is not creds:
+        http = AuthorizedHttp(creds, http=TracedHttp(timeout=GOOGLE_HTTP_TIMEOUT))
+        service = build(api, version, http=http, cache_discovery=False)
+        clients[key] = service
+    return service
+
+
+def reset_service_pool() -> None:
+    """Drop all pooled credentials and clients (e.g. after re-authentication)."""
+    global _pool_generation
+    with _credentials_lock:
+        _credentials.clear()
+        _pool_generation += 1
+
+
+def _get_backend_service(api: str, version: str, profile: str):
+    if GOOGLE_BACKEND == "fake":
+        # In-process stand-in with a generated mailbox/calendar (utils/fake_mailbox.py).
+        from utils.fake_mailbox import get_fake_service
+
+        return get_fake_service(api, profile)
+    return _get_pooled_service(api, version, profile)
+
+
+def _get_service(api: str, version: str, profile: str):
+    # Recording/replaying is on via CASSETTE_MODE or use_cassette() (which imports utils.cassette).
+    if not CASSETTE_MODE and "utils.cassette" not in sys.modules:
+        return _get_backend_service(api, version, profile)
+    from utils.cassette import cassette_service, get_cassette
+
+    cassette = get_cassette()
+    if cassette is None:
+        return _get_backend_service(api, version, profile)
+    if cassette.replaying:
+        # Answered from the cassette: no credentials, no network.
+        return cassette_service(cassette, f"{api}:{profile}")
+    return cassette_service(cassette, f"{api}:{profile}", _get_backend_service(api, version, profile))
+
+
 def get_gmail_service(profile: str = "default"):
-    """Return a Gmail API client with modify scope."""
-    creds = _get_credentials(profile)
-    return build("gmail", "v1", credentials=creds, cache_discovery=False)
+    """Return a pooled Gmail API client with modify scope."""
+    return _get_service("gmail", "v1", profile)
 
 
 def get_calendar_service(profile: str = "default"):
-    """Return a Google Calendar API client."""
-    creds = _get_credentials(profile)
-    return build("calendar", "v3", credentials=creds, cache_discovery=False)
+    """Return a pooled Google Calendar API client."""
+    return _get_service("calendar", "v3", profile)
 
 
 def describe_auth_state() -> dict:
@@ -68,4 +150,5 @@ def describe_auth_state() -> dict:
         "credentials_path": str(CREDENTIALS_FILE),
         "scopes": SCOPES,
         "app_name": APP_NAME,
+        "pooled_profiles": sorted(_credentials),
     }
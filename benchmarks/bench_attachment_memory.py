@@ -0,0 +1,96 @@
+"""
+Benchmark: peak memory (RSS) when extracting text from a large spreadsheet
+attachment, full openpyxl load (the old extractor) vs. the streaming read-only
+extractor. Each run happens in a fresh process so the peaks don't mix.
+
+    python -m benchmarks.bench_attachment_memory --mb 30
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import random
+import resource
+import tempfile
+import time
+
+import openpyxl
+
+from utils.extraction_pool import _extract_xlsx_text
+
+
+def _legacy_xlsx_text(data: bytes, rows: int = 50) -> str:
+    """The pre-streaming extractor: loads the whole workbook to read 50 rows."""
+    wb = openpyxl.load_workbook(io.BytesIO(data), data_only=True)
+    sheet = wb.active
+    text = []
+    for i, row in enumerate(sheet.iter_rows(values_only=True)):
+        if i >= rows: break
+        row_text = "\t".join([str(c) if c is not None else "" for c in row])
+        if row_text.strip():
+            text.append(row_text)
+    return "\n".join(text)
+
+
+_EXTRACTORS = {"full load": _legacy_xlsx_text, "streaming": _extract_xlsx_text}
+
+
+def _write_xlsx(path: str, target_mb: int) -> None:
+    rng = random.Random(7)
+
+    def row(i):
+        return [f"2025-10-{i % 28 + 1:02d}", f"Aktivitet {i}", rng.random() * 1000, f"{rng.getrandbits(64):016x}"]
+
+    # Calibrate rows per MB on a small sample, then write the real file in write-only mode.
+    sample = io.BytesIO()
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Blad1")
+    for i in range(20_000):
+        ws.append(row(i))
+    wb.save(sample)
+    rows = int(20_000 * target_mb * 2**20 / len(sample.getvalue()))
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Blad1")
+    for i in range(rows):
+        ws.append(row(i))
+    wb.save(path)
+
+
+def _measure(name: str, path: str, queue) -> None:
+    with open(path, "rb") as f:
+        data = f.read()
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    text = _EXTRACTORS[name](data)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux.
+    queue.put((peak, peak - baseline, elapsed, len(text)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mb", type=int, default=30, help="Approximate spreadsheet size in MB.")
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "stor.xlsx")
+        start = time.perf_counter()
+        _write_xlsx(path, args.mb)
+        size_mb = os.path.getsize(path) / 2**20
+        print(f"Built {size_mb:.1f} MB spreadsheet in {time.perf_counter() - start:.0f}s\n")
+
+        print(f"{'extractor':<10} {'peak RSS':>10} {'growth':>10} {'time':>8} {'chars':>6}")
+        for name in _EXTRACTORS:
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_measure, args=(name, path, queue))
+            proc.start()
+            peak, growth, elapsed, chars = queue.get()
+            proc.join()
+            print(f"{name:<10} {peak / 1024:>8.0f}MB {growth / 1024:>8.0f}MB {elapsed:>7.2f}s {chars:>6}")
+
+
+if __name__ == "__main__":
+    main()
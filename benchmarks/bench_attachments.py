@@ -0,0 +1,119 @@
+"""
+Benchmark: reading one message with 10 mixed PDF/DOCX/XLSX attachments.
+
+Compares the old inline loop (download + parse one file at a time) with the
+extraction pool, then re-reads the message to show the attachment cache.
+
+    python -m benchmarks.bench_attachments --latency 0.1
+"""
+import argparse
+import base64
+import io
+import tempfile
+import time
+from pathlib import Path
+
+import docx
+import openpyxl
+
+import auth.google_auth as google_auth
+import utils.attachment_cache as attachment_cache
+from config import ATTACHMENT_CPU_WORKERS
+from tools.gmail_tools import _decode_body
+from utils.extraction_pool import _extract_attachment_text, get_extraction_pool
+from utils.fake_google import FakeGmailService, make_message, make_pdf
+
+_MIME = {
+    ".pdf": "application/pdf",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def _make_docx(paragraphs: int) -> bytes:
+    doc = docx.Document()
+    for i in range(paragraphs):
+        doc.add_paragraph(f"Stycke {i}: information om höstterminens aktiviteter och tider.")
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+def _make_xlsx(rows: int) -> bytes:
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Blad1")
+    for i in range(rows):
+        ws.append([f"2025-10-{i % 28 + 1:02d}", f"Aktivitet {i}", i * 10, "Ekbacken"])
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def _build_message(service: FakeGmailService) -> dict:
+    msg = make_message(1, subject="Schema och inbjudan")
+    files = [
+        ("schema.pdf", make_pdf([f"Vecka {i}: träning kl 17" for i in range(40)])),
+        ("inbjudan.pdf", make_pdf(["Välkommen på kalas!", "Lördag 14:00"])),
+        ("faktura.pdf", make_pdf([f"Rad {i}: 149 kr" for i in range(30)])),
+        ("meny.pdf", make_pdf(["Måndag: pasta", "Tisdag: fisk"])),
+        ("info.docx", _make_docx(200)),
+        ("protokoll.docx", _make_docx(60)),
+        ("brev.docx", _make_docx(10)),
+        ("tider.xlsx", _make_xlsx(5000)),
+        ("lista.xlsx", _make_xlsx(300)),
+        ("budget.xlsx", _make_xlsx(50)),
+    ]
+    for name, data in files:
+        service.add_attachment(msg, name, _MIME[Path(name).suffix], data)
+    return msg
+
+
+def _inline_decode(service: FakeGmailService, msg: dict) -> None:
+    """The pre-pool behaviour: each attachment downloaded and parsed in turn."""
+    for part in msg["payload"]["parts"]:
+        if not part.get("filename"):
+            continue
+        att = service.users().messages().attachments().get(
+            userId="me", messageId=msg["id"], id=part["body"]["attachmentId"]
+        ).execute()
+        _extract_attachment_text(part["filename"].lower(), base64.urlsafe_b64decode(att["data"]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.1, help="Simulated seconds per attachment download.")
+    args = parser.parse_args()
+
+    service = FakeGmailService([], latency=args.latency)
+    msg = _build_message(service)
+    google_auth.get_gmail_service = lambda profile="default": service
+
+    with tempfile.TemporaryDirectory() as tmp:
+        attachment_cache._cache = attachment_cache.AttachmentCache(path=Path(tmp) / "cache.sqlite")
+
+        start = time.perf_counter()
+        _inline_decode(service, msg)
+        inline = time.perf_counter() - start
+
+        start = time.perf_counter()
+        get_extraction_pool().warm(ATTACHMENT_CPU_WORKERS)
+        warmup = time.perf_counter() - start
+
+        start = time.perf_counter()
+        cold = _decode_body(msg["payload"], service=service, message_id=msg["id"])
+        pooled = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _decode_body(msg["payload"], service=service, message_id=msg["id"])
+        cached = time.perf_counter() - start
+
+        print(f"inline sequential: {inline:.2f}s")
+        print(f"pool warm-up:      {warmup:.2f}s ({ATTACHMENT_CPU_WORKERS} workers, once per process)")
+        print(f"extraction pool:   {pooled:.2f}s ({inline / pooled:.1f}x)")
+        print(f"cached re-read:    {cached * 1000:.1f}ms")
+        print(f"extracted chars:   {len(cold['text'])}")
+        print(f"cache stats:       {attachment_cache._cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
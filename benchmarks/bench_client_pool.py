@@ -0,0 +1,66 @@
+"""
+Benchmark: building a Gmail client per call vs. the pooled client in auth.google_auth.
+
+Uses a throwaway token file with a far-future expiry, so nothing hits the network
+(discovery documents are bundled with google-api-python-client).
+
+    python -m benchmarks.bench_client_pool --calls 50
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from googleapiclient.discovery import build
+
+import auth.google_auth as google_auth
+
+
+def _write_fake_token(path: Path) -> None:
+    path.write_text(
+        json.dumps(
+            {
+                "token": "bench-token",
+                "refresh_token": "bench-refresh",
+                "client_id": "bench.apps.googleusercontent.com",
+                "client_secret": "bench-secret",
+                "expiry": "2099-01-01T00:00:00Z",
+            }
+        ),
+        encoding="utf-8",
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=50, help="Service lookups per variant.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        token_path = Path(tmp) / "bench_token.json"
+        _write_fake_token(token_path)
+        google_auth.PROFILES["bench"] = token_path
+
+        # Old behaviour: read token + build a discovery client on every call.
+        start = time.perf_counter()
+        for _ in range(args.calls):
+            build("gmail", "v1", credentials=google_auth._get_credentials("bench"), cache_discovery=False)
+        uncached_total = time.perf_counter() - start
+
+        google_auth.reset_service_pool()
+        start = time.perf_counter()
+        google_auth.get_gmail_service("bench")
+        pooled_startup = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(args.calls):
+            google_auth.get_gmail_service("bench")
+        pooled_per_call = (time.perf_counter() - start) / args.calls
+
+    print(f"uncached: {uncached_total / args.calls * 1000:.2f} ms per call")
+    print(f"pooled:   {pooled_startup * 1000:.2f} ms startup, {pooled_per_call * 1000:.3f} ms per call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark: a day's worth of delegations (research and radio questions, many of
+them repeats differing only in case and punctuation) with and without the
+delegation cache.
+
+Sub-agent runs are simulated with a fixed latency; the cache lives in a temp dir.
+
+    python -m benchmarks.bench_delegation_cache --agent-latency 3
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from google.adk.events import Event
+from google.genai import types
+
+import tools.delegation_tools as delegation_tools
+from utils.delegation_cache import DelegationCache
+
+_RESEARCH = [
+    ["Vad sa skolan om utflykten till Skansen?", "vad sa skolan om utflykten till Skansen", "Vad sa skolan om utflykten till skansen ?"],
+    ["När var vi i London senast?", "när var vi i london senast"],
+    ["Vem är Karin Lund?", "vem är karin lund", "Vem är Karin Lund"],
+    ["Vad kostade hotellet i Visby 2023?"],
+    ["Fotbollsträningens tider i höst", "Fotbollsträningens tider i höst?"],
+]
+_RADIO = [
+    ["Vad spelas på P3 just nu?", "vad spelas på p3 just nu", "Vad spelas på P3 just nu"],
+    ["Krimpoddar för bilresan", "krimpoddar för bilresan!"],
+    ["Nyheter från Ekot idag"],
+]
+
+
+class _FakeRegistry:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.runs = 0
+
+    async def run_task(self, name, builder, prompt, user_id="delegation"):
+        self.runs += 1
+        await asyncio.sleep(self.latency)
+        answer = f"Svar ({name}) på: {prompt[:40]}"
+        return [Event(author=name, content=types.Content(role="model", parts=[types.Part(text=answer)]))]
+
+
+async def _workload(toolset, calls):
+    samples = []
+    for kind, query in calls:
+        start = time.perf_counter()
+        if kind == "research":
+            await toolset.ask_researcher(query)
+        else:
+            await toolset.ask_radio_expert(query)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=60)
+    parser.add_argument("--agent-latency", type=float, default=3.0, help="Simulated seconds per sub-agent run.")
+    args = parser.parse_args()
+
+    rng = random.Random(20)
+    calls = []
+    for _ in range(args.calls):
+        kind, groups = rng.choice([("research", _RESEARCH), ("research", _RESEARCH), ("radio", _RADIO)])
+        calls.append((kind, rng.choice(rng.choice(groups))))
+
+    # Keep the benchmark output to the table.
+    delegation_tools.print = lambda *a, **k: None
+    toolset = delegation_tools.DelegationToolset()
+    print(f"{'cache':<6} {'agent runs':>10} {'total':>8} {'p50':>9} {'p95':>9} {'hits':>5}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, ttl in (("off", {}), ("on", {"research": 86400, "radio": 300})):
+            registry = _FakeRegistry(args.agent_latency)
+            cache = DelegationCache(path=Path(tmp) / f"{label}.sqlite", ttl=ttl)
+            delegation_tools.get_agent_registry = lambda: registry
+            delegation_tools.get_delegation_cache = lambda: cache
+            samples = asyncio.run(_workload(toolset, calls))
+            samples.sort()
+            print(
+                f"{label:<6} {registry.runs:>10} {sum(samples) / 1000:>7.1f}s {statistics.median(samples):>7.2f}ms "
+                f"{samples[int(0.95 * (len(samples) - 1))]:>7.1f}ms {cache.hits:>5}"
+            )
+        hit_ms = []
+        for kind, query in calls[:20]:
+            start = time.perf_counter()
+            cache.lookup(kind, query)
+            hit_ms.append((time.perf_counter() - start) * 1000)
+        print(f"\ncache lookup: {statistics.median(hit_ms):.2f}ms p50")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark: per-delegation setup cost when every task builds its sub-agent and
+InMemoryRunner from scratch (the old _run_agent_task) vs. the shared agent
+registry, which builds once and only creates a fresh session per task.
+
+The real context and calendar agent builders are used. Each build also creates
+the Gemini API client (which a real delegation does on its first model call), then
+the model is swapped for one that answers immediately, so the numbers are setup
+and framework overhead only. Not measured: the new TLS connection a fresh client
+opens to the API on every old-style delegation.
+
+    python -m benchmarks.bench_delegation_setup --tasks 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import AsyncGenerator
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+from agents.calendar_agent import build_calendar_agent
+from agents.context_agent import build_context_agent
+import utils.rate_limiter as rate_limiter
+from agents.registry import AgentRegistry
+
+
+class InstantLlm(BaseLlm):
+    model: str = "instant"
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text="Inget hittat.")]))
+
+
+def _instant(builder):
+    def build():
+        agent = builder()
+        agent.model.api_client  # created lazily on the first real model call
+        agent.model = InstantLlm()
+        return agent
+
+    build.__name__ = builder.__name__
+    return build
+
+
+async def _old(builder, prompt: str) -> None:
+    runner = InMemoryRunner(agent=builder())
+    await runner.run_debug(prompt, quiet=True)
+
+
+async def _bench(tasks: int) -> None:
+    rate_limiter._limiter = rate_limiter.RateLimiter(0)  # unlimited: measure setup only
+    registry = AgentRegistry()
+    print(f"{'agent':<22} {'old p50':>8} {'old mean':>9} {'registry p50':>13} {'registry mean':>14}")
+    for builder in (_instant(build_context_agent), _instant(build_calendar_agent)):
+        results = {}
+        for label, run in (
+            ("old", lambda i: _old(builder, f"Uppdrag {i}")),
+            ("registry", lambda i: registry.run_task(builder.__name__, builder, f"Uppdrag {i}")),
+        ):
+            samples = []
+            for i in range(tasks):
+                start = time.perf_counter()
+                await run(i)
+                samples.append((time.perf_counter() - start) * 1000)
+            results[label] = samples
+        print(
+            f"{builder.__name__:<22} {statistics.median(results['old']):>6.2f}ms {statistics.mean(results['old']):>7.2f}ms "
+            f"{statistics.median(results['registry']):>11.2f}ms {statistics.mean(results['registry']):>12.2f}ms"
+        )
+    print(f"\nregistry: {registry.stats()}")
+
+
+def main() -> None:
+    os.environ.setdefault("GOOGLE_API_KEY", "bench")
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(_bench(args.tasks))
+
+
+if __name__ == "__main__":
+    main()
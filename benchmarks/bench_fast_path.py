@@ -0,0 +1,99 @@
+"""
+Benchmark: the rule-based fast path (utils/triage_rules.py) over a mixed inbox.
+
+Generates newsletters, receipts, notifications and personal mail, classifies the
+whole batch from one batched metadata fetch, and reports the hit rate per kind,
+personal mail wrongly taken off the agent path, and the model calls avoided. A
+second batch has newsletter senders mailing without list headers, which only
+the sender history catches.
+
+    python -m benchmarks.bench_fast_path --mails 200 --turns-per-mail 2
+"""
+import argparse
+import random
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from utils.fake_google import FakeGmailService, make_message
+from utils.triage_rules import FastPathClassifier
+
+_SHOPS = ["webhallen.se", "apotea.se", "sj.se", "ikea.se"]
+_LISTS = ["nyheter.dn.se", "news.spotify.com", "info.ica.se", "utskick.skolan.se"]
+
+
+def _mail(i: int, kind: str, rng: random.Random) -> dict:
+    if kind == "nyhetsbrev":
+        domain = rng.choice(_LISTS)
+        return make_message(
+            i, f"Veckans nyheter {i}", f"Nyhetsbrev <info@{domain}>",
+            headers={"List-Unsubscribe": f"<mailto:unsub@{domain}>", "Precedence": "bulk"},
+        )
+    if kind == "kvitto":
+        return make_message(i, f"Orderbekräftelse #{1000 + i}", f"Kundservice <no-reply@{rng.choice(_SHOPS)}>")
+    if kind == "notis":
+        return make_message(i, f"Du har ett nytt meddelande ({i})", "Tjänsten <no-reply@tjanst.se>")
+    name = rng.choice(["anna", "erik", "lisa", "johan"])
+    subject = rng.choice([
+        "Middag på lördag?", "Frågor om utvecklingssamtalet", "Re: Semesterplaner", "Hämtning idag",
+        # Receipt words from a person: must still reach the agent.
+        "Re: Fråga om fakturan till kunden – kan du svara idag?", "Invoice dispute – need your input",
+    ])
+    return make_message(i, subject, f"{name.title()} <{name}@example.com>")
+
+
+def _run(classifier: FastPathClassifier, service: FakeGmailService, kinds: dict, turns_per_mail: float) -> None:
+    ids = [m["id"] for m in service.messages]
+    start = time.perf_counter()
+    decisions, agent_ids = classifier.classify_batch(service, ids)
+    elapsed = time.perf_counter() - start
+
+    hits = Counter(kinds[mid] for mid in decisions)
+    totals = Counter(kinds.values())
+    for kind in sorted(totals):
+        print(f"  {kind:<11} {hits[kind]:>4}/{totals[kind]:<4} fast path")
+    rules = Counter(d["rule"] for d in decisions.values())
+    print(f"  rules: {dict(rules)}")
+    print(
+        f"  hit rate {len(decisions) / len(ids):.0%}, {len(agent_ids)} mails left for the agent, "
+        f"~{round(turns_per_mail * len(decisions))} model calls avoided, "
+        f"personal mail misclassified: {hits['personligt']}, classified in {elapsed * 1000:.0f}ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mails", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per Gmail round trip.")
+    parser.add_argument("--turns-per-mail", type=float, default=2, help="Model turns a mail costs on the agent path.")
+    args = parser.parse_args()
+
+    rng = random.Random(19)
+    weights = {"nyhetsbrev": 4, "kvitto": 2, "notis": 2, "personligt": 3}
+    kinds = {}
+    messages = []
+    for i in range(args.mails):
+        kind = rng.choices(list(weights), weights=list(weights.values()))[0]
+        msg = _mail(i, kind, rng)
+        kinds[msg["id"]] = kind
+        messages.append(msg)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        classifier = FastPathClassifier(history_path=Path(tmp) / "sender_history.json")
+        print(f"batch 1: {args.mails} mails")
+        _run(classifier, FakeGmailService(messages, latency=args.latency), kinds, args.turns_per_mail)
+
+        # The same list senders, now without List-Unsubscribe/Precedence (e.g. a transactional mail).
+        followups = {}
+        second = []
+        for n, domain in enumerate(_LISTS):
+            msg = make_message(args.mails + n, "Bekräfta din prenumeration", f"Nyhetsbrev <info@{domain}>")
+            followups[msg["id"]] = "nyhetsbrev"
+            second.append(msg)
+        print(f"\nbatch 2: {len(second)} list senders without list headers")
+        _run(classifier, FakeGmailService(second, latency=args.latency), followups, args.turns_per_mail)
+
+
+if __name__ == "__main__":
+    main()
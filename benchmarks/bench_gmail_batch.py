@@ -0,0 +1,51 @@
+"""
+Benchmark: sequential messages.get vs. batched metadata fetch in GmailToolset.
+
+Run from the repo root:
+    python -m benchmarks.bench_gmail_batch --latency 0.05
+"""
+import argparse
+import time
+
+import tools.gmail_tools as gmail_tools
+from utils.fake_google import FakeGmailService, make_message
+
+
+def _sequential_list_unread(service, limit: int) -> list:
+    """The pre-batch request pattern: one list call plus one get per id."""
+    resp = service.users().messages().list(userId="me", maxResults=limit).execute()
+    return [
+        service.users()
+        .messages()
+        .get(userId="me", id=ref["id"], format="metadata", metadataHeaders=gmail_tools.LIST_METADATA_HEADERS)
+        .execute()
+        for ref in resp.get("messages", [])
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per HTTP round trip.")
+    args = parser.parse_args()
+
+    service = FakeGmailService([make_message(i) for i in range(200)], latency=args.latency)
+    gmail_tools.get_gmail_service = lambda profile="default": service
+    toolset = gmail_tools.GmailToolset()
+
+    print(f"{'results':>8} {'sequential':>12} {'batched':>10} {'speedup':>8} {'roundtrips':>11}")
+    for n in (10, 50, 200):
+        start = time.perf_counter()
+        _sequential_list_unread(service, n)
+        sequential = time.perf_counter() - start
+
+        service.roundtrips = 0
+        start = time.perf_counter()
+        items = toolset.gmail_list_unread(limit=n)
+        batched = time.perf_counter() - start
+        assert len(items) == n
+
+        print(f"{n:>8} {sequential:>11.3f}s {batched:>9.3f}s {sequential / batched:>7.1f}x {service.roundtrips:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark: per-message payload for HTML-only mail, raw HTML (what the agents got
+before) vs. the converted text body. Messages are synthetic newsletters and school
+notices built like the real thing: nested layout tables, inline CSS, hidden
+preheaders, tracking pixels and utm-tagged links.
+
+Tokens are estimated as characters / 4.
+
+    python -m benchmarks.bench_html_to_text --messages 200
+"""
+import argparse
+import json
+import random
+import time
+
+from benchmarks.bench_quote_stripping import estimate_tokens
+from tools.gmail_tools import _decode_body
+from utils.fake_google import make_message
+from utils.html_to_text import html_to_text
+
+_CSS = "font-family:Helvetica,Arial,sans-serif;font-size:16px;line-height:24px;color:#333333;padding:0 24px;"
+_PARAGRAPHS = [
+    "Nu är höstlovet nära och vi vill påminna om att fritids har öppet som vanligt.",
+    "Missa inte vår höstrea: upp till 50% på utvalda produkter hela veckan.",
+    "Föräldramöte hålls torsdag 23/10 kl 18.00 i matsalen. Anmäl dig senast måndag.",
+    "Your October statement is ready. Log in to see your balance and recent activity.",
+    "Tack för din beställning! Vi skickar ett nytt mejl när paketet har lämnat lagret.",
+    "Glöm inte att märka ytterkläder och stövlar med barnets namn.",
+]
+
+
+def _newsletter(rng: random.Random, n: int) -> str:
+    sections = []
+    for i in range(rng.randint(3, 8)):
+        link = f"https://news.example.com/artikel/{n}-{i}?utm_source=newsletter&utm_medium=email&utm_campaign=v42&mc_eid={rng.getrandbits(40):x}"
+        sections.append(
+            f'<tr><td class="section" style="{_CSS}">'
+            f'<table role="presentation" width="100%" cellpadding="0" cellspacing="0" border="0"><tr><td style="{_CSS}">'
+            f'<h2 style="margin:0;font-size:20px;{_CSS}">Rubrik {i}</h2>'
+            f'<p style="{_CSS}">{rng.choice(_PARAGRAPHS)} {rng.choice(_PARAGRAPHS)}</p>'
+            f'<a href="{link}" style="background:#0055aa;color:#fff;border-radius:4px;padding:12px 20px;text-decoration:none">Läs mer</a>'
+            f"</td></tr></table></td></tr>"
+        )
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>Nyhetsbrev</title>'
+        "<style>@media only screen and (max-width:600px){.section{padding:0 12px!important}}"
+        + "".join(f".c{i}{{margin:0;padding:{i}px;}}" for i in range(40))
+        + "</style></head><body style=\"margin:0;padding:0;background:#f4f4f4\">"
+        '<div style="display:none;max-height:0;overflow:hidden">Veckans nyheter &zwnj;&nbsp;&zwnj;&nbsp;&zwnj;&nbsp;</div>'
+        '<table role="presentation" width="100%" cellpadding="0" cellspacing="0" border="0" style="max-width:600px">'
+        + "".join(sections)
+        + f'<tr><td style="{_CSS}font-size:12px">Du får detta mejl för att du prenumererar. '
+        f'<a href="https://news.example.com/unsubscribe?u={rng.getrandbits(128):x}&utm_source=newsletter">Avregistrera</a></td></tr>'
+        f'</table><img src="https://track.example.com/open/{rng.getrandbits(128):x}.gif" width="1" height="1" alt="" style="display:block">'
+        "</body></html>"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    messages = [make_message(i, body=_newsletter(rng, i), mime_type="text/html") for i in range(args.messages)]
+
+    raw_tokens, text_tokens = [], []
+    html_bytes = 0
+    start = time.perf_counter()
+    for msg in messages:
+        before = _decode_body(msg["payload"], include_html=True)
+        before["text"] = ""  # pre-fallback behaviour: empty text, raw html
+        after = _decode_body(msg["payload"])
+        raw_tokens.append(estimate_tokens(json.dumps(before, ensure_ascii=False)))
+        text_tokens.append(estimate_tokens(json.dumps(after, ensure_ascii=False)))
+        html_bytes += len(before["html"])
+    elapsed = time.perf_counter() - start
+
+    convert_start = time.perf_counter()
+    for msg in messages:
+        html_to_text(_decode_body(msg["payload"], include_html=True)["html"])
+    convert = time.perf_counter() - convert_start
+
+    savings = sorted(1 - t / r for r, t in zip(raw_tokens, text_tokens))
+    print(f"messages:               {len(messages)}")
+    print(f"tokens per message:     {sum(raw_tokens) / len(messages):.0f} raw html -> {sum(text_tokens) / len(messages):.0f} text")
+    print(f"per-message savings:    min {savings[0]:.0%}, median {savings[len(savings) // 2]:.0%}, max {savings[-1]:.0%}")
+    print(f"conversion throughput:  {html_bytes / 2**20 / convert:.1f} MB/s ({convert / len(messages) * 1000:.2f}ms per message)")
+    print(f"total decode time:      {elapsed:.2f}s")
+    print(f"\nexample:\n{_decode_body(messages[0]['payload'])['text'][:600]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Benchmark: the Gmail and Calendar toolsets against large generated accounts on
+the fake Google backend (GOOGLE_BACKEND=fake, utils/fake_mailbox.py).
+
+Generates a mailbox of --messages mails with --drafts reply drafts and threads
+of up to --thread messages with attachments, plus two calendars, and times each
+tool operation: wall time, HTTP round trips, API calls and Gmail quota units. A
+second pass runs the same operations under a per-user quota (--quota units/s,
+Gmail allows 250) with random 503s (--error-rate) and counts what failed; the
+concurrent prefetch is the one that bursts past the quota.
+
+    python -m benchmarks.bench_mailbox_scale --messages 100000 --drafts 500 --latency 0.05
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+_TMP = tempfile.TemporaryDirectory()
+os.environ["GOOGLE_BACKEND"] = "fake"
+# Keep the benchmark's traces, caches and mirrors out of the working tree.
+for _name, _value in {
+    "TRACE_DIR": "traces",
+    "MESSAGE_STORE_DIR": "message_store",
+    "ATTACHMENT_CACHE_FILE": "attachments.sqlite",
+}.items():
+    os.environ[_name] = str(Path(_TMP.name) / _value)
+
+import utils.draft_index as draft_index
+import utils.label_registry as label_registry
+import utils.mailbox_sync as mailbox_sync
+from config import UNREAD_TRIAGE_QUERY
+from tools.calendar_tools import CalendarToolset
+from tools.gmail_tools import ATTACHMENT_MARKER, GmailToolset
+from utils.fake_google import make_message
+from utils.fake_mailbox import generate_calendar, generate_mailbox, set_fake_service
+from utils.prefetch import prefetch_batch
+
+
+def _operations(gmail, calendars) -> List[Tuple[str, Callable[[], str]]]:
+    """(name, run) per operation; run returns a short description of the result."""
+    tools, calendar_tools = GmailToolset(), CalendarToolset()
+    thread_id, thread = max(
+        ((tid, msgs) for tid, msgs in gmail.threads.items() if any("att-" in str(m["payload"]) for m in msgs)),
+        key=lambda item: len(item[1]),
+    )
+    replied = {d["message"]["threadId"] for d in gmail.drafts}
+    reply_to = next(m for m in gmail.messages if "INBOX" in m["labelIds"] and m["threadId"] not in replied)
+    inbox = [m["id"] for m in gmail.search("in:inbox")[:1000]]
+    now = datetime.now(timezone.utc)
+    week = (now.isoformat(), (now + timedelta(days=7)).isoformat())
+    sync = mailbox_sync.MailboxSync()
+
+    def get_thread() -> str:
+        result = tools._get_thread(thread[-1]["id"], thread_id=thread_id, max_messages=len(thread))
+        if "error" in result:
+            return result["error"]
+        attachments = sum(m["body"]["text"].count(ATTACHMENT_MARKER) for m in result["thread"])
+        return f"{len(result['thread'])} messages, {attachments} attachments"
+
+    def prefetch() -> str:
+        ids = [m["id"] for m in gmail.search(UNREAD_TRIAGE_QUERY)[:50]]
+        items = asyncio.run(prefetch_batch(ids))
+        return f"{len(items)} threads, {sum('error' in i for i in items)} failed"
+
+    def build_drafts() -> str:
+        return f"{draft_index.get_draft_index('default').build(gmail)} drafts"
+
+    def create_draft() -> str:
+        result = tools.gmail_create_draft_reply(reply_to["id"], "Tack, det låter bra!")
+        return "exists" if result.get("already_exists") else f"draft {result.get('draft_id')}"
+
+    def check_draft() -> str:
+        index = draft_index.get_draft_index("default")
+        index._last_refresh = 0  # force a history replay
+        return f"has_draft={index.has_draft(gmail, reply_to['threadId'])}"
+
+    def label_bulk() -> str:
+        result = tools.gmail_apply_labels_bulk(inbox, "Arkiv/Skala")
+        return f"{result['labeled']} labelled, {len(result['failed'])} failed"
+
+    def poll() -> str:
+        sync.state = {}
+        seeded = len(sync.poll("default"))
+        for n in range(20):
+            msg = make_message(0, subject=f"Nytt mail {n}", body="Hej! Hinner du titta på det här idag?")
+            msg["id"] = msg["threadId"] = gmail.new_message_id()
+            msg["internalDate"] = str(gmail.clock_ms())
+            gmail.deliver(msg)
+        return f"seed {seeded}, delta {len(sync.poll('default'))}"
+
+    def create_event() -> str:
+        start = now + timedelta(days=2)
+        created = calendar_tools.calendar_create_event("Skalningstest", start.isoformat(), (start + timedelta(hours=1)).isoformat())
+        return calendar_tools.calendar_delete_event(created["event_id"])["status"]
+
+    def freebusy() -> str:
+        resp = calendars["family"].freebusy().query(
+            body={"timeMin": week[0], "timeMax": week[1], "items": [{"id": "primary"}]}
+        ).execute()
+        return f"{len(resp['calendars']['primary'].get('busy', []))} busy spans"
+
+    return [
+        ("gmail_list_unread(25)", lambda: f"{len(tools.gmail_list_unread(limit=25))} mails"),
+        ("gmail_search('faktura')", lambda: f"{len(tools.gmail_search('faktura', limit=20, profiles=['default']))} hits"),
+        ("get_thread (longest)", get_thread),
+        ("prefetch_batch(50)", prefetch),
+        ("draft index build", build_drafts),
+        ("gmail_create_draft_reply", create_draft),
+        ("draft check (history)", check_draft),
+        (f"labels_bulk({len(inbox)})", label_bulk),
+        ("poll seed + 20 new", poll),
+        ("calendar_list_events", lambda: f"{len(calendar_tools.calendar_list_events(*week, max_results=50))} events"),
+        ("create + delete event", create_event),
+        ("freebusy (7 days)", freebusy),
+    ]
+
+
+def _run(gmail, calendars) -> None:
+    backends = [gmail, *calendars.values()]
+    print(f"{'operation':<26} {'ms':>8} {'trips':>6} {'calls':>6} {'units':>6} {'quota':>6} {'5xx':>4}  result")
+    for name, run in _operations(gmail, calendars):
+        before = [b.stats() for b in backends]
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = run()
+        except Exception as e:
+            result = f"raised {type(e).__name__}: {str(e)[:60]}"
+        elapsed = (time.perf_counter() - start) * 1000
+        delta = {k: sum(b.stats()[k] - s[k] for b, s in zip(backends, before)) for k in before[0]}
+        print(
+            f"{name:<26} {elapsed:>8.1f} {delta['roundtrips']:>6} {delta['calls']:>6} {delta['quota_units']:>6} "
+            f"{delta['quota_errors']:>6} {delta['server_errors']:>4}  {result}"
+        )
+
+
+def _fresh_state(tag: str) -> None:
+    tmp = Path(_TMP.name)
+    label_registry._registry = label_registry.LabelRegistry(path=tmp / f"labels-{tag}.json")
+    mailbox_sync.SYNC_STATE_FILE = tmp / f"sync-{tag}.json"
+    draft_index._indexes.clear()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=100_000, help="Mails in the generated mailbox.")
+    parser.add_argument("--drafts", type=int, default=500, help="Reply drafts in the mailbox.")
+    parser.add_argument("--thread", type=int, default=40, help="Longest thread (messages).")
+    parser.add_argument("--events", type=int, default=2000, help="Events per calendar.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per HTTP round trip.")
+    parser.add_argument("--quota", type=float, default=250, help="Quota units per second in the second pass.")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="Share of calls answered with 503 in the second pass.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    gmail = generate_mailbox(args.messages, args.drafts, max_thread=args.thread, latency=args.latency)
+    calendars = {
+        profile: generate_calendar(args.events, days=365, seed=seed, latency=args.latency)
+        for seed, profile in enumerate(["default", "family"])
+    }
+    print(
+        f"generated {len(gmail.messages)} mails in {len(gmail.threads)} threads, {len(gmail.drafts)} drafts, "
+        f"{len(gmail.attachments)} attachments, {args.events} events x2 in {time.perf_counter() - start:.1f}s\n"
+    )
+    set_fake_service("gmail", "default", gmail)
+    for profile, calendar in calendars.items():
+        set_fake_service("calendar", profile, calendar)
+
+    # Search indexes the mailbox lazily; warm it up so the first row doesn't pay for it.
+    gmail.search("warmup")
+    print(f"unlimited quota, latency {args.latency * 1000:.0f} ms")
+    _fresh_state("unlimited")
+    _run(gmail, calendars)
+
+    print(f"\nquota {args.quota:g} units/s, {args.error_rate:.0%} 503s")
+    for backend in [gmail, *calendars.values()]:
+        backend.quota_per_second, backend.error_rate = args.quota, args.error_rate
+    _fresh_state("quota")
+    _run(gmail, calendars)
+
+
+if __name__ == "__main__":
+    main()
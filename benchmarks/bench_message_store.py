@@ -0,0 +1,86 @@
+"""
+Benchmark: gmail_search-style queries against the local SQLite/FTS5 message store
+on a synthetic mailbox.
+
+    python -m benchmarks.bench_message_store --messages 100000
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from utils.message_store import MessageStore
+
+_SENDERS = [
+    "Skolan Ekbacken <info@ekbacken.se>",
+    "Anna Lindqvist <anna.lindqvist@gmail.com>",
+    "SJ <no-reply@sj.se>",
+    "Klarna <noreply@klarna.com>",
+    "Erik Johansson <erik@foretaget.se>",
+    "Newsletter <news@example.com>",
+]
+_WORDS = (
+    "resa hotell london bokning faktura kvitto möte lunch fotboll träning skolan "
+    "utvecklingssamtal recept våfflor semester flyg hyrbil invoice meeting project "
+    "deadline offer party birthday kalas simskola läxor"
+).split()
+
+
+def _synthetic_rows(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    base_ms = 1_500_000_000_000
+    for i in range(n):
+        words = rng.sample(_WORDS, 6)
+        yield {
+            "id": f"{i:016x}",
+            "thread_id": f"{i // 3:016x}",
+            "from_addr": rng.choice(_SENDERS),
+            "to_addr": "me@example.com",
+            "subject": " ".join(words[:3]).capitalize(),
+            "date": "",
+            "internal_date": base_ms + i * 3_600_000,
+            "snippet": " ".join(words),
+            "body": " ".join(rng.choices(_WORDS, k=80)),
+            "labels": " inbox " if i % 4 else " inbox ai_processed ",
+        }
+
+
+QUERIES = [
+    "from:ekbacken",
+    'subject:"resa hotell"',
+    "london hotell",
+    "from:anna våfflor",
+    "faktura newer_than:30d -label:AI_Processed",
+    "after:2017/01/01 before:2018/01/01 kalas",
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MessageStore("bench", path=Path(tmp) / "bench.sqlite")
+
+        start = time.perf_counter()
+        rows = list(_synthetic_rows(args.messages))
+        for i in range(0, len(rows), 5000):
+            store.upsert_many(rows[i:i + 5000])
+        print(f"Indexed {store.count()} messages in {time.perf_counter() - start:.1f}s\n")
+
+        print(f"{'query':<45} {'hits':>5} {'median ms':>10}")
+        for query in QUERIES:
+            timings = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                hits = store.search(query, limit=20)
+                timings.append((time.perf_counter() - t0) * 1000)
+            print(f"{query:<45} {len(hits):>5} {statistics.median(timings):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark: one agent conversation for the whole batch vs. one session per mail
+(utils/parallel_triage.py) at different concurrency levels.
+
+The scripted model decides one mail per turn, so in batch mode every turn also
+re-reads the mails and decisions before it; each turn costs a fixed latency plus
+a per-input-token cost. All runs share the model rate limiter. With --poison the
+model fails on one mail: the batch conversation dies there, the per-mail
+sessions only lose that mail.
+
+    python -m benchmarks.bench_parallel_triage --mails 20 --turn-latency 0.5 --poison
+"""
+import argparse
+import asyncio
+import time
+from typing import List
+
+from google.adk.agents.llm_agent import LlmAgent
+from google.adk.models.llm_request import LlmRequest
+from google.adk.runners import InMemoryRunner
+from google.adk.tools.function_tool import FunctionTool
+from google.genai import types
+
+import auth.google_auth as google_auth
+import tools.gmail_tools as gmail_tools
+import utils.prefetch as prefetch
+import utils.rate_limiter as rate_limiter
+from benchmarks.bench_prefetch import ScriptedLlm, _ID_RE, _mailbox
+from utils.fake_google import FakeGmailService
+from utils.parallel_triage import triage_each
+
+decisions: List[str] = []
+
+
+def record_decision(message_id: str, category: str) -> dict:
+    """Record the triage decision for one mail (stands in for draft/label/delegation)."""
+    decisions.append(message_id)
+    return {"message_id": message_id, "category": category}
+
+
+class OneMailPerTurnLlm(ScriptedLlm):
+    poison_id: str = ""
+
+    def _next_parts(self, llm_request: LlmRequest) -> List[types.Part]:
+        ids = _ID_RE.findall(llm_request.contents[0].parts[0].text or "")
+        decided = {
+            part.function_response.response.get("message_id")
+            for content in llm_request.contents
+            for part in content.parts or []
+            if part.function_response and part.function_response.name == "record_decision"
+        }
+        for mid in ids:
+            if mid not in decided:
+                if mid == self.poison_id:
+                    raise ValueError(f"malformed model output on {mid}")
+                call = types.FunctionCall(name="record_decision", args={"message_id": mid, "category": "Övrigt"})
+                return [types.Part(function_call=call)]
+        return [types.Part(text=f"Klart: {len(ids)} mail triagerade.")]
+
+
+async def _run(mode: str, concurrency: int, items: List[dict], args: argparse.Namespace) -> dict:
+    llm = OneMailPerTurnLlm(
+        turn_latency=args.turn_latency,
+        seconds_per_1k_tokens=args.token_cost,
+        poison_id=items[len(items) // 3]["message_id"] if args.poison else "",
+    )
+    agent = LlmAgent(
+        name="email_hub_manager",
+        model=llm,
+        instruction="Du triagerar mail.",
+        tools=[FunctionTool(record_decision)],
+        before_model_callback=rate_limiter.throttle_model_call,
+    )
+    runner = InMemoryRunner(agent=agent, app_name="bench_parallel_triage")
+    decisions.clear()
+    rate_limiter._limiter = rate_limiter.RateLimiter(args.calls_per_minute, args.burst)
+
+    start = time.perf_counter()
+    if mode == "batch":
+        session = await runner.session_service.create_session(app_name=runner.app_name, user_id="bench")
+        message = types.Content(role="user", parts=[types.Part(text=prefetch.format_batch(items))])
+        try:
+            async for _ in runner.run_async(user_id=session.user_id, session_id=session.id, new_message=message):
+                pass
+        except Exception:
+            pass
+    else:
+        await triage_each(runner, items, lambda item: prefetch.format_batch([item]), concurrency=concurrency)
+    return {
+        "seconds": time.perf_counter() - start,
+        "decided": len(set(decisions)),
+        "input_tokens": llm.input_tokens,
+        "throttled": rate_limiter.get_model_rate_limiter().stats()["throttled"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mails", type=int, default=20)
+    parser.add_argument("--turn-latency", type=float, default=0.5, help="Simulated seconds per model turn.")
+    parser.add_argument("--token-cost", type=float, default=0.05, help="Simulated seconds per 1k input tokens.")
+    parser.add_argument("--calls-per-minute", type=float, default=600, help="Shared model rate limit.")
+    parser.add_argument("--burst", type=int, default=8)
+    parser.add_argument("--poison", action="store_true", help="Make the model fail on one mail.")
+    args = parser.parse_args()
+
+    service = FakeGmailService(_mailbox(args.mails), latency=0.01)
+    google_auth.get_gmail_service = gmail_tools.get_gmail_service = prefetch.get_gmail_service = (
+        lambda profile="default": service
+    )
+    ids = [m["id"] for m in service.messages]
+    items = asyncio.run(prefetch.prefetch_batch(ids))
+
+    print(f"{'mode':<10} {'concurrency':>11} {'seconds':>8} {'mails/min':>10} {'input tokens':>13} {'decided':>8} {'throttled':>10}")
+    runs = [("batch", 1)] + [("per_email", c) for c in (1, 2, 4, 8)]
+    for mode, concurrency in runs:
+        r = asyncio.run(_run(mode, concurrency, items, args))
+        print(
+            f"{mode:<10} {concurrency:>11} {r['seconds']:>7.2f}s {60 * r['decided'] / r['seconds']:>10.1f} "
+            f"{r['input_tokens']:>13} {r['decided']:>5}/{len(items):<2} {r['throttled']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
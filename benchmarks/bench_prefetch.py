@@ -0,0 +1,159 @@
+"""
+Benchmark: triage where the manager agent reads the mail itself (gmail_list_unread,
+then gmail_get_thread per mail, one model turn each) vs. the deterministic prefetch
+stage (every thread fetched concurrently in code, the batch put in the prompt).
+
+Both flows run through a real ADK InMemoryRunner against the fake Gmail service.
+The model is scripted: it makes the same decisions in both flows, and every turn
+costs a fixed latency plus a per-input-token cost, so the difference is only
+in the number of turns and the size of the requests.
+
+    python -m benchmarks.bench_prefetch --mails 10 --latency 0.05 --turn-latency 0.8
+"""
+import argparse
+import asyncio
+import re
+from typing import AsyncGenerator, List
+
+from google.adk.agents.llm_agent import LlmAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.runners import InMemoryRunner
+from google.adk.tools.function_tool import FunctionTool
+from google.genai import types
+
+import auth.google_auth as google_auth
+import tools.gmail_tools as gmail_tools
+import utils.prefetch as prefetch
+from agents.email_hub_agent import MANAGER_GMAIL_TOOLS
+from benchmarks.bench_quote_stripping import estimate_tokens
+from utils.fake_google import FakeGmailService, make_message
+from utils.triage_metrics import TriageMetrics
+
+_ID_RE = re.compile(r'"message_id":\s*"([0-9a-f]{16})"')
+
+
+def record_decision(message_id: str, category: str) -> dict:
+    """Record the triage decision for one mail (stands in for draft/label/delegation)."""
+    return {"message_id": message_id, "category": category}
+
+
+class ScriptedLlm(BaseLlm):
+    """Deterministic manager: reads what it is missing, then decides every mail at once."""
+
+    model: str = "scripted"
+    turn_latency: float = 0.8
+    seconds_per_1k_tokens: float = 0.05
+    parallel_reads: bool = False
+    input_tokens: int = 0
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        tokens = estimate_tokens(
+            str(llm_request.config.system_instruction or "")
+            + "".join(t.model_dump_json(exclude_none=True) for t in llm_request.config.tools or [])
+            + "".join(c.model_dump_json(exclude_none=True) for c in llm_request.contents)
+        )
+        self.input_tokens += tokens
+        await asyncio.sleep(self.turn_latency + self.seconds_per_1k_tokens * tokens / 1000)
+        yield LlmResponse(content=types.Content(role="model", parts=self._next_parts(llm_request)))
+
+    def _next_parts(self, llm_request: LlmRequest) -> List[types.Part]:
+        prompt = llm_request.contents[0].parts[0].text or ""
+        responses = {}
+        for content in llm_request.contents:
+            for part in content.parts or []:
+                if part.function_response:
+                    responses.setdefault(part.function_response.name, []).append(part.function_response.response)
+
+        def call(name, **args):
+            return types.Part(function_call=types.FunctionCall(name=name, args=args))
+
+        ids = _ID_RE.findall(prompt)
+        if not ids:
+            # Old flow: the prompt has no content, so the model lists and reads.
+            if "gmail_list_unread" not in responses:
+                return [call("gmail_list_unread", limit=100)]
+            ids = [m["message_id"] for m in responses["gmail_list_unread"][0]["result"]]
+            fetched = {r.get("message_id") for r in responses.get("gmail_get_thread", [])}
+            missing = [mid for mid in ids if mid not in fetched]
+            if missing:
+                return [call("gmail_get_thread", message_id=mid) for mid in (missing if self.parallel_reads else missing[:1])]
+        if "record_decision" not in responses:
+            return [call("record_decision", message_id=mid, category="Övrigt") for mid in ids]
+        return [types.Part(text=f"Klart: {len(ids)} mail triagerade.")]
+
+
+def _mailbox(mails: int) -> List[dict]:
+    body = (
+        "Hej!\n\nVi behöver bekräfta tiderna för utvecklingssamtalen nästa vecka. "
+        "Passar tisdag 14:00 eller torsdag 09:30? Hör av dig senast fredag.\n\n"
+    ) * 4
+    return [make_message(i, subject=f"Utvecklingssamtal {i}", body=body) for i in range(mails)]
+
+
+async def _run(flow: str, service: FakeGmailService, args: argparse.Namespace) -> dict:
+    llm = ScriptedLlm(
+        turn_latency=args.turn_latency,
+        seconds_per_1k_tokens=args.token_cost,
+        parallel_reads=args.parallel_reads,
+    )
+    metrics = TriageMetrics()
+    if flow == "agent reads":
+        gmail = gmail_tools.GmailToolset()
+        prompt = "Triagera de olästa mailen. Hämta innehållet med gmail_get_thread."
+    else:
+        gmail = gmail_tools.GmailToolset(tool_filter=MANAGER_GMAIL_TOOLS)
+        ids = [m["message_id"] for m in gmail.gmail_list_unread(args.mails)]
+        items = await prefetch.prefetch_batch(ids)
+        metrics.prefetch_done()
+        prompt = "Triagera följande mail. Innehållet är redan hämtat.\n" + prefetch.format_batch(items)
+
+    agent = LlmAgent(
+        name="email_hub_manager",
+        model=llm,
+        instruction="Du triagerar mail.",
+        tools=[gmail, FunctionTool(record_decision)],
+    )
+    runner = InMemoryRunner(agent=agent, app_name="bench_prefetch")
+    session = await runner.session_service.create_session(app_name=runner.app_name, user_id="bench")
+    async for event in runner.run_async(
+        user_id=session.user_id,
+        session_id=session.id,
+        new_message=types.Content(role="user", parts=[types.Part(text=prompt)]),
+    ):
+        metrics.observe(event)
+    return {**metrics.finish(), "input_tokens": llm.input_tokens}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mails", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per Gmail round trip.")
+    parser.add_argument("--turn-latency", type=float, default=0.8, help="Simulated seconds per model turn.")
+    parser.add_argument("--token-cost", type=float, default=0.05, help="Simulated seconds per 1k input tokens.")
+    parser.add_argument(
+        "--parallel-reads", action="store_true", help="Let the reading agent fetch all threads in one turn."
+    )
+    args = parser.parse_args()
+
+    service = FakeGmailService(_mailbox(args.mails), latency=args.latency)
+    fake = lambda profile="default": service
+    google_auth.get_gmail_service = gmail_tools.get_gmail_service = prefetch.get_gmail_service = fake
+
+    print(
+        f"{'flow':<12} {'turns':>6} {'tool calls':>11} {'input tokens':>13} "
+        f"{'prefetch':>9} {'1st decision':>13} {'total':>7}"
+    )
+    for flow in ("agent reads", "prefetch"):
+        r = asyncio.run(_run(flow, service, args))
+        print(
+            f"{flow:<12} {r['model_turns']:>6} {r['tool_calls']:>11} {r['input_tokens']:>13} "
+            f"{r['prefetch_seconds']:>8.2f}s {r['time_to_first_decision']:>12.2f}s {r['total_seconds']:>6.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
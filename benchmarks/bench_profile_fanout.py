@@ -0,0 +1,55 @@
+"""
+Benchmark: gmail_search over several profiles, one after another (the old loop)
+vs. the concurrent fan-out. Every profile is a fake mailbox with its own
+latency; the last run adds a profile that hangs, to show the per-profile timeout.
+
+    python -m benchmarks.bench_profile_fanout --latency 0.1
+"""
+import argparse
+import time
+
+import tools.gmail_tools as gmail_tools
+import utils.profile_fanout as profile_fanout
+from utils.fake_google import FakeGmailService, make_message
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.1, help="Simulated seconds per HTTP round trip.")
+    args = parser.parse_args()
+
+    services = {
+        f"profile{i}": FakeGmailService([make_message(i * 100 + n, subject=f"Kalas {n}") for n in range(20)], latency=args.latency * (1 + i % 3))
+        for i in range(8)
+    }
+    services["hung"] = FakeGmailService([make_message(9999)], latency=5)
+    gmail_tools.PROFILES = dict.fromkeys(services)
+    gmail_tools.get_gmail_service = lambda profile="default": services[profile]
+    toolset = gmail_tools.GmailToolset()
+
+    print(f"{'profiles':>8} {'sequential':>11} {'fan-out':>8} {'slowest':>8} {'results':>8}")
+    for n in (2, 4, 8):
+        profiles = [f"profile{i}" for i in range(n)]
+        start = time.perf_counter()
+        for profile in profiles:
+            toolset._search_profile(profile, "kalas", 10, 100)
+        sequential = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = toolset.gmail_search("kalas", limit=10, profiles=profiles)
+        fanned = time.perf_counter() - start
+        slowest = max(2 * services[p].latency for p in profiles)  # list + one batch
+        print(f"{n:>8} {sequential:>10.2f}s {fanned:>7.2f}s {slowest:>7.2f}s {len(results):>8}")
+
+    timeout = 1.0
+    gmail_tools.fan_out = lambda profiles, fn: profile_fanout.fan_out(profiles, fn, timeout=timeout)
+    start = time.perf_counter()
+    results = toolset.gmail_search("kalas", limit=10, profiles=["profile0", "hung", "profile1"])
+    print(
+        f"\nwith a hung profile (timeout {timeout:g}s): {time.perf_counter() - start:.2f}s, "
+        f"{len(results)} results from {sorted({r['account'] for r in results})}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark: gmail_get_thread payload size with and without quoted-reply stripping,
+on synthetic threads shaped like real mail (Gmail, Apple Mail and Outlook reply
+styles, Swedish and English, signatures and corporate footers).
+
+Tokens are estimated as characters / 4, which is close enough for comparing
+before and after.
+
+    python -m benchmarks.bench_quote_stripping --threads 50
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+import tools.gmail_tools as gmail_tools
+from utils.fake_google import FakeGmailService, make_message
+
+_PEOPLE = [
+    ("Anna Lindqvist", "anna.lindqvist@gmail.com", "sv", "gmail"),
+    ("Erik Johansson", "erik@foretaget.se", "sv", "outlook"),
+    ("John Miller", "john.miller@example.com", "en", "apple"),
+    ("Skolan Ekbacken", "info@ekbacken.se", "sv", "outlook"),
+]
+_LINES = {
+    "sv": [
+        "Hej! Tack för senast.",
+        "Passar det med torsdag kl 17 istället?",
+        "Jag bokar lokalen och skickar en kallelse.",
+        "Kan du ta med listan över deltagare?",
+        "Vi behöver svar senast på fredag.",
+        "Låter bra, då kör vi på det.",
+    ],
+    "en": [
+        "Hi, thanks for the quick reply.",
+        "Does Thursday at 5pm work for you instead?",
+        "I'll book the room and send an invite.",
+        "Could you bring the list of participants?",
+        "We need an answer by Friday at the latest.",
+        "Sounds good, let's go with that.",
+    ],
+}
+_SIGNATURES = {
+    "gmail": "-- \n{name}\n070-123 45 67",
+    "apple": "Sent from my iPhone",
+    "outlook": "Med vänliga hälsningar\n{name}\n\n"
+    "Detta e-postmeddelande kan innehålla konfidentiell information och är endast avsett för adressaten. "
+    "Om du fått meddelandet av misstag, vänligen radera det och meddela avsändaren.",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4
+
+
+def _reply_header(person, previous_person) -> str:
+    name, addr, lang, client = person
+    prev_name, prev_addr, _, _ = previous_person
+    if client == "outlook":
+        return (
+            f"Från: {prev_name} <{prev_addr}>\nSkickat: den 13 oktober 2025 08:00\n"
+            f"Till: {name} <{addr}>\nÄmne: SV: Planering\n\n"
+        )
+    if lang == "sv":
+        return f"Den mån 13 okt. 2025 kl 08:00 skrev {prev_name} <\n{prev_addr}>:\n"
+    return f"On Mon, Oct 13, 2025 at 8:00 AM {prev_name} <{prev_addr}> wrote:\n"
+
+
+def _build_thread(rng: random.Random, first_index: int, length: int) -> list:
+    messages = []
+    previous_body = ""
+    previous_person = None
+    thread_id = f"{first_index:016x}"
+    for n in range(length):
+        person = rng.choice([p for p in _PEOPLE if p is not previous_person])
+        name, addr, lang, client = person
+        own = "\n".join(rng.sample(_LINES[lang], 3)) + "\n\n" + _SIGNATURES[client].format(name=name)
+        body = own
+        if previous_body:
+            history = previous_body
+            if client != "outlook":
+                history = "\n".join(f"> {line}" if line else ">" for line in history.split("\n"))
+            body = f"{own}\n\n{_reply_header(person, previous_person)}{history}"
+        messages.append(
+            make_message(first_index + n, subject="Planering", sender=f"{name} <{addr}>", body=body, thread_id=thread_id)
+        )
+        previous_body, previous_person = body, person
+    return messages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    lengths = [rng.randint(2, 12) for _ in range(args.threads)]
+    threads, index = [], 0
+    for length in lengths:
+        threads.append(_build_thread(rng, index, length))
+        index += length
+
+    service = FakeGmailService([m for t in threads for m in t], latency=0)
+    gmail_tools.get_gmail_service = lambda profile="default": service
+    toolset = gmail_tools.GmailToolset()
+
+    print(f"{'messages':>8} {'tokens raw':>11} {'stripped':>9} {'saved':>6}")
+    raw_total = stripped_total = 0
+    strip_seconds = []
+    for thread in sorted(threads, key=len):
+        last = thread[-1]
+        raw = asyncio.run(toolset.gmail_get_thread(last["id"], thread_id=last["threadId"], strip_quotes=False))
+        start = time.perf_counter()
+        stripped = asyncio.run(toolset.gmail_get_thread(last["id"], thread_id=last["threadId"]))
+        strip_seconds.append(time.perf_counter() - start)
+        raw_tokens = estimate_tokens(json.dumps(raw, ensure_ascii=False))
+        stripped_tokens = estimate_tokens(json.dumps(stripped, ensure_ascii=False))
+        raw_total += raw_tokens
+        stripped_total += stripped_tokens
+        print(f"{len(thread):>8} {raw_tokens:>11} {stripped_tokens:>9} {1 - stripped_tokens / raw_tokens:>6.0%}")
+
+    print(f"\ntotal: {raw_total} -> {stripped_total} estimated tokens ({1 - stripped_total / raw_total:.0%} saved)")
+    print(f"median gmail_get_thread with stripping: {statistics.median(strip_seconds) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
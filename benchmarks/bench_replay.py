@@ -0,0 +1,265 @@
+"""
+Benchmark: run_triage and the sub-agent delegations end-to-end, offline, from a
+cassette (utils/cassette.py).
+
+Without --cassette, a cassette is recorded first from a synthetic source: the
+fake Gmail service behind auth's client pool, a scripted model for every agent
+(labels each mail, drafts replies, delegates trips/radio/meetings) and a canned
+Sveriges Radio answer. With --cassette, a recording of a real run is replayed
+(python main.py --record FILE); the delegation rows then need the synthetic one.
+
+Every replay runs with fresh local state (label registry, caches, draft index,
+sender history), no credentials and no network: auth's client pool is disabled,
+so any request missing from the cassette shows up as a miss. Reports emails per
+minute, per-mail latency (one agent session per mail) and tracemalloc peak and
+retained memory, so the pipeline's own overhead can be compared between commits.
+
+    python -m benchmarks.bench_replay --mails 40 --runs 5 --concurrency 4
+"""
+import argparse
+import asyncio
+import contextlib
+import gc
+import io
+import os
+import re
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import AsyncGenerator, List
+
+os.environ.setdefault("GOOGLE_API_KEY", "bench")
+# Latencies and mail counts are read from the run's trace.
+os.environ.setdefault("TRACING_ENABLED", "1")
+_TMP = tempfile.TemporaryDirectory()
+# Keep the benchmark's traces, caches and mirrors out of the working tree.
+for _name, _value in {
+    "TRACE_DIR": "traces",
+    "MESSAGE_STORE_DIR": "message_store",
+    "ATTACHMENT_CACHE_FILE": "attachments.sqlite",
+    "DELEGATION_CACHE_FILE": "delegations.sqlite",
+}.items():
+    os.environ[_name] = str(Path(_TMP.name) / _value)
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+import agents.email_hub_agent as email_hub_agent
+import auth.google_auth as google_auth
+import main as triage_main
+import tools.delegation_tools as delegation_tools
+import utils.attachment_cache as attachment_cache
+import utils.delegation_cache as delegation_cache
+import utils.draft_index as draft_index
+import utils.label_registry as label_registry
+import utils.rate_limiter as rate_limiter
+import utils.thinking_budget as thinking_budget
+import utils.triage_rules as triage_rules
+from agents.registry import get_agent_registry
+from tools.sr_mcp_tools import SrMcpToolset
+from utils.cassette import use_cassette
+from utils.fake_google import FakeGmailService, make_message
+from utils.tracing import get_tracer
+
+_ID_RE = re.compile(r'"message_id":\s*"([0-9a-f]{16})"')
+_SUBJECT_RE = re.compile(r'"subject":\s*"([^"]*)"')
+
+_PERSONAL = [
+    ("Resan till London i vår", "Minns du hotellet vi bodde på i London senast? Vi funderar på att åka igen."),
+    ("Tips på poddar till bilresan", "Har du några bra radioprogram eller poddar till bilresan på lördag?"),
+    ("Möte om skolavslutningen", "Kan vi ses på ett möte om skolavslutningen, tisdag 14:00 eller torsdag 09:30?"),
+    ("Fråga om hämtningen", "Kan du hämta barnen på fredag? Svara gärna idag."),
+    ("Bilder från helgen", "Här kommer bilderna från helgen, hoppas ni hade det bra."),
+]
+_DELEGATIONS = [
+    ("ask_researcher", "När var vi i London senast?"),
+    ("ask_researcher", "Vad sa skolan om utflykten?"),
+    ("ask_radio_expert", "Krimpoddar för bilresan"),
+    ("ask_radio_expert", "Vad spelas på P3 just nu?"),
+    ("ask_calendar_secretary", "Boka möte tisdag 14:00 om skolavslutningen"),
+]
+
+
+def _call(name: str, **args) -> types.Part:
+    return types.Part(function_call=types.FunctionCall(name=name, args=args))
+
+
+class TriageLlm(BaseLlm):
+    """Scripted stand-in for every agent: decides from the tools it has and what it was asked."""
+
+    model: str = "scripted"
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        yield LlmResponse(content=types.Content(role="model", parts=self._next_parts(llm_request)))
+
+    def _next_parts(self, llm_request: LlmRequest) -> List[types.Part]:
+        prompt = llm_request.contents[0].parts[0].text or ""
+        answered = any(p.function_response for c in llm_request.contents for p in c.parts or [])
+        tools = llm_request.tools_dict
+        if answered:
+            return [types.Part(text="Klart: " + prompt[:60].replace("\n", " "))]
+        if "ask_researcher" in tools:
+            parts = []
+            for message_id, subject in zip(_ID_RE.findall(prompt), _SUBJECT_RE.findall(prompt)):
+                if "London" in subject:
+                    parts.append(_call("ask_researcher", query=subject, email_context=subject))
+                elif "poddar" in subject:
+                    parts.append(_call("ask_radio_expert", query=subject, email_context=subject))
+                elif "Möte" in subject:
+                    parts.append(_call("ask_calendar_secretary", request=subject, email_context=subject))
+                elif "Fråga" in subject:
+                    parts.append(_call("gmail_create_draft_reply", message_id=message_id, reply_body="Det går bra!"))
+            return parts or [types.Part(text="Inget att göra.")]
+        if "gmail_search" in tools:
+            return [_call("gmail_search", query="London", limit=3, profiles=["default"])]
+        if "get_channel_rightnow" in tools:
+            return [_call("get_channel_rightnow", channelId=164)]
+        return [types.Part(text="Bokat (utkast): tisdag 14:00.")]
+
+
+def _mailbox(mails: int) -> List[dict]:
+    messages = []
+    for i in range(mails):
+        if i % 3 == 2:
+            messages.append(make_message(
+                i, f"Veckans nyheter {i}", "Nyhetsbrev <info@nyheter.dn.se>",
+                headers={"List-Unsubscribe": "<mailto:unsub@nyheter.dn.se>", "Precedence": "bulk"},
+            ))
+        else:
+            subject, body = _PERSONAL[i % len(_PERSONAL)]
+            messages.append(make_message(i, f"{subject} ({i})", f"Anna <anna{i % 4}@example.com>", body=body * 3))
+    return messages
+
+
+def _fresh_state(tag: str) -> None:
+    """Local state as on a new machine, so every run asks the same questions."""
+    tmp = Path(_TMP.name)
+    label_registry._registry = label_registry.LabelRegistry(path=tmp / f"labels-{tag}.json")
+    draft_index._indexes.clear()
+    triage_rules._classifier = triage_rules.FastPathClassifier(history_path=tmp / f"senders-{tag}.json")
+    thinking_budget._scheduler = thinking_budget.ThinkingScheduler(history_path=None, ceiling=0)
+    delegation_cache._cache = delegation_cache.DelegationCache(path=tmp / f"delegations-{tag}.sqlite", ttl={})
+    attachment_cache._cache = attachment_cache.AttachmentCache(path=tmp / f"attachments-{tag}.sqlite")
+    get_agent_registry().invalidate()
+
+
+async def _delegate(toolset, calls) -> List[float]:
+    samples = []
+    for tool, query in calls:
+        start = time.perf_counter()
+        await getattr(toolset, tool)(query)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _scripted(builder):
+    def build():
+        agent = builder()
+        agent.model = TriageLlm()
+        return agent
+
+    return build
+
+
+def _record(path: Path, mails: int, mode: str, concurrency: int) -> None:
+    service = FakeGmailService(_mailbox(mails), latency=0)
+    originals = {
+        "pool": google_auth._get_pooled_service,
+        "post": SrMcpToolset._post,
+        "builders": (triage_main.build_email_hub_agent, delegation_tools.build_context_agent,
+                     delegation_tools.build_radio_agent, delegation_tools.build_calendar_agent),
+    }
+    google_auth._get_pooled_service = lambda api, version, profile: service
+    SrMcpToolset._post = lambda self, tool, params: {"content": [{"type": "text", "text": "P3: Morgonpasset"}]}
+    triage_main.build_email_hub_agent = _scripted(email_hub_agent.build_email_hub_agent)
+    delegation_tools.build_context_agent = _scripted(originals["builders"][1])
+    delegation_tools.build_radio_agent = _scripted(originals["builders"][2])
+    delegation_tools.build_calendar_agent = _scripted(originals["builders"][3])
+    try:
+        cassette = use_cassette(path, "record")
+        _fresh_state("record")
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(triage_main.run_triage(mails, True, mode=mode, concurrency=concurrency))
+            asyncio.run(_delegate(delegation_tools.DelegationToolset(), _DELEGATIONS))
+        cassette.save()
+        print(f"recorded {cassette.stats()['interactions']} interactions to {path.name}")
+    finally:
+        google_auth._get_pooled_service = originals["pool"]
+        SrMcpToolset._post = originals["post"]
+        (triage_main.build_email_hub_agent, delegation_tools.build_context_agent,
+         delegation_tools.build_radio_agent, delegation_tools.build_calendar_agent) = originals["builders"]
+
+
+def _offline(api, version, profile):
+    raise RuntimeError(f"{api} for '{profile}' requested during replay: not in the cassette path")
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    samples = sorted(samples)
+    return samples[int(q * (len(samples) - 1))] if samples else 0.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cassette", type=Path, help="Replay this recording instead of a synthetic one.")
+    parser.add_argument("--mails", type=int, default=40, help="Mails in the synthetic mailbox.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--mode", choices=["batch", "per_email"], default="per_email")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    rate_limiter._limiter = rate_limiter.RateLimiter(0)
+    path = args.cassette
+    if path is None:
+        path = Path(_TMP.name) / "synthetic.json"
+        _record(path, args.mails, args.mode, args.concurrency)
+
+    google_auth._get_pooled_service = _offline
+    tracer = get_tracer()
+    tracemalloc.start()
+    print(f"\n{'run':<5} {'mails':>6} {'wall':>8} {'mails/min':>10} {'p50':>9} {'p95':>9} {'peak MB':>8} {'retained KB':>12} {'misses':>7}")
+    for run in range(args.runs):
+        cassette = use_cassette(path, "replay")
+        _fresh_state(f"replay{run}")
+        gc.collect()
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(triage_main.run_triage(args.mails, True, mode=args.mode, concurrency=args.concurrency))
+        wall = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] - before
+        mails = sum(s.attrs.get("mails", 0) for s in tracer.spans("phase", "mark_processed"))
+        latencies = [s.seconds for s in tracer.spans("agent", "email_hub_manager")]
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - before
+        print(
+            f"{run + 1:<5} {mails:>6} {wall:>7.2f}s {mails / wall * 60:>10.0f} {_percentile(latencies, 0.5) * 1000:>7.1f}ms "
+            f"{_percentile(latencies, 0.95) * 1000:>7.1f}ms {peak / 2**20:>8.1f} {retained / 1024:>12.0f} {cassette.stats()['misses']:>7}"
+        )
+
+    if args.cassette is None:
+        print(f"\n{'delegation':<24} {'calls':>6} {'p50':>9} {'p95':>9}")
+        cassette = use_cassette(path, "replay")
+        _fresh_state("delegations")
+        samples = {}
+        with contextlib.redirect_stdout(io.StringIO()):
+            # The delegations were recorded after the triage (its mail already labelled): replay that first.
+            asyncio.run(triage_main.run_triage(args.mails, True, mode=args.mode, concurrency=args.concurrency))
+            for _ in range(args.runs):
+                times = asyncio.run(_delegate(delegation_tools.DelegationToolset(), _DELEGATIONS))
+                for (tool, _), seconds in zip(_DELEGATIONS, times):
+                    samples.setdefault(tool, []).append(seconds)
+        for tool, times in samples.items():
+            print(f"{tool:<24} {len(times):>6} {_percentile(times, 0.5) * 1000:>7.1f}ms {_percentile(times, 0.95) * 1000:>7.1f}ms")
+        print(f"misses: {cassette.stats()['misses']}")
+    tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark: gmail_find_related-style lookups on a synthetic 100k-message mirror.
+Compares the MinHash subject index with the old exact-phrase approach (strip one
+"re:"/"fwd:" and require the rest verbatim), starting from a reply and looking
+for the rest of the conversation: the original plus replies/forwards made in
+Swedish/German clients or with small edits.
+
+    python -m benchmarks.bench_subject_index --messages 100000
+"""
+import argparse
+import random
+import re
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.bench_message_store import _synthetic_rows
+from utils.message_store import MessageStore
+from utils.subject_index import SubjectIndex
+
+_TEMPLATES = [
+    "Inbjudan till {name}s kalas",
+    "Faktura {name} AB oktober",
+    "Utvecklingssamtal för {name}",
+    "Bokningsbekräftelse hotell {name}",
+    "Protokoll styrelsemöte {name}",
+    "Offert på renovering, {name}",
+    "Meeting notes: {name} project kickoff",
+    "Träningstider {name} IF hösten",
+]
+
+_VARIANTS = [
+    lambda s: f"SV: {s}",
+    lambda s: f"VB: SV: {s}",
+    lambda s: f"AW: {s}",
+    lambda s: f"Re[2]: {s}",
+    lambda s: f"{s}!",
+    lambda s: f"{s} (uppdaterad)",
+    lambda s: f"Fwd: {s.lower()}",
+]
+
+
+def _old_match(subject: str, candidate: str) -> bool:
+    cleaned = re.sub(r"^(re|fwd):\s*", "", subject, flags=re.IGNORECASE)
+    return cleaned.lower() in candidate.lower()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    rows = list(_synthetic_rows(args.messages))
+    # Plant conversations: an original plus 3 replies/forwards/edits spread over the mailbox.
+    # Each lookup starts from one of the replies and should find the other three messages.
+    planted = []
+    slots = rng.sample(range(len(rows)), 4 * args.queries)
+    for q in range(args.queries):
+        name = "".join(rng.choice("bdfgklmnprstv") + rng.choice("aeiouyåäö") for _ in range(3)).capitalize()
+        base = rng.choice(_TEMPLATES).format(name=name)
+        members = slots[4 * q:4 * q + 4]
+        rows[members[0]]["subject"] = base
+        for idx, variant in zip(members[1:], rng.sample(_VARIANTS, 3)):
+            rows[idx]["subject"] = variant(base)
+        planted.append([rows[i] for i in members])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = MessageStore("bench", path=Path(tmp) / "bench.sqlite")
+        for i in range(0, len(rows), 5000):
+            store.upsert_many(rows[i:i + 5000])
+        index = SubjectIndex(store, path=Path(tmp) / "bench.subjects.npz")
+
+        start = time.perf_counter()
+        index.update()
+        print(f"Indexed {len(index)} subjects in {time.perf_counter() - start:.1f}s")
+        start = time.perf_counter()
+        SubjectIndex(store, path=Path(tmp) / "bench.subjects.npz")
+        print(f"Reloaded saved index in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+        timings, found_new, found_old, total = [], 0, 0, 0
+        for conversation in planted:
+            query, others = conversation[1], [conversation[0]] + conversation[2:]
+            t0 = time.perf_counter()
+            hits = index.related_messages(query["subject"], query["from_addr"], exclude_id=query["id"], limit=10)
+            timings.append((time.perf_counter() - t0) * 1000)
+            hit_ids = {h["id"] for h in hits}
+            found_new += sum(o["id"] in hit_ids for o in others)
+            found_old += sum(_old_match(query["subject"], o["subject"]) for o in others)
+            total += len(others)
+
+        timings.sort()
+        print(f"query latency: p50 {statistics.median(timings):.2f}ms, p95 {timings[int(len(timings) * 0.95)]:.2f}ms")
+        print(f"related variants found: index {found_new}/{total}, exact phrase {found_old}/{total}")
+
+        new_rows = list(_synthetic_rows(1000, seed=99))
+        for i, row in enumerate(new_rows):
+            row["id"] = f"new{i:013x}"
+            # Half arrive with an old internalDate (delayed delivery, imported mail).
+            row["internal_date"] += 10**12 if i % 2 else -(10**12)
+        store.upsert_many(new_rows)
+        store.delete_many([row["id"] for row in rows[:100]])
+        start = time.perf_counter()
+        changed = index.update()
+        print(f"incremental update: {changed} added/deleted messages in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Benchmark: fixed planner thinking budgets vs. the adaptive scheduler
+(utils/thinking_budget.py) on a generated corpus of triage and research tasks.
+
+Every task has a hidden "need" (thought tokens it takes to get right) that grows
+with its size, thread depth and attachments, plus noise. Thinking models tend to
+spend more of a larger budget than the task needs; the scripted model thinks
+need + overthink * (budget - need) tokens, capped at the budget, and reports
+them in usage_metadata (--overthink 0 is a model that never overthinks: then
+a smaller budget saves nothing). A call whose budget is below its need counts
+as under-budgeted (a quality risk). Latency is
+simulated (not slept): a fixed cost per call plus time per thought token.
+
+The corpus is replayed twice through a real ADK runner with the callbacks the
+agents use: the second pass shows the effect of the usage history.
+
+    python -m benchmarks.bench_thinking_budget --tasks 120 --overthink 0.3 --ceiling 150000
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import tempfile
+from pathlib import Path
+from typing import AsyncGenerator, Dict
+
+from google.adk.agents.llm_agent import LlmAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.planners import BuiltInPlanner
+from google.adk.runners import InMemoryRunner
+from google.adk.tools.function_tool import FunctionTool
+from google.genai import types
+
+import utils.thinking_budget as thinking_budget
+from benchmarks.bench_quote_stripping import estimate_tokens
+from utils.prefetch import format_batch
+
+_TASK_RE = re.compile(r'"message_id":"(t\d+r?)"')
+
+
+def record_decision(message_id: str, category: str) -> dict:
+    """Record the triage decision for one mail."""
+    return {"message_id": message_id, "category": category}
+
+
+class NeedLlm(BaseLlm):
+    """Thinks as much as the task needs, up to the budget it is given."""
+
+    model: str = "scripted"
+    needs: Dict[str, int] = {}
+    seconds_per_call: float = 0.6
+    seconds_per_1k_thoughts: float = 4.0
+    overthink: float = 0.3
+    simulated_seconds: float = 0.0
+    under_budget: int = 0
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        text = thinking_budget._task_text(llm_request)
+        task = _TASK_RE.search(text).group(1)
+        follow_up = any(p.function_response for p in llm_request.contents[-1].parts or [])
+        need = 200 if follow_up else self.needs[task]
+        config = llm_request.config.thinking_config
+        budget = config.thinking_budget if config else 0
+        thoughts = min(budget, need + int(self.overthink * max(budget - need, 0)))
+        self.under_budget += budget < need
+        self.simulated_seconds += self.seconds_per_call + self.seconds_per_1k_thoughts * thoughts / 1000
+
+        if follow_up or task.endswith("r"):
+            parts = [types.Part(text="Klart.")]
+        else:
+            parts = [types.Part(function_call=types.FunctionCall(
+                name="record_decision", args={"message_id": task, "category": "Övrigt"}))]
+        prompt_tokens = estimate_tokens(text)
+        yield LlmResponse(
+            content=types.Content(role="model", parts=parts),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_tokens,
+                thoughts_token_count=thoughts,
+                candidates_token_count=30,
+                total_token_count=prompt_tokens + thoughts + 30,
+            ),
+        )
+
+
+def _corpus(tasks: int, rng: random.Random):
+    corpus = []
+    for i in range(tasks):
+        research = i % 4 == 3
+        length = int(rng.lognormvariate(6.5, 1.0))
+        depth = rng.choice([0, 0, 0, 1, 2, 4, 6])
+        attachments = rng.choice([0, 0, 0, 0, 1, 2])
+        body = ("Hej, " + "lite text om saken " * (length // 20))[:length]
+        body += "".join(f"\n\n--- BITOGAD FIL: bilaga{n}.pdf ---\n" + "tabell " * 300 for n in range(attachments))
+        task_id = f"t{i}" + ("r" if research else "")
+        item = {
+            "message_id": task_id,
+            "from": "Avsändare <a@example.com>",
+            "subject": f"Ärende {i}",
+            "body": body,
+        }
+        if depth:
+            item["earlier_in_thread"] = [{"from": f"p{n}@example.com", "text": "tidigare svar"} for n in range(depth)]
+        difficulty = min(1.0, len(body) / 9000 + depth * 0.06 + attachments * 0.15 + rng.uniform(0, 0.15))
+        need = int((1500 + 6000 * difficulty) if research else (300 + 2500 * difficulty))
+        corpus.append((task_id, research, format_batch([item]), need))
+    return corpus
+
+
+async def _replay(corpus, scheduler, llm) -> None:
+    thinking_budget._scheduler = scheduler
+    callbacks = dict(
+        before_model_callback=[thinking_budget.schedule_thinking],
+        after_model_callback=thinking_budget.record_model_usage,
+    )
+    manager = LlmAgent(
+        name="email_hub_manager", model=llm, instruction="Triagera.", tools=[FunctionTool(record_decision)],
+        planner=BuiltInPlanner(thinking_config=types.ThinkingConfig(thinking_budget=4000, include_thoughts=True)),
+        **callbacks,
+    )
+    researcher = LlmAgent(
+        name="concept_researcher", model=llm, instruction="Sök.",
+        planner=BuiltInPlanner(thinking_config=types.ThinkingConfig(thinking_budget=12000, include_thoughts=True)),
+        **callbacks,
+    )
+    runners = {False: InMemoryRunner(agent=manager, app_name="bench"), True: InMemoryRunner(agent=researcher, app_name="bench")}
+    for task_id, research, prompt, _ in corpus:
+        runner = runners[research]
+        session = await runner.session_service.create_session(app_name="bench", user_id="bench")
+        message = types.Content(role="user", parts=[types.Part(text=prompt)])
+        async for _ in runner.run_async(user_id="bench", session_id=session.id, new_message=message):
+            pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks", type=int, default=120)
+    parser.add_argument("--ceiling", type=int, default=150000, help="Per-run token ceiling for the last row.")
+    parser.add_argument("--overthink", type=float, default=0.3, help="Share of unneeded budget the model still spends.")
+    args = parser.parse_args()
+
+    corpus = _corpus(args.tasks, random.Random(21))
+    needs = {task_id: need for task_id, _, _, need in corpus}
+
+    print(
+        f"{'run':<26} {'calls':>6} {'budget':>9} {'thoughts':>9} {'tokens':>9} "
+        f"{'sim. latency':>13} {'under-budget':>13} {'stopped':>8}"
+    )
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        history = Path(tmp) / "history.json"
+        runs = [
+            ("fixed", dict(adaptive=False, ceiling=0, history_path=None)),
+            ("adaptive (cold)", dict(adaptive=True, ceiling=0, history_path=history)),
+            ("adaptive (warm history)", dict(adaptive=True, ceiling=0, history_path=history)),
+            (f"adaptive + ceiling {args.ceiling // 1000}k", dict(adaptive=True, ceiling=args.ceiling, history_path=history)),
+        ]
+        for label, options in runs:
+            scheduler = thinking_budget.ThinkingScheduler(min_budget=512, **options)
+            llm = NeedLlm(needs=needs, overthink=args.overthink)
+            asyncio.run(_replay(corpus, scheduler, llm))
+            scheduler.save_history()
+            s = scheduler.stats()
+            rows.append((label, s, llm))
+            print(
+                f"{label:<26} {s['calls']:>6} {s['budget_total']:>9} {s['thought_tokens']:>9} {s['used_tokens']:>9} "
+                f"{llm.simulated_seconds:>12.1f}s {llm.under_budget:>13} {s['stopped']:>8}"
+            )
+
+    fixed, warm = rows[0], rows[2]
+    print(
+        "\nwarm adaptive vs fixed: "
+        + json.dumps({
+            "thought_tokens_saved": fixed[1]["thought_tokens"] - warm[1]["thought_tokens"],
+            "budget_reduction": fixed[1]["budget_total"] - warm[1]["budget_total"],
+            "simulated_seconds_saved": round(fixed[2].simulated_seconds - warm[2].simulated_seconds, 1),
+        })
+    )
+
+
+if __name__ == "__main__":
+    main()
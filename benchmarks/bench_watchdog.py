@@ -0,0 +1,172 @@
+"""
+Benchmark: the old watch loop (fixed sleep, then asyncio.run per triage run)
+vs. the watchdog daemon (utils/watchdog.py: one event loop, adaptive interval,
+batch window).
+
+Mail arrives in bursts separated by idle gaps. A triage run costs a fixed time
+plus a per-mail time; building the agents costs --build-cost every time a run
+starts on a new event loop, i.e. on every old-style run and once for the daemon.
+The numbers reported are polls (history.list calls), triage runs, agent builds
+and the delay from a mail's arrival to the start of its triage. All times are
+simulated seconds, run --scale times faster.
+
+    python -m benchmarks.bench_watchdog --bursts 8 --gap 900 --scale 0.002
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import random
+import statistics
+import time
+from typing import Dict, List
+
+from utils.watchdog import AdaptiveInterval, Watchdog
+
+
+class Mailbox:
+    """Mail scheduled to arrive at simulated times; poll() returns what arrived since the last call."""
+
+    def __init__(self, args: argparse.Namespace):
+        rng = random.Random(args.seed)
+        self.scale = args.scale
+        self.arrivals: Dict[str, float] = {}
+        at = 0.0
+        for burst in range(args.bursts):
+            at += rng.uniform(args.gap / 2, args.gap)
+            for i in range(rng.randint(1, args.burst_size)):
+                self.arrivals[f"m{burst}-{i}"] = at + rng.uniform(0, args.spread)
+        self.pending = sorted(self.arrivals, key=self.arrivals.get)
+        self.started = time.monotonic()
+        self.triaged: Dict[str, float] = {}
+        self.requeued: List[str] = []
+        self.polls = 0
+
+    def now(self) -> float:
+        return (time.monotonic() - self.started) / self.scale
+
+    def poll(self) -> List[str]:
+        self.polls += 1
+        now = self.now()
+        arrived = [m for m in self.pending if self.arrivals[m] <= now]
+        self.pending = self.pending[len(arrived):]
+        result = self.requeued + arrived
+        self.requeued = []
+        return result
+
+    def done(self) -> bool:
+        return len(self.triaged) == len(self.arrivals)
+
+
+class Triage:
+    """Stands in for run_triage; agent builds are cached per event loop like the agent registry."""
+
+    def __init__(self, mailbox: Mailbox, args: argparse.Namespace):
+        self.mailbox = mailbox
+        self.args = args
+        self.loop = None
+        self.builds = 0
+        self.runs = 0
+
+    async def __call__(self, message_ids: List[str]) -> None:
+        loop = asyncio.get_running_loop()
+        started = self.mailbox.now()
+        if loop is not self.loop:
+            self.loop = loop
+            self.builds += 1
+            await asyncio.sleep(self.args.build_cost * self.args.scale)
+        await asyncio.sleep((self.args.run_cost + self.args.mail_cost * len(message_ids)) * self.args.scale)
+        for message_id in message_ids:
+            self.mailbox.triaged[message_id] = started
+        self.runs += 1
+
+
+def _fixed(args: argparse.Namespace) -> dict:
+    mailbox = Mailbox(args)
+    triage = Triage(mailbox, args)
+    while not mailbox.done():
+        new_ids = mailbox.poll()
+        for start in range(0, len(new_ids), args.limit):
+            asyncio.run(triage(new_ids[start:start + args.limit]))
+        if not mailbox.done():
+            time.sleep(args.interval * args.scale)
+    return _result("fixed interval, loop per run", mailbox, triage)
+
+
+def _daemon(args: argparse.Namespace) -> dict:
+    mailbox = Mailbox(args)
+    triage = Triage(mailbox, args)
+
+    async def run() -> None:
+        async def triage_and_check(message_ids: List[str]) -> None:
+            await triage(message_ids)
+            if mailbox.done():
+                watchdog.stop()
+
+        watchdog = Watchdog(
+            poll=lambda: asyncio.sleep(0, mailbox.poll()),
+            triage=triage_and_check,
+            requeue=lambda ids, attempted: mailbox.requeued.extend(ids),
+            limit=args.limit,
+            interval=AdaptiveInterval(
+                args.interval * args.scale,
+                minimum=args.min_interval * args.scale,
+                maximum=args.max_interval * args.scale,
+                backoff=args.backoff,
+            ),
+            batch_window=args.batch_window * args.scale,
+        )
+        await watchdog.run()
+
+    asyncio.run(run())
+    return _result("daemon, adaptive interval", mailbox, triage)
+
+
+def _result(name: str, mailbox: Mailbox, triage: Triage) -> dict:
+    delays = [mailbox.triaged[m] - mailbox.arrivals[m] for m in mailbox.arrivals]
+    return {
+        "name": name,
+        "polls": mailbox.polls,
+        "runs": triage.runs,
+        "builds": triage.builds,
+        "mean_delay": statistics.mean(delays),
+        "max_delay": max(delays),
+        "simulated": mailbox.now(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bursts", type=int, default=8)
+    parser.add_argument("--burst-size", type=int, default=6, help="Max mails per burst.")
+    parser.add_argument("--spread", type=float, default=20, help="Seconds over which one burst arrives.")
+    parser.add_argument("--gap", type=float, default=900, help="Max idle seconds between bursts.")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=60)
+    parser.add_argument("--min-interval", type=float, default=15)
+    parser.add_argument("--max-interval", type=float, default=300)
+    parser.add_argument("--backoff", type=float, default=2)
+    parser.add_argument("--batch-window", type=float, default=5)
+    parser.add_argument("--build-cost", type=float, default=3, help="Seconds to build the agents on a new loop.")
+    parser.add_argument("--run-cost", type=float, default=10, help="Fixed seconds per triage run.")
+    parser.add_argument("--mail-cost", type=float, default=4, help="Seconds per triaged mail.")
+    parser.add_argument("--scale", type=float, default=0.002, help="Real seconds per simulated second.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # The daemon prints per run; keep only the table.
+    results = []
+    for run in (_fixed, _daemon):
+        with contextlib.redirect_stdout(io.StringIO()):
+            results.append(run(args))
+
+    print(f"{'mode':<30} {'polls':>6} {'runs':>5} {'builds':>7} {'mean delay':>11} {'max delay':>10} {'duration':>9}")
+    for r in results:
+        print(
+            f"{r['name']:<30} {r['polls']:>6} {r['runs']:>5} {r['builds']:>7} "
+            f"{r['mean_delay']:>10.0f}s {r['max_delay']:>9.0f}s {r['simulated']:>8.0f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
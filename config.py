@@ -49,6 +49,139 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 # Default batch size for triage.
 DEFAULT_UNREAD_LIMIT = int(os.getenv("UNREAD_LIMIT", "10"))
 
+# Gmail query for mail that still needs triage. Only recent mail, and never
+# anything already labelled by the agent (loop protection).
+UNREAD_TRIAGE_QUERY = os.getenv("UNREAD_TRIAGE_QUERY", "label:UNREAD -label:AI_Processed newer_than:2d")
+
+# Max number of calls per Gmail batch HTTP request (API hard limit is 100,
+# but Gmail starts rate limiting above ~50).
+GMAIL_BATCH_SIZE = int(os.getenv("GMAIL_BATCH_SIZE", "50"))
+
+# Socket timeout (seconds) for pooled Google API HTTP connections.
+GOOGLE_HTTP_TIMEOUT = int(os.getenv("GOOGLE_HTTP_TIMEOUT", "60"))
+
+# Retries of rate-limited (429/403 rateLimitExceeded) and 5xx Google API calls
+# made in code: up to GOOGLE_RETRY_ATTEMPTS retries, exponential backoff from
+# GOOGLE_RETRY_BASE_SECONDS, capped at GOOGLE_RETRY_MAX_SECONDS per wait.
+GOOGLE_RETRY_ATTEMPTS = int(os.getenv("GOOGLE_RETRY_ATTEMPTS", "5"))
+GOOGLE_RETRY_BASE_SECONDS = float(os.getenv("GOOGLE_RETRY_BASE_SECONDS", "1"))
+GOOGLE_RETRY_MAX_SECONDS = float(os.getenv("GOOGLE_RETRY_MAX_SECONDS", "30"))
+
+# Local SQLite/FTS5 mirror used by gmail_search (see sync_message_store.py).
+MESSAGE_STORE_DIR = Path(os.getenv("MESSAGE_STORE_DIR", BASE_DIR / "message_store"))
+MESSAGE_STORE_PROFILES = [p.strip() for p in os.getenv("MESSAGE_STORE_PROFILES", "private").split(",") if p.strip()]
+# How often (seconds) a search may trigger an incremental history refresh.
+MESSAGE_STORE_REFRESH_SECONDS = int(os.getenv("MESSAGE_STORE_REFRESH_SECONDS", "300"))
+
+# On-disk cache of extracted attachment text (LRU-evicted above the size cap).
+ATTACHMENT_CACHE_FILE = Path(os.getenv("ATTACHMENT_CACHE_FILE", BASE_DIR / "attachment_cache.sqlite"))
+ATTACHMENT_CACHE_MAX_BYTES = int(os.getenv("ATTACHMENT_CACHE_MAX_MB", "200")) * 1024 * 1024
+
+# Attachment extraction pool: download threads, parallel parser processes and
+# per-file limits. Files that exceed them come back as a [TRUNCATED: ...] marker.
+ATTACHMENT_IO_WORKERS = int(os.getenv("ATTACHMENT_IO_WORKERS", "4"))
+ATTACHMENT_CPU_WORKERS = int(os.getenv("ATTACHMENT_CPU_WORKERS", str(os.cpu_count() or 2)))
+ATTACHMENT_TIMEOUT_SECONDS = float(os.getenv("ATTACHMENT_TIMEOUT_SECONDS", "20"))
+ATTACHMENT_MEMORY_LIMIT_BYTES = int(os.getenv("ATTACHMENT_MEMORY_LIMIT_MB", "512")) * 1024 * 1024
+# Attachments larger than this (the part's body.size) are never downloaded.
+ATTACHMENT_MAX_BYTES = int(os.getenv("ATTACHMENT_MAX_MB", "20")) * 1024 * 1024
+# Extractors stop reading once this many characters of text have been collected.
+ATTACHMENT_MAX_CHARS = int(os.getenv("ATTACHMENT_MAX_CHARS", "8000"))
+
+# How often (seconds) the threadId -> draft index replays mailbox history
+# before answering a duplicate-draft check.
+DRAFT_INDEX_REFRESH_SECONDS = int(os.getenv("DRAFT_INDEX_REFRESH_SECONDS", "30"))
+
+# Multi-profile tools (gmail_search, calendar_list_events) query profiles in
+# parallel; a profile that doesn't answer within the timeout is left out.
+PROFILE_FANOUT_WORKERS = int(os.getenv("PROFILE_FANOUT_WORKERS", "8"))
+PROFILE_TIMEOUT_SECONDS = float(os.getenv("PROFILE_TIMEOUT_SECONDS", "15"))
+
+# Prefetch stage of run_triage: threads are fetched concurrently in code and
+# handed to the manager agent as one compact batch.
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "8"))
+PREFETCH_BODY_CHARS = int(os.getenv("PREFETCH_BODY_CHARS", "4000"))
+PREFETCH_THREAD_MESSAGES = int(os.getenv("PREFETCH_THREAD_MESSAGES", "5"))
+
+# Triage mode: "batch" runs one agent conversation for the whole batch,
+# "per_email" one independent session per mail, TRIAGE_CONCURRENCY at a time.
+# A mail whose session hasn't finished within the timeout is reported as failed.
+TRIAGE_MODE = os.getenv("TRIAGE_MODE", "batch")
+TRIAGE_CONCURRENCY = int(os.getenv("TRIAGE_CONCURRENCY", "4"))
+TRIAGE_EMAIL_TIMEOUT_SECONDS = float(os.getenv("TRIAGE_EMAIL_TIMEOUT_SECONDS", "300"))
+
+# Shared limit on model calls (all agents, all sessions in the process), so a
+# concurrent triage stays under the API quota. Short bursts up to MODEL_RATE_BURST.
+MODEL_CALLS_PER_MINUTE = float(os.getenv("MODEL_CALLS_PER_MINUTE", "60"))
+MODEL_RATE_BURST = int(os.getenv("MODEL_RATE_BURST", "4"))
+
+# Rule-based fast path: newsletters, receipts and notifications are labelled
+# from their headers without calling the model (rules in triage_rules.json).
+# A sender whose last SENDER_HISTORY_MIN mails got the same category keeps it.
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "1").lower() not in ("0", "false", "no")
+SENDER_HISTORY_MIN = int(os.getenv("SENDER_HISTORY_MIN", "3"))
+
+# Cache of delegated sub-agent answers, keyed by agent and normalized query.
+# TTL in seconds per agent; 0 disables caching for that agent. Calendar answers
+# (availability, bookings) are never cached.
+DELEGATION_CACHE_FILE = Path(os.getenv("DELEGATION_CACHE_FILE", BASE_DIR / "delegation_cache.sqlite"))
+DELEGATION_CACHE_TTL = {
+    "research": int(os.getenv("DELEGATION_CACHE_TTL_RESEARCH", str(24 * 3600))),
+    "radio": int(os.getenv("DELEGATION_CACHE_TTL_RADIO", "300")),
+    "grounded": int(os.getenv("DELEGATION_CACHE_TTL_GROUNDED", str(6 * 3600))),
+}
+
+# Adaptive thinking budget: each model call gets a budget between
+# THINKING_MIN_BUDGET and the agent's planner budget, from the size of the task
+# and how much similar calls actually used. RUN_TOKEN_CEILING caps the tokens
+# of one triage run (all agents); 0 = no ceiling.
+THINKING_ADAPTIVE = os.getenv("THINKING_ADAPTIVE", "1").lower() not in ("0", "false", "no")
+THINKING_MIN_BUDGET = int(os.getenv("THINKING_MIN_BUDGET", "512"))
+RUN_TOKEN_CEILING = int(os.getenv("RUN_TOKEN_CEILING", "400000"))
+
+# Per-run tracing of agent turns, tool calls and HTTP requests (opt-in); each
+# triage run is written to TRACE_DIR as JSONL and as a Chrome trace
+# (chrome://tracing, Perfetto). Only the newest TRACE_KEEP_RUNS runs are kept,
+# so --watch doesn't fill the disk; 0 = keep all.
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "0").lower() not in ("0", "false", "no")
+TRACE_DIR = Path(os.getenv("TRACE_DIR", BASE_DIR / "traces"))
+TRACE_KEEP_RUNS = int(os.getenv("TRACE_KEEP_RUNS", "50"))
+
+# Record/replay of external calls (Gmail/Calendar API, Gemini, Sveriges Radio MCP,
+# grounded search): "record" saves every response to CASSETTE_FILE, "replay" answers
+# from it without credentials or network. Empty = off (main.py --record/--replay).
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "")
+CASSETTE_FILE = Path(os.getenv("CASSETTE_FILE", BASE_DIR / "cassettes" / "triage.json"))
+
+# Google backend: "google" talks to the real Gmail/Calendar APIs, "fake" to an
+# in-process stand-in with a generated mailbox and calendar per profile (load
+# tests and demos without an account; see utils/fake_mailbox.py). The fake adds
+# FAKE_LATENCY_MS per round trip, answers with rate limit errors above
+# FAKE_QUOTA_PER_SECOND quota units (Gmail's per-user limit is 250; 0 = no limit)
+# and fails FAKE_ERROR_RATE of all calls with a 503.
+GOOGLE_BACKEND = os.getenv("GOOGLE_BACKEND", "google")
+FAKE_MAILBOX_MESSAGES = int(os.getenv("FAKE_MAILBOX_MESSAGES", "2000"))
+FAKE_MAILBOX_DRAFTS = int(os.getenv("FAKE_MAILBOX_DRAFTS", "20"))
+FAKE_CALENDAR_EVENTS = int(os.getenv("FAKE_CALENDAR_EVENTS", "200"))
+FAKE_SEED = int(os.getenv("FAKE_SEED", "0"))
+FAKE_LATENCY_MS = float(os.getenv("FAKE_LATENCY_MS", "50"))
+FAKE_QUOTA_PER_SECOND = float(os.getenv("FAKE_QUOTA_PER_SECOND", "250"))
+FAKE_ERROR_RATE = float(os.getenv("FAKE_ERROR_RATE", "0"))
+
+# Watchdog daemon (main.py --watch): one event loop for the whole session. The
+# poll interval starts at --interval, drops to WATCH_MIN_INTERVAL when new mail
+# arrives and grows by WATCH_BACKOFF per idle poll up to WATCH_MAX_INTERVAL.
+# After new mail the daemon polls again every WATCH_BATCH_WINDOW seconds while
+# more keeps arriving (up to --limit mails), so a burst becomes one triage run.
+WATCH_MIN_INTERVAL = float(os.getenv("WATCH_MIN_INTERVAL", "15"))
+WATCH_MAX_INTERVAL = float(os.getenv("WATCH_MAX_INTERVAL", "300"))
+WATCH_BACKOFF = float(os.getenv("WATCH_BACKOFF", "2"))
+WATCH_BATCH_WINDOW = float(os.getenv("WATCH_BATCH_WINDOW", "5"))
+# A mail whose triage fails this many times is moved to the dead-letter list in
+# sync_state.json and left unlabelled instead of being retried on every poll
+# (a retry re-runs the agent, and calendar bookings are not idempotent).
+TRIAGE_MAX_ATTEMPTS = int(os.getenv("TRIAGE_MAX_ATTEMPTS", "3"))
+
 # User-friendly app name for OAuth consent screen.
 APP_NAME = os.getenv("APP_NAME", "Mail & Calendar Copilot (Lab)")
 
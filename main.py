@@ -3,6 +3,7 @@ import asyncio
 import json
 import sys
 from pathlib import Path
+from typing import List, Optional
 
 # Monkeypatch aiohttp to fix google-genai crash on retry
 import aiohttp
@@ -10,28 +11,11 @@ if not hasattr(aiohttp, "ClientConnectorDNSError"):
     aiohttp.ClientConnectorDNSError = aiohttp.ClientConnectorError
 
 
-from google.adk.runners import InMemoryRunner
 from google.genai import types
 
 from agents.email_hub_agent import build_email_hub_agent
-import time
-from auth.google_auth import get_gmail_service, describe_auth_state
-from config import DEFAULT_UNREAD_LIMIT
-
-def check_unread_count(profile: str = "default") -> int:
-    """Check if there are unread messages without fetching content."""
-    try:
-        service = get_gmail_service(profile=profile)
-        # Use quotes around custom label to prevent hyphen issues
-        # Also limit to last 2 days to avoid processing old inbox backlog.
-        # CHANGED: Using underscore label to avoid search syntax issues.
-        results = service.users().messages().list(
-            userId="me", q='label:UNREAD -label:AI_Processed newer_than:2d', maxResults=1
-        ).execute()
-        return len(results.get("messages", []))
-    except Exception as e:
-        print(f"Watchdog Error during check: {e}")
-        return 0
+from auth.google_auth import describe_auth_state
+from config import DEFAULT_UNREAD_LIMIT, FAST_PATH_ENABLED, TRIAGE_CONCURRENCY, TRIAGE_MODE, WATCH_BATCH_WINDOW
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
@@ -62,60 +46,319 @@ def parse_args() -> argparse.Namespace:
         "--interval",
         type=int,
         default=60,
-        help="Sekunder att vänta mellan sökningar i Watchdog-läge (default 60s).",
+        help="Första väntetiden (s) mellan sökningar i Watchdog-läge; anpassas sedan mellan WATCH_MIN_INTERVAL och WATCH_MAX_INTERVAL (default 60s).",
+    )
+    parser.add_argument(
+        "--batch-window",
+        type=float,
+        default=WATCH_BATCH_WINDOW,
+        help="Sekunder att vänta på fler mail innan en triage startar i Watchdog-läge, 0 = direkt (default från env WATCH_BATCH_WINDOW).",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=["batch", "per_email"],
+        default=TRIAGE_MODE,
+        help="batch: en agentkonversation för hela batchen. per_email: en session per mail, parallellt (default från env TRIAGE_MODE).",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=TRIAGE_CONCURRENCY,
+        help="Max antal mail som triageras samtidigt i per_email-läge (default från env TRIAGE_CONCURRENCY).",
+    )
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument(
+        "--record",
+        metavar="FIL",
+        type=Path,
+        help="Spela in alla externa anrop (Gmail/Kalender, Gemini, SR, webbsök) till en kassett.",
+    )
+    cassette.add_argument(
+        "--replay",
+        metavar="FIL",
+        type=Path,
+        help="Spela upp en inspelad kassett: inga externa anrop, ingen inloggning.",
     )
     return parser.parse_args()
 
 
 from utils.story_logger import print_story_event
 
-async def run_triage(limit: int, quiet: bool) -> None:
-    # ... existing run_triage code ...
-    agent = build_email_hub_agent()
-    runner = InMemoryRunner(agent=agent, app_name="mail_calendar_copilot")
+def _triage_prompt(items: List[dict]) -> str:
+    from utils.label_registry import PROCESSED_LABEL
+    from utils.prefetch import format_batch
 
-    prompt = (
-        f"Triagera mina senaste {limit} olästa mail som INTE har etiketten 'AI_Processed'. "
+    return (
+        f"Triagera följande {len(items)} olästa mail. Innehållet är redan hämtat "
+        "(en JSON-rad per mail, citerad historik borttagen) – hämta det bara igen med "
+        "gmail_get_thread om texten slutar med \"[...trunkerat]\".\n"
         "För varje mail: \n"
         "1. Bestäm kategori (Svara/Barnens/Övrigt).\n"
-        "2. Sätt etiketten 'AI_Processed' PÅ ALLA som är behandlade (för att undvika loopar).\n"
-        "3. Skapa ev. utkast/kalenderhändelse.\n"
-        "4. Sammanfatta."
-    )
-
-    print(f"🚀 Startar triage av {limit} mail med Thinking-agent...\n")
-    
-    # Use run_debug to avoid manual session management issues, but collect events
-    events = await runner.run_debug(prompt, quiet=True) 
-
-    # Log events to story logger
-    print("\n--- 📝 Agentens Resonemang & Åtgärder ---")
-    
-    # Store all tool calls to check if SR tools were used
-    sr_tools_used = False
-    
-    for event in events:
-        print_story_event(event)
-        
-        # Check if any SR tool was called
-        if hasattr(event, "tool_calls") and event.tool_calls:
-            for call in event.tool_calls:
-                if call.name in ["search_programs", "get_channel_rightnow", "get_all_rightnow", "list_channels"]:
-                    sr_tools_used = True
-    
-    if not sr_tools_used:
-        # Only warn if it looks like we missed an opportunity? 
-        # Actually this warning writes every time, maybe we should suppress it if no relevant email was found?
-        # But for now, let's keep it or remove it. The user wanted debug.
-        # Let's keep it simple.
-        pass
-    
+        f"2. Skapa ev. utkast/kalenderhändelse. (Etiketter, även '{PROCESSED_LABEL}', sätts automatiskt efteråt – sätt inga själv.)\n"
+        "3. Sammanfatta.\n\n"
+        f"{format_batch(items)}"
+    )
+
+
+async def _run_agent_triage(message_ids: List[str], quiet: bool, mode: str, concurrency: int, metrics) -> List[str]:
+    """Prefetch `message_ids` and triage them with the manager agent. Returns the ids that failed."""
+    from agents.registry import get_agent_registry
+    from utils.parallel_triage import format_summaries, triage_each
+    from utils.prefetch import prefetch_batch
+    from utils.rate_limiter import get_model_rate_limiter
+    from utils.thinking_budget import stopped_by_ceiling
+    from utils.tracing import get_tracer
+
+    tracer = get_tracer()
+    # Fetch every thread before the model is called: no turns spent on reading mail.
+    with tracer.span("phase", "prefetch", mails=len(message_ids)):
+        items = await prefetch_batch(message_ids)
+    metrics.prefetch_done()
+    if not quiet:
+        print(f"📥 Förhämtade {len(items)} mail på {metrics.prefetch_seconds:.1f}s.")
+    failed = [item["message_id"] for item in items if "error" in item]
+
+    # Built once per process (and day); each run only creates new sessions.
+    runner = await get_agent_registry().runner("mail_calendar_copilot", build_email_hub_agent)
+
+    if mode == "per_email":
+        print(f"🚀 Startar triage av {len(items)} mail, {concurrency} åt gången...\n")
+        results = await triage_each(
+            runner, items, lambda item: _triage_prompt([item]), on_event=metrics.observe, concurrency=concurrency
+        )
+        if not quiet:
+            # Each mail's story is printed as one block, so concurrent sessions don't interleave.
+            for r in results:
+                print(f"\n--- 📝 {r.get('subject') or r['message_id']} ({r['seconds']:.1f}s) ---")
+                for event in r["events"]:
+                    print_story_event(event)
+        print("\n--- 📋 Sammanfattning ---")
+        print(format_summaries(results))
+        failed = [r["message_id"] for r in results if "error" in r]
+    else:
+        session = await runner.session_service.create_session(
+            app_name=runner.app_name, user_id="triage"
+        )
+        print(f"🚀 Startar triage av {len(items)} mail med Thinking-agent...\n")
+        print("\n--- 📝 Agentens Resonemang & Åtgärder ---")
+
+        # Stream the events so decisions show up (and are timed) as they happen.
+        stopped = False
+        async for event in runner.run_async(
+            user_id=session.user_id,
+            session_id=session.id,
+            new_message=types.Content(role="user", parts=[types.Part(text=_triage_prompt(items))]),
+        ):
+            metrics.observe(event)
+            print_story_event(event)
+            stopped = stopped or stopped_by_ceiling([event])
+        if stopped:
+            # Which mails the conversation got through is unknown: none of them counts as processed.
+            print("⛔ Tokentaket nåddes under körningen; batchen lämnas omärkt till nästa körning.")
+            failed = [item["message_id"] for item in items]
+
+    metrics.finish()
+    metrics.report()
+    limiter = get_model_rate_limiter().stats()
+    if limiter["throttled"]:
+        print(f"⏳ Modellanrop strypta {limiter['throttled']} gånger ({limiter['waited_seconds']:.1f}s väntan).")
+    return failed
+
+
+async def run_triage(
+    limit: int,
+    quiet: bool,
+    message_ids: Optional[List[str]] = None,
+    mode: str = TRIAGE_MODE,
+    concurrency: int = TRIAGE_CONCURRENCY,
+) -> List[str]:
+    """
+    Run one triage. Returns the ids of mails that could not be triaged.
+    If message_ids is given (e.g. the delta from MailboxSync), only those mails are
+    triaged; otherwise the latest `limit` unread mails. Mail the fast-path rules
+    recognize is labelled without the model; the rest is prefetched into the
+    prompt. The AI_Processed label is set afterwards in one bulk call, not by the model,
+    and only on mails that were actually triaged; failed ones stay unlabelled.
+    mode "batch" triages all mails in one agent conversation; "per_email" gives each
+    mail its own session, `concurrency` at a time, and merges the summaries.
+    With TRACING_ENABLED the run is traced (utils/tracing.py): a summary table is
+    printed at the end and the spans are written to TRACE_DIR.
+    """
+    from utils.tracing import get_tracer
+
+    tracer = get_tracer()
+    tracer.start_run("triage")
+    try:
+        return await _run_triage(limit, quiet, message_ids, mode, concurrency)
+    finally:
+        paths = tracer.finish_run()
+        if paths:
+            tracer.print_summary()
+            print(f"🧵 Spårning sparad: {paths[0]} (Chrome/Perfetto: {paths[1].name})")
+        _report_cassette()
+
+
+def _report_cassette() -> None:
+    from utils.cassette import get_cassette
+
+    cassette = get_cassette()
+    if cassette is None:
+        return
+    stats = cassette.stats()
+    if cassette.replaying:
+        print(f"📼 Uppspelning: {stats['hits']} svar från {cassette.path.name}, {stats['misses']} saknades.")
+    else:
+        # Saved after every run, so a watch session that is stopped keeps what it recorded.
+        cassette.save()
+        print(f"📼 Kassett sparad: {cassette.path} ({stats['interactions']} interaktioner).")
+
+
+async def _run_triage(
+    limit: int,
+    quiet: bool,
+    message_ids: Optional[List[str]],
+    mode: str,
+    concurrency: int,
+) -> List[str]:
+    from auth.google_auth import get_gmail_service
+    from tools.gmail_tools import GmailToolset
+    from utils.label_registry import PROCESSED_LABEL
+    from utils.triage_metrics import TriageMetrics
+    from utils.thinking_budget import get_thinking_scheduler
+    from utils.triage_rules import get_fast_path_classifier
+    from utils.tracing import get_tracer
+
+    tracer = get_tracer()
+    metrics = TriageMetrics()
+    # Token ceiling and budget statistics are per run.
+    thinking = get_thinking_scheduler()
+    thinking.start_run()
+    gmail = GmailToolset()
+    if not message_ids:
+        # Pick the mails in code, so exactly these can be labelled when the run is done.
+        unread = await asyncio.to_thread(gmail.gmail_list_unread, limit)
+        message_ids = [m["message_id"] for m in unread]
+        if not message_ids:
+            print("📭 Inga olästa mail att triagera.")
+            return []
+
+    fast = {}
+    agent_ids = message_ids
+    if FAST_PATH_ENABLED:
+        # Obvious newsletters/receipts/notifications are labelled from their headers, without the model.
+        classifier = get_fast_path_classifier()
+        with tracer.span("phase", "fast_path", mails=len(message_ids)):
+            fast, agent_ids = await asyncio.to_thread(
+                classifier.classify_batch, get_gmail_service(profile="default"), message_ids
+            )
+            by_label = {}
+            for message_id, decision in fast.items():
+                if decision["label"]:
+                    by_label.setdefault(decision["label"], []).append(message_id)
+            for label, ids in by_label.items():
+                await asyncio.to_thread(gmail.gmail_apply_labels_bulk, ids, label)
+        if fast:
+            print(f"⚡ Snabbsortering: {len(fast)}/{len(message_ids)} mail sorterade utan modellen.")
+            if not quiet:
+                for decision in fast.values():
+                    print(f"   ⚡ [{decision['category']}] {decision['subject']} (regel: {decision['rule']})")
+
+    failed: List[str] = []
+    if agent_ids:
+        failed = await _run_agent_triage(agent_ids, quiet, mode, concurrency, metrics)
+        thinking.report()
+        thinking.save_history()
+    else:
+        print("✨ Inget mail behövde agenten.")
+
+    if fast:
+        stats = classifier.stats()
+        # Estimate from this run's cost per mail on the agent path (one session ≈ 2 turns otherwise).
+        per_mail = metrics.model_turns / len(agent_ids) if agent_ids and metrics.model_turns else 2
+        print(
+            f"⚡ Snabbspår: träffgrad {stats['hit_rate']:.0%} ({stats['hits']}/{stats['total']} sedan start), "
+            f"~{round(per_mail * len(fast))} modellanrop undvikna i denna körning."
+        )
+
+    from utils.attachment_cache import get_attachment_cache
+    cache_stats = get_attachment_cache().stats()
+    print(
+        f"\n📎 Bilagecache: {cache_stats['hits']} träffar, "
+        f"{cache_stats['content_hits']} innehållsträffar, {cache_stats['misses']} missar."
+    )
+    from utils.delegation_cache import get_delegation_cache
+    delegation_stats = get_delegation_cache().stats()
+    print(
+        f"🗂️ Delegeringscache: {delegation_stats['hits']} träffar, {delegation_stats['misses']} missar "
+        f"({delegation_stats['entries']} sparade svar)."
+    )
+
+    # Mark the triaged mails as processed: one batchModify instead of a model turn per mail.
+    # Failed mails stay unlabelled, so the next run (or the watchdog's requeue) picks them up.
+    failed_ids = set(failed)
+    done = [mid for mid in message_ids if mid not in failed_ids]
+    if done:
+        with tracer.span("phase", "mark_processed", mails=len(done)):
+            labeled = await asyncio.to_thread(gmail.gmail_apply_labels_bulk, done, PROCESSED_LABEL)
+        print(f"\n🏷️ {PROCESSED_LABEL} satt på {labeled['labeled']}/{len(done)} mail.")
+        if labeled["failed"]:
+            print(f"⚠️ Kunde inte märka: {', '.join(labeled['failed'])}")
+    if failed:
+        print(f"⚠️ {len(failed)} mail kunde inte triageras och lämnas omärkta: {', '.join(failed)}")
+
     print("\n✅ Triage slutförd.")
+    return failed
+
+
+async def _watch(args: argparse.Namespace, safety) -> None:
+    """
+    Watchdog daemon: one event loop for the whole session (utils/watchdog.py).
+    Agents, runners and API clients are built once and reused by every run.
+    """
+    from agents.registry import get_agent_registry
+    from utils.label_registry import get_label_registry
+    from utils.mailbox_sync import MailboxSync
+    from utils.watchdog import AdaptiveInterval, Watchdog
+
+    sync = MailboxSync()
+    # Resolve triage labels once up front; agent runs then never call labels.list.
+    await asyncio.to_thread(get_label_registry().prewarm, ["default"])
+    registry = get_agent_registry()
+    # Build the manager agent on this loop now, so the first mail doesn't pay for it.
+    await registry.runner("mail_calendar_copilot", build_email_hub_agent)
+
+    watchdog = Watchdog(
+        # Fetch only the mail that arrived since the last poll (history API).
+        poll=lambda: asyncio.to_thread(sync.poll, "default"),
+        triage=lambda ids: run_triage(
+            args.limit, args.quiet, message_ids=ids, mode=args.mode, concurrency=args.concurrency
+        ),
+        requeue=lambda ids, attempted: sync.requeue("default", ids, attempted),
+        # Mails stay pending in sync_state.json until triaged, so a crash mid-run loses nothing.
+        ack=lambda ids: sync.ack("default", ids),
+        is_retry=lambda mid: sync.is_retry("default", mid),
+        limit=args.limit,
+        interval=AdaptiveInterval(args.interval),
+        batch_window=args.batch_window,
+        safety=safety,
+    )
+    print(
+        f"🐕 Startar Watchdog-läge. Kollar mail var {watchdog.interval.current:g} sekund "
+        f"({watchdog.interval.minimum:g}–{watchdog.interval.maximum:g}s beroende på trafik)..."
+    )
+    try:
+        await watchdog.run()
+    finally:
+        await registry.aclose()
 
 
 def main() -> None:
     args = parse_args()
 
+    if args.record or args.replay:
+        from utils.cassette import use_cassette
+        use_cassette(args.record or args.replay, "record" if args.record else "replay")
+
     if args.dry_run:
         print("Auth-läge:")
         print(json.dumps(describe_auth_state(), indent=2))
@@ -125,40 +368,15 @@ def main() -> None:
     safety = SafetyMonitor()
 
     if args.watch:
-        print(f"🐕 Startar Watchdog-läge. Kollar mail var {args.interval} sekund...")
         try:
-            while True:
-                # 1. Check Safety Circuit Breaker
-                if not safety.check_limits():
-                    print("🛑 Circuit Breaker triggered. Waiting (60s)...")
-                    time.sleep(60)
-                    continue
-
-                # 2. Check if unread mail exists (cheap check)
-                count = check_unread_count("default")
-                if count > 0:
-                    print(f"\n📨 Hittade {count}+ olästa mail! Väckte agenten...")
-                    try:
-                        asyncio.run(run_triage(args.limit, args.quiet))
-                        # RECORD SUCCESS for safety limits
-                        safety.record_run()
-                    except Exception as e:
-                        print(f"❌ Fel under triage-körning: {e}")
-                        import traceback
-                        traceback.print_exc()
-                else:
-                    # Optional: Print dot to show aliveness
-                    # print(".", end="", flush=True) 
-                    pass
-
-                time.sleep(args.interval)
+            asyncio.run(_watch(args, safety))
         except KeyboardInterrupt:
             print("\n🛑 Watchdog stoppad av användare.")
-            sys.exit(0)
+        sys.exit(0)
     else:
         # Normal one-off run
         try:
-            asyncio.run(run_triage(args.limit, args.quiet))
+            asyncio.run(run_triage(args.limit, args.quiet, mode=args.mode, concurrency=args.concurrency))
             print("Triage completed successfully.")
         except Exception:
             import traceback
@@ -0,0 +1,45 @@
+import argparse
+
+from auth.google_auth import get_gmail_service
+from config import MESSAGE_STORE_PROFILES
+from utils.message_store import get_message_store
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Mirror Gmail metadata into the local SQLite/FTS5 message store."
+    )
+    parser.add_argument(
+        "--profile",
+        action="append",
+        help="Profil att synka (kan anges flera gånger). Default: MESSAGE_STORE_PROFILES.",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Tvinga full synk även om lagret redan finns.",
+    )
+    parser.add_argument(
+        "--no-bodies",
+        action="store_true",
+        help="Spegla bara headers och snippets (mycket snabbare första synk).",
+    )
+    return parser.parse_args()
+
+
+def sync_profiles():
+    args = parse_args()
+    for profile in args.profile or MESSAGE_STORE_PROFILES:
+        store = get_message_store(profile)
+        service = get_gmail_service(profile=profile)
+        if args.full or not store.is_ready():
+            print(f"\n[{profile.upper()}] Full synk...")
+            count = store.full_sync(service, with_bodies=not args.no_bodies)
+        else:
+            print(f"\n[{profile.upper()}] Inkrementell synk...")
+            count = store.refresh(service, rebuild=True)
+        print(f" -> {count} meddelanden uppdaterade, {store.count()} totalt i {store.path}")
+
+
+if __name__ == "__main__":
+    sync_profiles()
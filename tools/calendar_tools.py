@@ -5,6 +5,7 @@ from google.adk.tools.base_toolset import BaseToolset
 from google.adk.tools.function_tool import FunctionTool
 
 from auth.google_auth import get_calendar_service
+from utils.profile_fanout import fan_out
 
 
 class CalendarToolset(BaseToolset):
@@ -22,37 +23,44 @@ class CalendarToolset(BaseToolset):
     ) -> list[Dict[str, str]]:
         """List events on primary calendar between time_min and time_max (RFC3339)."""
         all_events = []
-        for profile in profiles:
-            try:
-                service = get_calendar_service(profile=profile)
-                events_result = (
-                    service.events()
-                    .list(
-                        calendarId="primary",
-                        timeMin=time_min,
-                        timeMax=time_max,
-                        maxResults=max_results,
-                        singleEvents=True,
-                        orderBy="startTime",
-                    )
-                    .execute()
-                )
-                items = events_result.get("items", [])
-                for e in items:
-                    all_events.append({
-                        "id": e.get("id"),
-                        "summary": f"[{profile}] {e.get('summary', '')}",
-                        "start": e.get("start", {}).get("dateTime", e.get("start", {}).get("date")),
-                        "end": e.get("end", {}).get("dateTime", e.get("end", {}).get("date")),
-                        "profile": profile
-                    })
-            except Exception as e:
-                print(f"Error fetching calendar for {profile}: {e}")
-        
-        # Sort combined list by start time
+        # Profiles are queried in parallel; a slow account can't hold up the others.
+        for profile, events, error in fan_out(
+            profiles, lambda profile: self._list_profile_events(profile, time_min, time_max, max_results)
+        ):
+            if error is not None:
+                print(f"Error fetching calendar for {profile}: {error}")
+                continue
+            all_events.extend(events)
+
+        # Sort combined list by start time (stable: ties keep profile order)
         all_events.sort(key=lambda x: x.get("start", ""))
         return all_events[:max_results]
 
+    def _list_profile_events(self, profile: str, time_min: str, time_max: str, max_results: int) -> list[Dict[str, str]]:
+        service = get_calendar_service(profile=profile)
+        events_result = (
+            service.events()
+            .list(
+                calendarId="primary",
+                timeMin=time_min,
+                timeMax=time_max,
+                maxResults=max_results,
+                singleEvents=True,
+                orderBy="startTime",
+            )
+            .execute()
+        )
+        return [
+            {
+                "id": e.get("id"),
+                "summary": f"[{profile}] {e.get('summary', '')}",
+                "start": e.get("start", {}).get("dateTime", e.get("start", {}).get("date")),
+                "end": e.get("end", {}).get("dateTime", e.get("end", {}).get("date")),
+                "profile": profile
+            }
+            for e in events_result.get("items", [])
+        ]
+
     def calendar_create_event(
         self,
         summary: str,
@@ -1,25 +1,40 @@
 import asyncio
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 from google.adk.tools.base_tool import BaseTool
 from google.adk.tools.base_toolset import BaseToolset
 from google.adk.tools.function_tool import FunctionTool
-from google.adk.runners import InMemoryRunner
 
 from agents.context_agent import build_context_agent
 from agents.radio_agent import build_radio_agent
 from agents.calendar_agent import build_calendar_agent
+from agents.registry import get_agent_registry
 from tools.google_search_toolset import GoogleSearchToolset
+from utils.delegation_cache import get_delegation_cache
+from utils.thinking_budget import stopped_by_ceiling
 
 
 # Helper to run an agent single-shot
-async def _run_agent_task(agent_builder, task_prompt: str, log_prefix: str) -> str:
+async def _run_agent_task(
+    agent_builder,
+    task_prompt: str,
+    log_prefix: str,
+    cache_agent: Optional[str] = None,
+    cache_query: str = "",
+    cache_context: str = "",
+) -> str:
+    # Answers are cached per (cache_agent, normalized cache_query, cache_context) with the agent's TTL.
+    cache = get_delegation_cache()
+    if cache_agent:
+        cached = cache.lookup(cache_agent, cache_query, cache_context)
+        if cached is not None:
+            print(f"\n♻️ [{log_prefix}] Svar från cache: {cached[:100]}...")
+            return cached
+
     print(f"\n🤖 [Manager] Delegerar till {log_prefix}...")
     try:
-        agent = agent_builder()
-        runner = InMemoryRunner(agent=agent)
-        # We run with quiet=True to keep main log clean, but you could enable it for debugging
-        events = await runner.run_debug(task_prompt)
+        # The agent and runner are built once per process; each task gets a fresh session.
+        events = await get_agent_registry().run_task(log_prefix, agent_builder, task_prompt)
         
         # Determine the final answer. 
         # Collect all text from ModelResponse events, ignoring empty strings.
@@ -54,6 +69,9 @@ async def _run_agent_task(agent_builder, task_prompt: str, log_prefix: str) -> s
             # Sometimes the agent thinks before speaking, so we might get thoughts.
             # Ideally we'd validte if it's a thought or user-msg, but for now:
             final_text = final_text_parts[-1]
+            # A run cut short by the token ceiling is not an answer worth keeping.
+            if cache_agent and not stopped_by_ceiling(events):
+                cache.store(cache_agent, cache_query, final_text, cache_context)
         elif used_tools:
             # Fallback: Agent did work but didn't speak?
             final_text = f"Agenten utförde: {', '.join(used_tools)}, men gav ingen textrapport."
@@ -90,7 +108,7 @@ class DelegationToolset(BaseToolset):
         prompt = f"Uppdrag: Sök efter information om följande: '{query}'. Rapportera vad du hittar."
         if email_context:
             prompt += f"\n\nBAKGRUND (MAIL-KONTEXT):\n{email_context}"
-        return await _run_agent_task(build_context_agent, prompt, "ResearchAgent")
+        return await _run_agent_task(build_context_agent, prompt, "ResearchAgent", "research", query, email_context)
 
     async def ask_radio_expert(self, query: str, email_context: str = "") -> str:
         """
@@ -102,7 +120,7 @@ class DelegationToolset(BaseToolset):
         prompt = f"Uppdrag: Rekommendera innehåll baserat på önskemålet: '{query}'."
         if email_context:
             prompt += f"\n\nBAKGRUND (MAIL-KONTEXT):\n{email_context}"
-        return await _run_agent_task(build_radio_agent, prompt, "RadioAgent")
+        return await _run_agent_task(build_radio_agent, prompt, "RadioAgent", "radio", query, email_context)
 
     async def ask_calendar_secretary(self, request: str, email_context: str = "") -> str:
         """
@@ -125,9 +143,18 @@ class DelegationToolset(BaseToolset):
             f"Gör en kort grounded webbsökning för att identifiera/förklara: '{query}'. "
             f"Ge kort sammanfattning och länkar."
         )
+        cache = get_delegation_cache()
+        cached = cache.lookup("grounded", query)
+        if cached is not None:
+            print(f"\n♻️ [GroundedSearch] Svar från cache: {cached[:100]}...")
+            return cached
         # Kör verktyget direkt (Google Search toolset) för att undvika extra LLM-hopp
         try:
             toolset = GoogleSearchToolset()
-            return await toolset.search_web(prompt)
+            answer = await toolset.search_web(prompt)
+            # _do_search reports failures as text; only cache real answers.
+            if answer and not answer.startswith("Grounded sökning misslyckades"):
+                cache.store("grounded", query, answer)
+            return answer
         except Exception as e:
             return f"Grounded search misslyckades: {e}"
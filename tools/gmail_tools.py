@@ -1,6 +1,8 @@
+import asyncio
 import base64
 import email
 import re
+import time
 from email.mime.text import MIMEText
 from typing import Any, Dict, List, Optional
 
@@ -11,64 +13,147 @@ from google.adk.tools.base_toolset import BaseToolset
 from google.adk.tools.function_tool import FunctionTool
 
 from auth.google_auth import get_gmail_service
-from config import PROFILES
+from config import GMAIL_BATCH_SIZE, GOOGLE_RETRY_ATTEMPTS, MESSAGE_STORE_PROFILES, PROFILES, UNREAD_TRIAGE_QUERY
+from utils.api_retry import is_retryable, retry_delay
+from utils.draft_index import get_draft_index
+from utils.extraction_pool import SUPPORTED_EXTENSIONS, get_extraction_pool
+from utils.html_to_text import html_to_text
+from utils.label_registry import get_label_registry
+from utils.message_store import get_message_store
+from utils.profile_fanout import fan_out
+from utils.subject_index import get_subject_index, strip_reply_prefixes
+
+LIST_METADATA_HEADERS = ["From", "To", "Subject", "Date"]
+
+# messages.batchModify accepts at most this many ids per call.
+BATCH_MODIFY_LIMIT = 1000
+
+ATTACHMENT_MARKER = "\n\n--- BITOGAD FIL: "
+
+# Reply-history markers. Everything from the first match down is earlier mail
+# that the thread already contains, so it is cut (see _strip_quoted_text).
+_REPLY_HEADER_RES = [
+    re.compile(r"^On\b.{0,200}\d.{0,200}\bwrote:\s*$", re.IGNORECASE),                  # Gmail/Apple (en)
+    re.compile(r"^Den\b.{0,200}\d.{0,200}\bskrev\b.{0,200}:\s*$", re.IGNORECASE),       # Gmail/Apple (sv)
+    re.compile(r"^.{0,120}<[^<>\s]+@[^<>\s]+>\s*(skrev|wrote)\b.{0,80}:\s*$", re.IGNORECASE),  # "Anna <a@b> skrev:"
+    re.compile(r"^-{2,}\s*(Original Message|Ursprungligt meddelande|Originalmeddelande)\s*-{2,}\s*$", re.IGNORECASE),
+]
+_OUTLOOK_FROM_RE = re.compile(r"^\*?(From|Från|Fra):\*?\s", re.IGNORECASE)
+_OUTLOOK_SENT_RE = re.compile(r"^\*?(Sent|Date|Skickat|Datum|Skickades|Sendt):\*?\s", re.IGNORECASE)
+# Forwarded mail is content the sender wants handled, never history: nothing at
+# or below a forward marker is cut.
+_FORWARD_RE = re.compile(
+    r"^(-{2,}\s*(Forwarded message|Vidarebefordrat meddelande|Videresendt melding)\s*-{2,}|"
+    r"Begin forwarded message:|Vidarebefordrat brev:|Start på vidarebefordrat meddelande:)\s*$",
+    re.IGNORECASE,
+)
+_FORWARD_SUBJECT_RE = re.compile(r"^\*?(Subject|Ämne|Emne):\*?\s*(FW|Fwd|VB|VS|WG)\s*:", re.IGNORECASE)
+_QUOTE_RE = re.compile(r"^\s*>")
+# RFC 3676 signature delimiter: exactly "-- " (with the trailing space).
+_SIGNATURE_DELIMITER = "-- "
+_SIGNATURE_RE = re.compile(
+    r"^((Sent|Skickat|Skickad) (from|från) (my|min|mitt) .{0,40}|"
+    r"(Get|Hämta) Outlook (for|för) .{0,20})\s*$",
+    re.IGNORECASE,
+)
+_FOOTER_RE = re.compile(
+    r"^\W{0,3}(CONFIDENTIALITY NOTICE|DISCLAIMER|"
+    r"This (e-?mail|message)( and any (files|attachments).{0,40})? (is|are|may be|may contain|contains) (confidential|intended)|"
+    r"The information (contained )?in this (e-?mail|message)|"
+    r"Detta (e-?post|e-?mail|mejl|meddelande).{0,60}(konfidentiell|sekretess|avsett)|"
+    r"Informationen i (detta|det här) (e-?post|e-?mail|mejl|meddelande)|"
+    r"Please consider the environment|Tänk på miljön)",
+    re.IGNORECASE,
+)
+# Signatures and footers only count in the last lines of the sender's own text;
+# the same words higher up are content.
+_SIGNATURE_TAIL_LINES = 10
+_FOOTER_TAIL_LINES = 20
 
 
 def _headers_map(headers: List[dict]) -> Dict[str, str]:
     return {h["name"]: h.get("value", "") for h in headers or []}
 
 
-import io
-import pypdf
-import docx
-import openpyxl
+def _batch_get_messages(service, message_ids: List[str], format: str = "metadata", metadata_headers: Optional[List[str]] = None) -> List[dict]:
+    """
+    Fetch many messages via Gmail's batch endpoint.
+    One HTTP round trip per GMAIL_BATCH_SIZE ids instead of one per message.
+    Results keep the order of message_ids. Sub-requests that hit a rate limit or
+    a 5xx are retried with backoff; if they still fail, the last error is raised.
+    Ids that fail otherwise (e.g. deleted messages) are skipped.
+    """
+    responses: Dict[str, dict] = {}
+    retry: Dict[str, Exception] = {}
+
+    def on_response(request_id, response, exception):
+        if exception is None:
+            responses[request_id] = response
+        elif is_retryable(exception):
+            retry[request_id] = exception
+        else:
+            print(f"⚠️ Failed to fetch message {request_id}: {exception}")
+
+    unique_ids = list(dict.fromkeys(message_ids))
+    pending = unique_ids
+    for attempt in range(GOOGLE_RETRY_ATTEMPTS + 1):
+        retry.clear()
+        for start in range(0, len(pending), GMAIL_BATCH_SIZE):
+            batch = service.new_batch_http_request(callback=on_response)
+            for msg_id in pending[start:start + GMAIL_BATCH_SIZE]:
+                batch.add(
+                    service.users()
+                    .messages()
+                    .get(
+                        userId="me",
+                        id=msg_id,
+                        format=format,
+                        metadataHeaders=metadata_headers,
+                    ),
+                    request_id=msg_id,
+                )
+            batch.execute()
+        if not retry:
+            break
+        if attempt == GOOGLE_RETRY_ATTEMPTS:
+            raise next(iter(retry.values()))
+        pending = [msg_id for msg_id in pending if msg_id in retry]
+        time.sleep(retry_delay(attempt))
+
+    return [responses[msg_id] for msg_id in unique_ids if msg_id in responses]
+
+
+def _batch_modify_each(service, message_ids: List[str], label_id: str) -> Dict[str, str]:
+    """
+    Add a label message by message (inside Gmail batch HTTP requests), to find out
+    which ids fail when a batchModify call is rejected. Returns {id: error}.
+    """
+    failed: Dict[str, str] = {}
+
+    def on_response(request_id, response, exception):
+        if exception is not None:
+            failed[request_id] = str(exception)
+
+    for start in range(0, len(message_ids), GMAIL_BATCH_SIZE):
+        batch = service.new_batch_http_request(callback=on_response)
+        for msg_id in message_ids[start:start + GMAIL_BATCH_SIZE]:
+            batch.add(
+                service.users()
+                .messages()
+                .modify(userId="me", id=msg_id, body={"addLabelIds": [label_id]}),
+                request_id=msg_id,
+            )
+        batch.execute()
+    return failed
 
-def _extract_pdf_text(data: bytes, pages: int = 2) -> str:
-    try:
-        reader = pypdf.PdfReader(io.BytesIO(data))
-        text = []
-        for i in range(min(pages, len(reader.pages))):
-            text.append(reader.pages[i].extract_text() or "")
-        return "\n".join(text)
-    except Exception as e:
-        return f"[Error processing PDF: {e}]"
-
-def _extract_docx_text(data: bytes, pages: int = 2) -> str: # Pages is hard to limit in docx, we limit paragraphs?
-    try:
-        doc = docx.Document(io.BytesIO(data))
-        text = []
-        # Rough limit: 50 paragraphs ~ 2 pages
-        limit = 50
-        for para in doc.paragraphs[:limit]:
-            text.append(para.text)
-        return "\n".join(text)
-    except Exception as e:
-        return f"[Error processing DOCX: {e}]"
-
-def _extract_xlsx_text(data: bytes, rows: int = 50) -> str:
-    try:
-        wb = openpyxl.load_workbook(io.BytesIO(data), data_only=True)
-        sheet = wb.active
-        text = []
-        for i, row in enumerate(sheet.iter_rows(values_only=True)):
-            if i >= rows: break
-            # Filter None and join
-            row_text = "\t".join([str(c) if c is not None else "" for c in row])
-            if row_text.strip():
-                text.append(row_text)
-        return "\n".join(text)
-    except Exception as e:
-        return f"[Error processing XLSX: {e}]"
-
-
-def _decode_body(payload: dict, service=None, message_id=None) -> Dict[str, str]:
-    """Extract plain/text, html bodies and ATTACHMENTS from Gmail payload."""
+
+def _walk_payload(payload: dict, message_id: Optional[str], profile: str, attachment_jobs: Optional[List[Dict[str, str]]]) -> Dict[str, str]:
+    """Collect text/html bodies; append supported attachments to attachment_jobs (if given)."""
     text_body = ""
     html_body = ""
-    attachments_text = ""
 
     def walk(part: dict):
-        nonlocal text_body, html_body, attachments_text
+        nonlocal text_body, html_body
         mime = part.get("mimeType", "")
         body = part.get("body", {})
         data = body.get("data")
@@ -83,41 +168,155 @@ def _decode_body(payload: dict, service=None, message_id=None) -> Dict[str, str]
             elif mime == "text/html":
                 html_body += decoded
         
-        # 2. Handle Attachments (if service and message_id are provided)
-        elif filename and attachment_id and service and message_id:
+        # 2. Collect Attachments (if we are asked to and know the message)
+        elif filename and attachment_id and attachment_jobs is not None and message_id:
             # Check supported extensions
-            lower_name = filename.lower()
-            if lower_name.endswith(('.pdf', '.docx', '.xlsx')):
-                try:
-                    att = service.users().messages().attachments().get(
-                        userId="me", messageId=message_id, id=attachment_id
-                    ).execute()
-                    att_data = base64.urlsafe_b64decode(att["data"])
-                    
-                    extracted = ""
-                    if lower_name.endswith('.pdf'):
-                        extracted = _extract_pdf_text(att_data)
-                    elif lower_name.endswith('.docx'):
-                        extracted = _extract_docx_text(att_data)
-                    elif lower_name.endswith('.xlsx'):
-                        extracted = _extract_xlsx_text(att_data)
-                    
-                    if extracted:
-                        attachments_text += f"\n\n--- BITOGAD FIL: {filename} ---\n{extracted}\n--- SLUT PÅ FIL ---\n"
-                except Exception as e:
-                    print(f"Failed to read attachment {filename}: {e}")
+            if filename.lower().endswith(SUPPORTED_EXTENSIONS):
+                attachment_jobs.append(
+                    {
+                        "profile": profile,
+                        "message_id": message_id,
+                        # attachmentIds change between fetches; partId is stable.
+                        "part_key": part.get("partId") or filename,
+                        "attachment_id": attachment_id,
+                        "filename": filename,
+                        "size": body.get("size", 0),
+                    }
+                )
 
         for sub in part.get("parts", []) or []:
             walk(sub)
 
     walk(payload)
-    
-    # Combine attachments into text body so agents see it
-    full_text = text_body.strip()
-    if attachments_text:
-        full_text += "\n" + attachments_text
-
-    return {"text": full_text, "html": html_body.strip()}
+    text_body, html_body = text_body.strip(), html_body.strip()
+    if not text_body and html_body:
+        # HTML-only mail (newsletters, school platforms): give the agents readable text.
+        text_body = html_to_text(html_body)
+    return {"text": text_body, "html": html_body}
+
+
+def _decode_messages(
+    messages: List[dict], profile: str = "default", with_attachments: bool = True, include_html: bool = False
+) -> List[Dict[str, str]]:
+    """
+    Extract plain/text, html bodies and ATTACHMENTS for several Gmail messages.
+    All attachments are resolved in one go on the extraction pool (cached,
+    parallel, with per-file timeouts), not inline in the walk.
+    HTML-only messages get text converted from the HTML; the raw html is
+    left empty unless include_html is set.
+    """
+    attachment_jobs: Optional[List[Dict[str, str]]] = [] if with_attachments else None
+    bodies = [_walk_payload(m.get("payload", {}), m.get("id"), profile, attachment_jobs) for m in messages]
+    if not include_html:
+        for body in bodies:
+            body["html"] = ""
+
+    if attachment_jobs:
+        by_message = {m.get("id"): b for m, b in zip(messages, bodies)}
+        extracted_texts = get_extraction_pool().extract(attachment_jobs)
+        for job, extracted in zip(attachment_jobs, extracted_texts):
+            if extracted:
+                # Combine attachments into text body so agents see it
+                by_message[job["message_id"]]["text"] += f"{ATTACHMENT_MARKER}{job['filename']} ---\n{extracted}\n--- SLUT PÅ FIL ---\n"
+
+    return bodies
+
+
+def _decode_body(
+    payload: dict, service=None, message_id=None, profile: str = "default", include_html: bool = False
+) -> Dict[str, str]:
+    """Extract plain/text, html bodies and ATTACHMENTS (when service is given) from Gmail payload."""
+    return _decode_messages(
+        [{"id": message_id, "payload": payload}], profile, with_attachments=bool(service), include_html=include_html
+    )[0]
+
+
+def _is_forward_header(lines: List[str], i: int) -> bool:
+    line = lines[i].strip()
+    if _FORWARD_RE.match(line):
+        return True
+    # Outlook forwards use the reply header block, with "FW:"/"VB:" in the subject.
+    if _OUTLOOK_FROM_RE.match(line):
+        return any(_FORWARD_SUBJECT_RE.match(l.strip()) for l in lines[i + 1:i + 6])
+    return False
+
+
+def _is_reply_header(lines: List[str], i: int) -> bool:
+    line = lines[i].strip()
+    if not line:
+        return False
+    # Gmail wraps long "On ... wrote:" lines, so also try the line joined with the next one.
+    candidates = [line]
+    if i + 1 < len(lines):
+        candidates.append(f"{line} {lines[i + 1].strip()}")
+    if any(rx.match(c) for rx in _REPLY_HEADER_RES for c in candidates):
+        return True
+    # Outlook: "From: ..." followed shortly by "Sent: ..." / "Skickat: ...".
+    if _OUTLOOK_FROM_RE.match(line):
+        return any(_OUTLOOK_SENT_RE.match(l.strip()) for l in lines[i + 1:i + 4])
+    return False
+
+
+def _strip_quoted_text(text: str) -> str:
+    """
+    Drop quoted reply history, signatures and legal footers from a plain-text body.
+    The thread already carries the earlier messages, so repeating them only costs tokens.
+    Forwarded messages are kept whole; signatures and footers are only cut in the
+    tail of the sender's own text. Returns the original text if stripping would
+    leave nothing.
+    """
+    if not text:
+        return text
+    lines = text.replace("\r\n", "\n").split("\n")
+    end = len(lines)
+    for i in range(len(lines)):
+        if _is_forward_header(lines, i):
+            break
+        if _is_reply_header(lines, i):
+            end = i
+            break
+    content = [i for i in range(end) if lines[i].strip() and not _QUOTE_RE.match(lines[i])]
+    signature_from = content[-_SIGNATURE_TAIL_LINES] if len(content) > _SIGNATURE_TAIL_LINES else 0
+    footer_from = content[-_FOOTER_TAIL_LINES] if len(content) > _FOOTER_TAIL_LINES else 0
+
+    kept: List[str] = []
+    in_quote = False
+    has_content = False
+    for i, line in enumerate(lines[:end]):
+        stripped = line.strip()
+        if i >= signature_from and (line == _SIGNATURE_DELIMITER or _SIGNATURE_RE.match(stripped)):
+            break
+        # Footers only count as a paragraph of their own after some real content.
+        if i >= footer_from and has_content and not kept[-1].strip() and _FOOTER_RE.match(stripped):
+            break
+        if _QUOTE_RE.match(line):
+            in_quote = True
+            continue
+        if in_quote and stripped:
+            # Interleaved reply: leave a trace that something was quoted here.
+            kept.append("> [...]")
+        in_quote = False if stripped else in_quote
+        has_content = has_content or bool(stripped)
+        kept.append(line.rstrip())
+
+    result = re.sub(r"\n{3,}", "\n\n", "\n".join(kept)).strip()
+    return result or text
+
+
+def _strip_body(body: Dict[str, str]) -> int:
+    """Strip quoted history from body["text"] in place (attachment blocks untouched). Returns chars saved."""
+    text = body.get("text", "")
+    cut = text.find(ATTACHMENT_MARKER)
+    own, attachments = (text, "") if cut < 0 else (text[:cut], text[cut:])
+    stripped = _strip_quoted_text(own)
+    body["text"] = stripped + attachments
+    return len(own) - len(stripped)
+
+
+def _is_stale_label_error(error: HttpError) -> bool:
+    """Gmail rejects unknown label ids with 404, or 400 "Invalid label"."""
+    status = getattr(error.resp, "status", None)
+    return status == 404 or (status == 400 and "label" in str(error).lower())
 
 
 def _normalize_internal_date(internal_date: Optional[str]) -> Optional[str]:
@@ -136,108 +335,120 @@ def _normalize_internal_date(internal_date: Optional[str]) -> Optional[str]:
 class GmailToolset(BaseToolset):
     """Wrap Gmail API actions for the agent."""
 
-    def __init__(self):
-        super().__init__()
-        self._label_cache: Dict[str, str] = {}
+    def __init__(self, tool_filter: Optional[List[str]] = None):
+        # tool_filter: names of the tools to expose (None = all), e.g. write-only for the manager.
+        super().__init__(tool_filter=tool_filter)
 
     async def get_tools(self, readonly_context=None) -> List[BaseTool]:
-        return [
+        tools = [
             FunctionTool(self.gmail_list_unread),
             FunctionTool(self.gmail_get_thread),
             FunctionTool(self.gmail_find_related),
             FunctionTool(self.gmail_apply_label),
+            FunctionTool(self.gmail_apply_labels_bulk),
             FunctionTool(self.gmail_create_draft_reply),
             FunctionTool(self.gmail_search),
             FunctionTool(self.gmail_reply_draft_exists),
         ]
+        return [t for t in tools if self._is_tool_selected(t, readonly_context)]
 
     def gmail_reply_draft_exists(self, thread_id: str, account: str = "default") -> bool:
         """Check if a draft already exists for this thread."""
         service = get_gmail_service(profile=account)
-        drafts = (
-            service.users()
-            .drafts()
-            .list(userId="me")
-            .execute()
-            .get("drafts", [])
-        )
-        for d in drafts:
-            existing_thread = d.get("message", {}).get("threadId")
-            if existing_thread == thread_id:
-                return True
-        return False
+        return get_draft_index(account).has_draft(service, thread_id)
 
     def gmail_search(self, query: str, limit: int = 5, snippet_length: int = 100, profiles: List[str] = ["default", "private"]) -> List[Dict[str, Any]]:
         """
         Search for messages using Gmail query syntax (e.g. 'from:someone subject:waffles').
         Use a higher limit (e.g. 20-50) and short snippet_length to scan broadly.
         """
-        items: List[Dict[str, Any]] = []
-        
         # Filter available profiles
         valid_profiles = [p for p in profiles if p in PROFILES]
-        
-        for profile in valid_profiles:
-            try:
-                service = get_gmail_service(profile=profile)
-                
-                # SAFETY FILTER: If we are searching in the default profile (the inbox we work on),
-                # we must NEVER see emails we have already processed, to prevent loops.
-                # We leave 'private' (context) alone so we can recall history.
-                safe_query = query
-                if profile == "default":
-                     extra_terms = []
-                     if "label:AI_Processed" not in query:
-                         extra_terms.append("-label:AI_Processed")
-                     if "newer_than" not in query:
-                         extra_terms.append("newer_than:2d")
-                     
-                     if extra_terms:
-                         safe_query = f"{query} {' '.join(extra_terms)}"
-
-                resp = (
-                    service.users()
-                    .messages()
-                    .list(userId="me", q=safe_query, maxResults=limit)
-                    .execute()
-                    or {}
-                )
-                
-                for ref in resp.get("messages", []):
-                    m = (
-                        service.users()
-                        .messages()
-                        .get(
-                            userId="me",
-                            id=ref["id"],
-                            format="metadata",
-                            metadataHeaders=["From", "To", "Subject", "Date"],
-                        )
-                        .execute()
-                    )
-                    h = _headers_map(m.get("payload", {}).get("headers", []))
-                    
-                    snippet = m.get("snippet", "")
-                    if len(snippet) > snippet_length:
-                        snippet = snippet[:snippet_length] + "..."
-                        
-                    items.append(
-                        {
-                            "message_id": m.get("id"),
-                            "thread_id": m.get("threadId"),
-                            "from": h.get("From"),
-                            "to": h.get("To"),
-                            "subject": h.get("Subject"),
-                            "date": h.get("Date"),
-                            "snippet": snippet,
-                            "account": profile  # Store which account this result is from
-                        }
-                    )
-            except Exception as e:
-                print(f"Error searching {profile}: {e}")
-                
+
+        # Profiles are queried in parallel; results keep the order of `profiles`.
+        items: List[Dict[str, Any]] = []
+        for profile, found, error in fan_out(
+            valid_profiles, lambda profile: self._search_profile(profile, query, limit, snippet_length)
+        ):
+            if error is not None:
+                print(f"Error searching {profile}: {error}")
+                continue
+            items.extend(found)
         return items
 
+    def _search_profile(self, profile: str, query: str, limit: int, snippet_length: int) -> List[Dict[str, Any]]:
+        service = get_gmail_service(profile=profile)
+
+        # SAFETY FILTER: If we are searching in the default profile (the inbox we work on),
+        # we must NEVER see emails we have already processed, to prevent loops.
+        # We leave 'private' (context) alone so we can recall history.
+        safe_query = query
+        if profile == "default":
+             extra_terms = []
+             if "label:AI_Processed" not in query:
+                 extra_terms.append("-label:AI_Processed")
+             if "newer_than" not in query:
+                 extra_terms.append("newer_than:2d")
+
+             if extra_terms:
+                 safe_query = f"{query} {' '.join(extra_terms)}"
+
+        local = self._search_local(service, profile, safe_query, limit)
+        if local is not None:
+            for item in local:
+                if len(item["snippet"]) > snippet_length:
+                    item["snippet"] = item["snippet"][:snippet_length] + "..."
+                item["account"] = profile
+            return local
+
+        resp = (
+            service.users()
+            .messages()
+            .list(userId="me", q=safe_query, maxResults=limit)
+            .execute()
+            or {}
+        )
+
+        items: List[Dict[str, Any]] = []
+        message_ids = [ref["id"] for ref in resp.get("messages", [])]
+        for m in _batch_get_messages(service, message_ids, metadata_headers=LIST_METADATA_HEADERS):
+            h = _headers_map(m.get("payload", {}).get("headers", []))
+
+            snippet = m.get("snippet", "")
+            if len(snippet) > snippet_length:
+                snippet = snippet[:snippet_length] + "..."
+
+            items.append(
+                {
+                    "message_id": m.get("id"),
+                    "thread_id": m.get("threadId"),
+                    "from": h.get("From"),
+                    "to": h.get("To"),
+                    "subject": h.get("Subject"),
+                    "date": h.get("Date"),
+                    "snippet": snippet,
+                    "account": profile  # Store which account this result is from
+                }
+            )
+        return items
+
+    def _search_local(self, service, profile: str, query: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """Answer from the local message store if it is synced and understands the query."""
+        if profile not in MESSAGE_STORE_PROFILES:
+            return None
+        store = get_message_store(profile)
+        if not store.is_ready():
+            return None
+        store.refresh_if_stale(service)
+        if not store.is_ready():
+            # The refresh found the store too old to catch up; it waits for a rebuild.
+            return None
+        results = store.search(query, limit=limit)
+        # Without mirrored bodies, an empty free-text answer may just mean the hit is in a body.
+        if not results and not store.has_bodies:
+            return None
+        return results
+
     def gmail_list_unread(self, limit: int = 10, account: str = "default") -> List[Dict[str, Any]]:
         """List unread messages with light metadata."""
         service = get_gmail_service(profile=account)
@@ -247,26 +458,15 @@ class GmailToolset(BaseToolset):
             .messages()
             .list(
                 userId="me",
-                q="label:UNREAD -label:AI_Processed newer_than:2d",
+                q=UNREAD_TRIAGE_QUERY,
                 maxResults=limit,
             )
             .execute()
             or {}
         )
-        message_refs = resp.get("messages", [])
+        message_ids = [ref["id"] for ref in resp.get("messages", [])]
         items: List[Dict[str, Any]] = []
-        for ref in message_refs:
-            msg = (
-                service.users()
-                .messages()
-                .get(
-                    userId="me",
-                    id=ref["id"],
-                    format="metadata",
-                    metadataHeaders=["From", "To", "Subject", "Date"],
-                )
-                .execute()
-            )
+        for msg in _batch_get_messages(service, message_ids, metadata_headers=LIST_METADATA_HEADERS):
             headers = _headers_map(msg.get("payload", {}).get("headers", []))
             items.append(
                 {
@@ -282,31 +482,81 @@ class GmailToolset(BaseToolset):
             )
         return items
 
-    def gmail_get_thread(self, message_id: str, account: str = "default") -> Dict[str, Any]:
-        """Fetch full thread for a message."""
+    async def gmail_get_thread(
+        self,
+        message_id: str,
+        account: str = "default",
+        thread_id: str = "",
+        max_messages: int = 20,
+        max_body_chars: int = 20000,
+        strip_quotes: bool = True,
+        include_html: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Fetch full thread for a message.
+        Pass thread_id (from gmail_list_unread/gmail_search) when known to save a lookup.
+        max_messages keeps only the newest messages; max_body_chars caps each body. 0 = no limit.
+        strip_quotes removes quoted replies, signatures and footers from each text body
+        (set False to see a message exactly as sent). HTML-only messages come back as
+        converted text; include_html also returns the raw HTML.
+        """
+        # Fetching and attachment extraction block; keep them off the event loop.
+        return await asyncio.to_thread(
+            self._get_thread, message_id, account, thread_id, max_messages, max_body_chars, strip_quotes, include_html
+        )
+
+    def _get_thread(
+        self,
+        message_id: str,
+        account: str = "default",
+        thread_id: str = "",
+        max_messages: int = 20,
+        max_body_chars: int = 20000,
+        strip_quotes: bool = True,
+        include_html: bool = False,
+    ) -> Dict[str, Any]:
         try:
             service = get_gmail_service(profile=account)
-            msg = (
-                service.users()
-                .messages()
-                .get(userId="me", id=message_id, format="full")
-                .execute()
-            )
-            headers = _headers_map(msg.get("payload", {}).get("headers", []))
-            # Pass service and ID to enable attachment downloading
-            bodies = _decode_body(msg.get("payload", {}), service=service, message_id=msg.get("id"))
-            thread_msgs: List[Dict[str, Any]] = []
-            thread_id = msg.get("threadId")
+            if not thread_id:
+                # format="minimal" carries ids and labels only, no payload.
+                thread_id = (
+                    service.users()
+                    .messages()
+                    .get(userId="me", id=message_id, format="minimal")
+                    .execute()
+                    .get("threadId")
+                )
+            # One download of the whole thread; every message is decoded exactly once.
             thread_resp = (
                 service.users()
                 .threads()
                 .get(userId="me", id=thread_id, format="full")
                 .execute()
             )
-            for m in thread_resp.get("messages", []):
+            messages = thread_resp.get("messages", [])
+            target = next((m for m in messages if m.get("id") == message_id), None)
+            if target is None:
+                return {"error": "Message or Thread not found", "message_id": message_id}
+
+            # Keep the newest max_messages (Gmail returns them oldest first), always including the target.
+            kept = messages[-max_messages:] if max_messages > 0 else messages
+            if target not in kept:
+                kept = [target] + kept[1:]
+            bodies = _decode_messages(kept, profile=account, include_html=include_html)
+
+            thread_msgs: List[Dict[str, Any]] = []
+            target_body: Dict[str, str] = {}
+            stripped_chars = 0
+            for m, body in zip(kept, bodies):
+                if strip_quotes:
+                    stripped_chars += _strip_body(body)
+                if max_body_chars > 0:
+                    for key in ("text", "html"):
+                        if len(body[key]) > max_body_chars:
+                            body[key] = body[key][:max_body_chars] + "\n[...trunkerat]"
+                if m is target:
+                    target_body = body
                 th_headers = _headers_map(m.get("payload", {}).get("headers", []))
-                # Pass service and ID here too
-                th_bodies = _decode_body(m.get("payload", {}), service=service, message_id=m.get("id"))
                 thread_msgs.append(
                     {
                         "message_id": m.get("id"),
@@ -315,18 +565,23 @@ class GmailToolset(BaseToolset):
                         "to": th_headers.get("To"),
                         "subject": th_headers.get("Subject"),
                         "date": th_headers.get("Date"),
-                        "body": th_bodies,
+                        "body": body,
                     }
                 )
 
-            return {
-                "message_id": msg.get("id"),
-                "thread_id": msg.get("threadId"),
-                "headers": headers,
-                "body": bodies,
+            result = {
+                "message_id": target.get("id"),
+                "thread_id": thread_id,
+                "headers": _headers_map(target.get("payload", {}).get("headers", [])),
+                "body": target_body,
                 "thread": thread_msgs,
                 "account": account
             }
+            if strip_quotes:
+                result["stripped_chars"] = stripped_chars
+            if len(kept) < len(messages):
+                result["omitted_messages"] = len(messages) - len(kept)
+            return result
         except HttpError as e:
             if e.resp.status == 404:
                 return {"error": "Message or Thread not found", "message_id": message_id}
@@ -335,64 +590,138 @@ class GmailToolset(BaseToolset):
             return {"error": str(e), "message_id": message_id}
 
     def gmail_find_related(self, message_id: str, account: str = "default") -> List[Dict[str, Any]]:
-        """Find mails in same thread or with similar subject across ALL context profiles."""
+        """
+        Find mails with a similar subject (any Re:/SV:/VB: prefixes, small edits) across ALL context profiles.
+        Results from the local index carry a similarity score (higher = closer).
+        """
         service = get_gmail_service(profile=account)
         msg = (
             service.users()
             .messages()
-            .get(userId="me", id=message_id, format="metadata", metadataHeaders=["Subject"])
+            .get(userId="me", id=message_id, format="metadata", metadataHeaders=["Subject", "From"])
             .execute()
         )
         headers = _headers_map(msg.get("payload", {}).get("headers", []))
         subject = headers.get("Subject", "")
-        cleaned = re.sub(r"^(re|fwd):\s*", "", subject, flags=re.IGNORECASE)
-        query = f'subject:"{cleaned}"'
-        return self.gmail_search(query=query, limit=10, profiles=["default", "private"])
+        profiles = ["default", "private"]
 
-    # Legacy method body is removed/replaced by above delegation
-    def _ensure_label(self, service, label_name: str) -> str:
-        """Return label id, creating it if needed."""
-        if label_name in self._label_cache:
-            return self._label_cache[label_name]
+        items: List[Dict[str, Any]] = []
+        remote: List[str] = []
+        for profile in profiles:
+            related = self._related_local(profile, subject, headers.get("From", ""), message_id)
+            if related is None:
+                remote.append(profile)
+            else:
+                items.extend(related)
+
+        if remote:
+            query = f'subject:"{strip_reply_prefixes(subject)}"'
+            items.extend(self.gmail_search(query=query, limit=10, profiles=remote))
+        return items
 
-        existing = (
-            service.users().labels().list(userId="me").execute().get("labels", [])
-        )
-        for lbl in existing:
-            if lbl.get("name") == label_name:
-                self._label_cache[label_name] = lbl["id"]
-                return lbl["id"]
-
-        body = {
-            "labelListVisibility": "labelShow",
-            "messageListVisibility": "show",
-            "name": label_name,
-        }
-        created = (
-            service.users().labels().create(userId="me", body=body).execute()
-        )
-        self._label_cache[label_name] = created["id"]
-        return created["id"]
+    def _related_local(self, profile: str, subject: str, from_addr: str, message_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Similar-subject hits from the profile's subject index, or None if it has no synced store."""
+        if profile not in MESSAGE_STORE_PROFILES or profile not in PROFILES:
+            return None
+        store = get_message_store(profile)
+        if not store.is_ready():
+            return None
+        store.refresh_if_stale(get_gmail_service(profile=profile))
+        if not store.is_ready():
+            return None
+        index = get_subject_index(store)
+        index.update()
+
+        items = []
+        for row in index.related_messages(subject, from_addr, exclude_id=message_id, limit=10):
+            # Same loop protection as gmail_search applies to the working inbox.
+            if profile == "default" and " ai_processed " in (row["labels"] or ""):
+                continue
+            items.append(
+                {
+                    "message_id": row["id"],
+                    "thread_id": row["thread_id"],
+                    "from": row["from_addr"],
+                    "to": row["to_addr"],
+                    "subject": row["subject"],
+                    "date": row["date"],
+                    "snippet": (row["snippet"] or "")[:100],
+                    "similarity": row["similarity"],
+                    "account": profile,
+                }
+            )
+        return items
+
+    # Legacy method body is removed/replaced by above delegation
+    def _ensure_label(self, service, label_name: str, account: str = "default") -> str:
+        """Return label id, creating it if needed (shared, persisted registry)."""
+        return get_label_registry().ensure(service, account, label_name)
 
     def gmail_apply_label(self, message_id: str, label_name: str, account: str = "default") -> Dict[str, Any]:
         """Create or reuse a label and apply it to a message."""
         service = get_gmail_service(profile=account)
-        label_id = self._ensure_label(service, label_name)
+        label_id = self._ensure_label(service, label_name, account)
         try:
-            modified = (
-                service.users()
-                .messages()
-                .modify(userId="me", id=message_id, body={"addLabelIds": [label_id]})
-                .execute()
-            )
+            try:
+                modified = self._add_label(service, message_id, label_id)
+            except HttpError as e:
+                if not _is_stale_label_error(e):
+                    raise
+                # The cached id points at a deleted/renamed label: resolve it again once.
+                get_label_registry().invalidate(account, label_name)
+                label_id = self._ensure_label(service, label_name, account)
+                modified = self._add_label(service, message_id, label_id)
             return {"message_id": message_id, "label": label_name, "result": modified}
         except Exception as e:
             # If message not found (404) or other error, just report it without crashing
             print(f"⚠️ Failed to label message {message_id}: {e}")
             return {"message_id": message_id, "label": label_name, "error": str(e)}
 
+    def gmail_apply_labels_bulk(self, message_ids: List[str], label_name: str, account: str = "default") -> Dict[str, Any]:
+        """
+        Apply one label to many messages at once (one call per 1000 ids).
+        Prefer this over gmail_apply_label when labelling several mails.
+        Returns how many were labelled and an error per failed message id.
+        """
+        service = get_gmail_service(profile=account)
+        ids = list(dict.fromkeys(message_ids))
+        failed: Dict[str, str] = {}
+        label_id = self._ensure_label(service, label_name, account)
+        for start in range(0, len(ids), BATCH_MODIFY_LIMIT):
+            chunk = ids[start:start + BATCH_MODIFY_LIMIT]
+            try:
+                self._batch_modify(service, chunk, label_id)
+                continue
+            except HttpError as e:
+                print(f"⚠️ batchModify misslyckades ({e}), försöker per mail...")
+            # The label may have been deleted/renamed since it was cached; resolve it again.
+            get_label_registry().invalidate(account, label_name)
+            label_id = self._ensure_label(service, label_name, account)
+            failed.update(_batch_modify_each(service, chunk, label_id))
+
+        for msg_id, error in failed.items():
+            print(f"⚠️ Failed to label message {msg_id}: {error}")
+        return {"label": label_name, "labeled": len(ids) - len(failed), "failed": failed, "account": account}
+
+    def _batch_modify(self, service, message_ids: List[str], label_id: str) -> None:
+        service.users().messages().batchModify(
+            userId="me", body={"ids": message_ids, "addLabelIds": [label_id]}
+        ).execute()
+
+    def _add_label(self, service, message_id: str, label_id: str) -> dict:
+        return (
+            service.users()
+            .messages()
+            .modify(userId="me", id=message_id, body={"addLabelIds": [label_id]})
+            .execute()
+        )
+
     def gmail_create_draft_reply(self, message_id: str, reply_body: str, account: str = "default") -> Dict[str, Any]:
-        """Create a Gmail draft reply for a given message."""
+        """
+        Create a Gmail draft reply for a given message.
+        Idempotent per thread: if the thread already has a draft, no new one is created
+        and the result has already_exists=True.
+        """
         service = get_gmail_service(profile=account)
         original = (
             service.users()
@@ -400,10 +729,19 @@ class GmailToolset(BaseToolset):
             .get(userId="me", id=message_id, format="metadata", metadataHeaders=["From", "To", "Subject", "Message-ID"])
             .execute()
         )
+        thread_id = original.get("threadId")
+        index = get_draft_index(account)
+        with index.thread_lock(thread_id):
+            if index.has_draft(service, thread_id):
+                print(f"ℹ️ Utkast finns redan i tråd {thread_id}, skapar inget nytt.")
+                return {"draft_id": index.draft_id(thread_id), "thread_id": thread_id, "already_exists": True}
+            return self._create_draft_reply(service, index, original, reply_body)
+
+    def _create_draft_reply(self, service, index, original: dict, reply_body: str) -> Dict[str, Any]:
+        message_id = original.get("id")
         headers = _headers_map(original.get("payload", {}).get("headers", []))
         reply_to = headers.get("From")
         subject = headers.get("Subject", "")
-        print(f"DEBUG: creating draft reply to='{reply_to}', subject='{subject}', original_id='{message_id}'")
         if not subject.lower().startswith("re:"):
             subject = f"Re: {subject}"
 
@@ -433,4 +771,6 @@ class GmailToolset(BaseToolset):
             )
             .execute()
         )
-        return {"draft_id": draft.get("id"), "thread_id": original.get("threadId")}
+        thread_id = draft.get("message", {}).get("threadId") or original.get("threadId")
+        index.record(thread_id, draft.get("message", {}).get("id") or draft.get("id"), draft.get("id"))
+        return {"draft_id": draft.get("id"), "thread_id": thread_id}
@@ -11,6 +11,7 @@ from google.adk.tools.base_toolset import BaseToolset
 from google.adk.tools.function_tool import FunctionTool
 
 from config import GEMINI_API_KEY, GEMINI_MODEL
+from utils.cassette import get_cassette
 
 # ADK monkeypatch (samma som i main.py) för att undvika aiohttp-attributfel
 if not hasattr(aiohttp, "ClientConnectorDNSError"):
@@ -18,6 +19,13 @@ if not hasattr(aiohttp, "ClientConnectorDNSError"):
 
 
 async def _do_search(query: str) -> str:
+    cassette = get_cassette()
+    if cassette is not None:
+        return await cassette.athrough("grounded", query, lambda: _search(query), query[:80])
+    return await _search(query)
+
+
+async def _search(query: str) -> str:
     client = genai.Client(api_key=GEMINI_API_KEY)
     try:
         resp = await asyncio.to_thread(
@@ -5,6 +5,9 @@ from google.adk.tools.base_tool import BaseTool
 from google.adk.tools.base_toolset import BaseToolset
 from google.adk.tools.function_tool import FunctionTool
 
+from utils.cassette import get_cassette
+from utils.tracing import get_tracer
+
 class SrMcpToolset(BaseToolset):
     """Tools for accessing Sveriges Radio MCP Server."""
 
@@ -15,6 +18,12 @@ class SrMcpToolset(BaseToolset):
     def _call_mcp(self, tool_name: str, params: Dict[str, Any]) -> Any:
         # Remove self and None values
         clean_params = {k: v for k, v in params.items() if k != 'self' and v is not None}
+        cassette = get_cassette()
+        if cassette is not None:
+            return cassette.through("sr_mcp", [tool_name, clean_params], lambda: self._post(tool_name, clean_params), tool_name)
+        return self._post(tool_name, clean_params)
+
+    def _post(self, tool_name: str, clean_params: Dict[str, Any]) -> Any:
         payload = {
             "jsonrpc": "2.0",
             "method": f"tools/call",
@@ -25,7 +34,10 @@ class SrMcpToolset(BaseToolset):
             }
         }
         try:
-            response = requests.post(self.url, json=payload)
+            with get_tracer().span("http", f"POST sr-mcp {tool_name}") as span:
+                response = requests.post(self.url, json=payload)
+                if span is not None:
+                    span.attrs.update(status=response.status_code, response_bytes=len(response.content))
             response.raise_for_status()
             result = response.json()
             if "error" in result:
@@ -0,0 +1,36 @@
+import random
+from typing import Optional
+
+from config import GOOGLE_RETRY_ATTEMPTS, GOOGLE_RETRY_BASE_SECONDS, GOOGLE_RETRY_MAX_SECONDS
+
+# Retry policy for Google API calls made in code (prefetch, batch fetches).
+#
+# Gmail answers rate limits with 429 (or 403 rateLimitExceeded /
+# userRateLimitExceeded) and transient trouble with 5xx; both are worth another
+# try after an exponentially growing, jittered delay. Anything else (404, 400,
+# auth errors) fails at once.
+
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+_RATE_LIMIT_REASONS = ("ratelimitexceeded", "userratelimitexceeded")
+
+
+def _status(error: Exception) -> Optional[int]:
+    resp = getattr(error, "resp", None)
+    try:
+        return int(getattr(resp, "status", None))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether an API error is a rate limit or a transient server error."""
+    status = _status(error)
+    if status in _RETRYABLE_STATUS:
+        return True
+    return status == 403 and any(reason in str(error).lower() for reason in _RATE_LIMIT_REASONS)
+
+
+def retry_delay(attempt: int) -> float:
+    """Seconds to wait before retry number `attempt` (0-based): exponential with jitter."""
+    delay = min(GOOGLE_RETRY_MAX_SECONDS, GOOGLE_RETRY_BASE_SECONDS * 2 ** attempt)
+    return delay * random.uniform(0.5, 1.0)
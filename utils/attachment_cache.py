@@ -0,0 +1,134 @@
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from config import ATTACHMENT_CACHE_FILE, ATTACHMENT_CACHE_MAX_BYTES
+
+# On-disk cache of extracted attachment text, so re-reading a thread never
+# downloads or parses the same file twice.
+#
+# Two levels:
+#   refs:  (profile, message id, part) -> sha256 of the file  (hit = no download)
+#   texts: sha256 -> extracted text                           (hit = no parsing)
+# Gmail attachmentIds change between fetches, so the message-level key uses the
+# MIME partId, which is stable for an (immutable) message.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS refs (
+    profile TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    part_key TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    PRIMARY KEY (profile, message_id, part_key)
+);
+CREATE INDEX IF NOT EXISTS refs_sha256 ON refs(sha256);
+CREATE TABLE IF NOT EXISTS texts (
+    sha256 TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS texts_last_access ON texts(last_access);
+"""
+
+
+class AttachmentCache:
+    """Size-capped (LRU) cache of attachment text keyed by message part and content hash."""
+
+    def __init__(self, path=ATTACHMENT_CACHE_FILE, max_bytes: int = ATTACHMENT_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM texts").fetchone()[0]
+        self.hits = 0
+        self.content_hits = 0
+        self.misses = 0
+
+    def _touch(self, sha256: str) -> Optional[str]:
+        row = self._conn.execute("SELECT text FROM texts WHERE sha256 = ?", (sha256,)).fetchone()
+        if row is None:
+            return None
+        with self._conn:
+            self._conn.execute("UPDATE texts SET last_access = ? WHERE sha256 = ?", (time.time(), sha256))
+        return row[0]
+
+    def lookup(self, profile: str, message_id: str, part_key: str) -> Optional[str]:
+        """Text for a known message part, or None (caller must download)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256 FROM refs WHERE profile = ? AND message_id = ? AND part_key = ?",
+                (profile, message_id, part_key),
+            ).fetchone()
+            text = self._touch(row[0]) if row else None
+            if text is not None:
+                self.hits += 1
+            return text
+
+    def lookup_content(self, sha256: str) -> Optional[str]:
+        """Text for already-downloaded bytes (same file seen in another message), or None."""
+        with self._lock:
+            text = self._touch(sha256)
+            if text is not None:
+                self.content_hits += 1
+            else:
+                self.misses += 1
+            return text
+
+    def store(self, profile: str, message_id: str, part_key: str, sha256: str, text: str) -> None:
+        size = len(text.encode("utf-8"))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO refs(profile, message_id, part_key, sha256) VALUES (?, ?, ?, ?)",
+                (profile, message_id, part_key, sha256),
+            )
+            existing = self._conn.execute("SELECT size FROM texts WHERE sha256 = ?", (sha256,)).fetchone()
+            if existing:
+                self._total_bytes -= existing[0]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO texts(sha256, text, size, last_access) VALUES (?, ?, ?, ?)",
+                (sha256, text, size, time.time()),
+            )
+            self._total_bytes += size
+            self._evict()
+
+    def _evict(self) -> None:
+        """Drop least recently used texts (and their refs) until under the size cap."""
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT sha256, size FROM texts ORDER BY last_access LIMIT 50"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                return
+            for sha256, size in rows:
+                self._conn.execute("DELETE FROM texts WHERE sha256 = ?", (sha256,))
+                self._conn.execute("DELETE FROM refs WHERE sha256 = ?", (sha256,))
+                self._total_bytes -= size
+                if self._total_bytes <= self.max_bytes:
+                    return
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "content_hits": self.content_hits,
+            "misses": self.misses,
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+_cache: Optional[AttachmentCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_attachment_cache() -> AttachmentCache:
+    """Return the process-wide attachment cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AttachmentCache()
+        return _cache
@@ -0,0 +1,312 @@
+import copy
+import hashlib
+import json
+import threading
+from pathlib import Path
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Optional
+
+import httplib2
+from google.adk.agents.llm_agent import LlmAgent
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from googleapiclient.errors import HttpError
+
+from config import CASSETTE_FILE, CASSETTE_MODE
+
+# Record/replay of every external interaction of a run.
+#
+# A cassette is one JSON file of recorded responses, grouped by channel:
+#   google         Gmail/Calendar API calls, at the googleapiclient call-chain level
+#                  (service.users().messages().get(...).execute(), batch sub-requests
+#                  one by one), so recordings carry no tokens or multipart noise
+#   model          Gemini calls, per agent and conversation contents
+#   sr_mcp         Sveriges Radio MCP tool calls
+#   grounded       grounded web searches
+# and keyed by a hash of the request. In record mode the real client answers and
+# its response (or error) is stored; in replay mode the cassette answers and
+# nothing is sent anywhere, so no credentials or network are needed. A request
+# seen several times is answered in recording order (the last answer repeats).
+#
+# Replay is deterministic as long as the code asks the same questions: what is
+# keyed ignores ids ADK generates per run (function call ids) and the system
+# instruction (it carries today's date). Missing interactions raise CassetteMiss.
+
+CASSETTE_VERSION = 1
+
+
+class CassetteMiss(KeyError):
+    """A replayed run made a request that isn't in the cassette."""
+
+
+class CassetteError(Exception):
+    """A recorded non-HTTP error, raised again on replay."""
+
+
+def _key(data: Any) -> str:
+    return hashlib.sha256(json.dumps(data, sort_keys=True, ensure_ascii=False, default=str).encode()).hexdigest()[:24]
+
+
+class Cassette:
+    def __init__(self, path: Path, mode: str):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = Path(path)
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, List[Any]]] = {}
+        self._served: Dict[tuple, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self._labels: Dict[str, Dict[str, str]] = {}
+        if mode == "replay":
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            self._entries = {channel: {k: e["responses"] for k, e in entries.items()} for channel, entries in data["channels"].items()}
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def record(self, channel: str, key_data: Any, response: Any, label: str = "") -> None:
+        key = _key(key_data)
+        with self._lock:
+            self._entries.setdefault(channel, {}).setdefault(key, []).append(copy.deepcopy(response))
+            if label:
+                self._labels.setdefault(channel, {})[key] = label
+            self.recorded += 1
+
+    def play(self, channel: str, key_data: Any, label: str = "") -> Any:
+        key = _key(key_data)
+        with self._lock:
+            responses = self._entries.get(channel, {}).get(key)
+            if not responses:
+                self.misses += 1
+                raise CassetteMiss(f"{channel}: {label or key} is not in the cassette {self.path.name}")
+            served = self._served.get((channel, key), 0)
+            self._served[(channel, key)] = served + 1
+            self.hits += 1
+            # Callers may modify what they get (e.g. strip bodies); every replay starts from the recording.
+            return copy.deepcopy(responses[min(served, len(responses) - 1)])
+
+    def through(self, channel: str, key_data: Any, call: Callable[[], Any], label: str = "") -> Any:
+        """Replay the recorded result of `call`, or run and record it. Results must be JSON-serializable."""
+        if self.replaying:
+            return self.play(channel, key_data, label)
+        result = call()
+        self.record(channel, key_data, result, label)
+        return result
+
+    async def athrough(self, channel: str, key_data: Any, call: Callable[[], Awaitable[Any]], label: str = "") -> Any:
+        if self.replaying:
+            return self.play(channel, key_data, label)
+        result = await call()
+        self.record(channel, key_data, result, label)
+        return result
+
+    def save(self) -> None:
+        if self.replaying:
+            return
+        with self._lock:
+            channels = {
+                channel: {key: {"request": self._labels.get(channel, {}).get(key, ""), "responses": responses} for key, responses in entries.items()}
+                for channel, entries in self._entries.items()
+            }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"version": CASSETTE_VERSION, "channels": channels}, ensure_ascii=False, indent=1), encoding="utf-8")
+        tmp.replace(self.path)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "interactions": sum(len(r) for entries in self._entries.values() for r in entries.values()),
+                "recorded": self.recorded,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# --- Google API clients -------------------------------------------------------------------
+
+
+def _error_record(e: Exception) -> Dict[str, Any]:
+    if isinstance(e, HttpError):
+        content = e.content.decode("utf-8", errors="replace") if isinstance(e.content, bytes) else str(e.content)
+        return {"error": {"status": e.resp.status, "content": content}}
+    return {"error": {"status": None, "content": f"{type(e).__name__}: {e}"}}
+
+
+def _raise_recorded(error: Dict[str, Any]) -> None:
+    if error["status"] is None:
+        raise CassetteError(error["content"])
+    raise HttpError(httplib2.Response({"status": str(error["status"])}), error["content"].encode("utf-8"))
+
+
+class CassetteNode:
+    """
+    One step of a googleapiclient call chain (service, resource or request).
+    Wraps the real object when recording (inner) and stands in for it when replaying.
+    """
+
+    def __init__(self, cassette: Cassette, path: List[Any], inner: Any = None):
+        self._cassette = cassette
+        self._path = path
+        self._inner = inner
+
+    def __getattr__(self, name: str) -> "_CassetteMethod":
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return _CassetteMethod(self, name)
+
+    def new_batch_http_request(self, callback: Optional[Callable] = None) -> "CassetteBatch":
+        inner = self._inner.new_batch_http_request() if self._inner is not None else None
+        return CassetteBatch(self._cassette, inner, callback)
+
+    def _label(self) -> str:
+        return ".".join(step[0] for step in self._path[1:])
+
+    def execute(self) -> Any:
+        if self._cassette.replaying:
+            recorded = self._cassette.play("google", self._path, self._label())
+            if "error" in recorded:
+                _raise_recorded(recorded["error"])
+            return recorded["response"]
+        try:
+            response = self._inner.execute()
+        except Exception as e:
+            self._cassette.record("google", self._path, _error_record(e), self._label())
+            raise
+        self._cassette.record("google", self._path, {"response": response}, self._label())
+        return response
+
+
+class _CassetteMethod:
+    def __init__(self, node: CassetteNode, name: str):
+        self._node = node
+        self._name = name
+
+    def __call__(self, *args, **kwargs) -> CassetteNode:
+        inner = getattr(self._node._inner, self._name)(*args, **kwargs) if self._node._inner is not None else None
+        return CassetteNode(self._node._cassette, self._node._path + [[self._name, list(args), kwargs]], inner)
+
+
+class CassetteBatch:
+    """Batch request whose sub-requests are recorded and replayed one by one."""
+
+    def __init__(self, cassette: Cassette, inner: Any, callback: Optional[Callable]):
+        self._cassette = cassette
+        self._inner = inner
+        self._callback = callback
+        self._entries: List[tuple] = []
+
+    def add(self, request: CassetteNode, callback: Optional[Callable] = None, request_id: Optional[str] = None) -> None:
+        if request_id is None:
+            request_id = str(len(self._entries) + 1)
+        callback = callback or self._callback
+        self._entries.append((request_id, request, callback))
+        if self._inner is not None:
+            self._inner.add(request._inner, callback=self._recording(request, callback), request_id=request_id)
+
+    def _recording(self, request: CassetteNode, callback: Optional[Callable]) -> Callable:
+        def on_response(request_id, response, exception):
+            record = _error_record(exception) if exception is not None else {"response": response}
+            self._cassette.record("google", request._path, record, request._label())
+            if callback:
+                callback(request_id, response, exception)
+
+        return on_response
+
+    def execute(self) -> None:
+        if self._inner is not None:
+            self._inner.execute()
+            return
+        for request_id, request, callback in self._entries:
+            try:
+                response, exception = request.execute(), None
+            except (HttpError, CassetteError) as e:
+                response, exception = None, e
+            if callback:
+                callback(request_id, response, exception)
+
+
+def cassette_service(cassette: Cassette, name: str, service: Any = None) -> CassetteNode:
+    """Wrap an API client (record) or stand in for one (replay, service=None). `name` namespaces its calls."""
+    return CassetteNode(cassette, [name], service)
+
+
+# --- Models --------------------------------------------------------------------------------
+
+
+def _strip_ids(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _strip_ids(v) for k, v in value.items() if k not in ("id", "thought_signature")}
+    if isinstance(value, list):
+        return [_strip_ids(v) for v in value]
+    return value
+
+
+def request_key(agent: str, llm_request: LlmRequest) -> List[Any]:
+    """What identifies a model call: the agent and the conversation (without per-run ids and thoughts)."""
+    contents = []
+    for content in llm_request.contents or []:
+        parts = [p.model_dump(mode="json", exclude_none=True) for p in content.parts or [] if not p.thought]
+        contents.append([content.role, _strip_ids(parts)])
+    return [agent, contents]
+
+
+class CassetteLlm(BaseLlm):
+    """Model that records the responses of `inner`, or replays them when there is no inner model."""
+
+    model: str = "cassette"
+    agent: str = ""
+    cassette: Any = None
+    inner: Optional[BaseLlm] = None
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        key = request_key(self.agent, llm_request)
+        if self.inner is None:
+            for data in self.cassette.play("model", key, self.agent):
+                yield LlmResponse.model_validate(data)
+            return
+        responses = []
+        async for response in self.inner.generate_content_async(llm_request, stream):
+            responses.append(response.model_dump(mode="json", exclude_none=True))
+            yield response
+        self.cassette.record("model", key, responses, self.agent)
+
+
+def wrap_agent_models(agent: Any, cassette: Cassette) -> None:
+    """Route the model calls of `agent` and its sub-agents through the cassette."""
+    if isinstance(agent, LlmAgent) and not isinstance(agent.model, CassetteLlm):
+        inner = None if cassette.replaying else agent.canonical_model
+        agent.model = CassetteLlm(agent=agent.name, cassette=cassette, inner=inner)
+    for sub_agent in getattr(agent, "sub_agents", None) or []:
+        wrap_agent_models(sub_agent, cassette)
+
+
+_cassette: Optional[Cassette] = None
+_cassette_configured = False
+_cassette_lock = threading.Lock()
+
+
+def get_cassette() -> Optional[Cassette]:
+    """The active cassette (CASSETTE_MODE, or use_cassette), or None when external calls go straight out."""
+    global _cassette, _cassette_configured
+    with _cassette_lock:
+        if not _cassette_configured:
+            _cassette = Cassette(CASSETTE_FILE, CASSETTE_MODE) if CASSETTE_MODE else None
+            _cassette_configured = True
+        return _cassette
+
+
+def use_cassette(path: Optional[Path], mode: str = "") -> Optional[Cassette]:
+    """Activate a cassette for the rest of the process (mode "" turns it off)."""
+    global _cassette, _cassette_configured
+    with _cassette_lock:
+        _cassette = Cassette(path, mode) if mode else None
+        _cassette_configured = True
+        return _cassette
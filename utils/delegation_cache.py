@@ -0,0 +1,117 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, Optional
+
+from config import DELEGATION_CACHE_FILE, DELEGATION_CACHE_TTL
+
+# On-disk cache of sub-agent answers (research, radio, grounded search), so a
+# question that was already delegated is answered in milliseconds instead of a
+# new sub-agent run.
+#
+# The key is the agent, the normalized query and a hash of the mail context the
+# question was asked with (the sub-agent sees it in its prompt, so the answer
+# depends on it). Case, Unicode form, punctuation, spacing and articles don't
+# matter, so "Vad spelas på P3 just nu?" and "vad spelas på p3 just nu" share one
+# entry; word order and question words do ("När var vi i London?" is not "Hur
+# var det i London?"). Each agent has its own TTL (short for radio "right now",
+# long for research).
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    agent TEXT NOT NULL,
+    key TEXT NOT NULL,
+    query TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (agent, key)
+);
+CREATE INDEX IF NOT EXISTS answers_expires ON answers(expires);
+"""
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+# Only words that never change what is asked.
+_STOPWORDS = {"the", "a", "an", "please", "snälla"}
+
+
+def normalize_query(query: str) -> str:
+    words = _WORD_RE.findall(unicodedata.normalize("NFKC", query or "").lower())
+    return " ".join(w for w in words if w not in _STOPWORDS)
+
+
+class DelegationCache:
+    """TTL cache of delegated answers keyed by (agent, normalized query, mail context)."""
+
+    def __init__(self, path=DELEGATION_CACHE_FILE, ttl: Optional[Dict[str, int]] = None):
+        self.path = path
+        self.ttl = dict(DELEGATION_CACHE_TTL if ttl is None else ttl)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        with self._conn:
+            self._conn.execute("DELETE FROM answers WHERE expires <= ?", (time.time(),))
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(query: str, context: str = "") -> str:
+        context_hash = hashlib.sha256((context or "").strip().encode("utf-8")).hexdigest()
+        return hashlib.sha256(f"{normalize_query(query)}\0{context_hash}".encode("utf-8")).hexdigest()
+
+    def enabled(self, agent: str) -> bool:
+        return self.ttl.get(agent, 0) > 0
+
+    def lookup(self, agent: str, query: str, context: str = "") -> Optional[str]:
+        """A fresh cached answer, or None (caller must delegate)."""
+        if not self.enabled(agent):
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer FROM answers WHERE agent = ? AND key = ? AND expires > ?",
+                (agent, self._key(query, context), time.time()),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def store(self, agent: str, query: str, answer: str, context: str = "") -> None:
+        if not self.enabled(agent):
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers(agent, key, query, answer, expires) VALUES (?, ?, ?, ?, ?)",
+                (agent, self._key(query, context), query, answer, time.time() + self.ttl[agent]),
+            )
+
+    def clear(self, agent: Optional[str] = None) -> None:
+        with self._lock, self._conn:
+            if agent is None:
+                self._conn.execute("DELETE FROM answers")
+            else:
+                self._conn.execute("DELETE FROM answers WHERE agent = ?", (agent,))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._conn.execute(
+                "SELECT COUNT(*) FROM answers WHERE expires > ?", (time.time(),)
+            ).fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+
+_cache: Optional[DelegationCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_delegation_cache() -> DelegationCache:
+    """Return the process-wide delegation cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DelegationCache()
+        return _cache
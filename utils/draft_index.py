@@ -0,0 +1,154 @@
+import threading
+import time
+from typing import Dict, Optional, Set
+
+from googleapiclient.errors import HttpError
+
+from config import DRAFT_INDEX_REFRESH_SECONDS
+from utils.mailbox_sync import list_history
+
+# threadId -> drafts index per profile, so duplicate-draft checks are a dict
+# lookup instead of listing every draft in the mailbox.
+#
+# Built once by paging through drafts.list, then kept current by replaying
+# DRAFT-label history (new drafts, sent or discarded drafts). Drafts created by
+# gmail_create_draft_reply are recorded immediately.
+
+_HISTORY_TYPES = ["messageAdded", "messageDeleted", "labelAdded", "labelRemoved"]
+
+
+class DraftIndex:
+    """Which threads have a draft, for one Gmail profile."""
+
+    def __init__(self, profile: str):
+        self.profile = profile
+        self._lock = threading.RLock()
+        self._threads: Dict[str, Set[str]] = {}  # thread id -> draft message ids
+        self._message_thread: Dict[str, str] = {}  # draft message id -> thread id
+        self._draft_ids: Dict[str, str] = {}  # draft message id -> draft id (when known)
+        self._thread_locks: Dict[str, threading.Lock] = {}
+        self._history_id: Optional[str] = None
+        self._last_refresh = 0.0
+
+    def _add(self, thread_id: str, message_id: str, draft_id: Optional[str] = None) -> None:
+        self._threads.setdefault(thread_id, set()).add(message_id)
+        self._message_thread[message_id] = thread_id
+        if draft_id:
+            self._draft_ids[message_id] = draft_id
+
+    def _remove(self, message_id: str) -> None:
+        thread_id = self._message_thread.pop(message_id, None)
+        self._draft_ids.pop(message_id, None)
+        if thread_id is None:
+            return
+        drafts = self._threads.get(thread_id, set())
+        drafts.discard(message_id)
+        if not drafts:
+            self._threads.pop(thread_id, None)
+
+    def build(self, service) -> int:
+        """(Re)build from drafts.list, all pages. Returns the number of drafts."""
+        with self._lock:
+            # Read the historyId first so drafts changed during the listing are replayed.
+            history_id = service.users().getProfile(userId="me").execute()["historyId"]
+            self._threads, self._message_thread, self._draft_ids = {}, {}, {}
+            page_token = None
+            count = 0
+            while True:
+                resp = (
+                    service.users()
+                    .drafts()
+                    .list(userId="me", maxResults=500, pageToken=page_token)
+                    .execute()
+                    or {}
+                )
+                for draft in resp.get("drafts", []):
+                    msg = draft.get("message", {})
+                    if msg.get("threadId"):
+                        self._add(msg["threadId"], msg.get("id") or draft["id"], draft.get("id"))
+                        count += 1
+                page_token = resp.get("nextPageToken")
+                if not page_token:
+                    break
+            self._history_id = str(history_id)
+            self._last_refresh = time.monotonic()
+            return count
+
+    def refresh(self, service) -> None:
+        """Apply draft changes since the last build/refresh via the history API."""
+        with self._lock:
+            if self._history_id is None:
+                self.build(service)
+                return
+            try:
+                records, latest = list_history(service, self._history_id, history_types=_HISTORY_TYPES, label_id="DRAFT")
+            except HttpError as e:
+                if e.resp.status != 404:
+                    raise
+                self.build(service)
+                return
+
+            for record in records:
+                for entry in record.get("messagesAdded", []):
+                    msg = entry["message"]
+                    if "DRAFT" in msg.get("labelIds", []) and msg.get("threadId"):
+                        self._add(msg["threadId"], msg["id"])
+                for entry in record.get("labelsAdded", []):
+                    msg = entry["message"]
+                    if "DRAFT" in entry.get("labelIds", []) and msg.get("threadId"):
+                        self._add(msg["threadId"], msg["id"])
+                for entry in record.get("labelsRemoved", []):
+                    if "DRAFT" in entry.get("labelIds", []):
+                        self._remove(entry["message"]["id"])
+                for entry in record.get("messagesDeleted", []):
+                    self._remove(entry["message"]["id"])
+
+            self._history_id = str(latest)
+            self._last_refresh = time.monotonic()
+
+    def _refresh_if_stale(self, service) -> None:
+        if self._history_id is not None and time.monotonic() - self._last_refresh < DRAFT_INDEX_REFRESH_SECONDS:
+            return
+        try:
+            self.refresh(service)
+        except Exception as e:
+            if self._history_id is None:
+                raise
+            # Keep answering from what we know; the next lookup tries again.
+            print(f"⚠️ Could not refresh draft index for '{self.profile}': {e}")
+            self._last_refresh = time.monotonic()
+
+    def has_draft(self, service, thread_id: str) -> bool:
+        with self._lock:
+            self._refresh_if_stale(service)
+            return thread_id in self._threads
+
+    def draft_id(self, thread_id: str) -> Optional[str]:
+        """Id of a known draft in the thread (None if none, or only seen via history)."""
+        with self._lock:
+            for message_id in self._threads.get(thread_id, ()):
+                if message_id in self._draft_ids:
+                    return self._draft_ids[message_id]
+            return None
+
+    def record(self, thread_id: str, message_id: str, draft_id: Optional[str] = None) -> None:
+        """Register a draft we just created."""
+        with self._lock:
+            self._add(thread_id, message_id, draft_id)
+
+    def thread_lock(self, thread_id: str) -> threading.Lock:
+        """Serializes check-then-create for one thread."""
+        with self._lock:
+            return self._thread_locks.setdefault(thread_id, threading.Lock())
+
+
+_indexes: Dict[str, DraftIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_draft_index(profile: str) -> DraftIndex:
+    """Return the process-wide draft index for a profile."""
+    with _indexes_lock:
+        if profile not in _indexes:
+            _indexes[profile] = DraftIndex(profile)
+        return _indexes[profile]
@@ -0,0 +1,272 @@
+import base64
+import hashlib
+import io
+import multiprocessing
+import queue
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from xml.etree import ElementTree
+
+import openpyxl
+import pypdf
+
+try:
+    import resource  # POSIX only; without it workers run without memory/CPU limits.
+except ImportError:
+    resource = None
+
+from config import (
+    ATTACHMENT_CPU_WORKERS,
+    ATTACHMENT_IO_WORKERS,
+    ATTACHMENT_MAX_BYTES,
+    ATTACHMENT_MAX_CHARS,
+    ATTACHMENT_MEMORY_LIMIT_BYTES,
+    ATTACHMENT_TIMEOUT_SECONDS,
+)
+
+# Attachment downloading and parsing, off the caller's thread.
+#
+# Downloads run on a thread pool (I/O bound). Parsing runs in a small set of
+# worker processes (CPU bound, and the parsers are not trusted with arbitrary
+# input): workers run under a memory limit, every file gets a wall-clock
+# timeout, and a worker stuck on a pathological file is killed, replaced, and
+# the file reported as a TRUNCATED marker instead of stalling the triage run.
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.xlsx')
+
+_WORKER_START_TIMEOUT = 60
+
+# forkserver forks workers from a clean single-threaded server process, which is
+# safe next to our download threads (plain fork is not).
+_start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+_mp_context = multiprocessing.get_context(_start_method)
+if _start_method == "forkserver":
+    _mp_context.set_forkserver_preload(["utils.extraction_pool"])
+
+
+# The extractors stream: they stop reading as soon as the page/paragraph/row
+# limit or the ATTACHMENT_MAX_CHARS budget is reached, instead of loading the
+# whole document first.
+
+_W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def _extract_pdf_text(data: bytes, pages: int = 2, max_chars: int = ATTACHMENT_MAX_CHARS) -> str:
+    reader = pypdf.PdfReader(io.BytesIO(data))
+    text = []
+    size = 0
+    for i in range(min(pages, len(reader.pages))):
+        page_text = reader.pages[i].extract_text() or ""
+        text.append(page_text)
+        size += len(page_text) + 1
+        if size >= max_chars:
+            break
+    return "\n".join(text)[:max_chars]
+
+def _extract_docx_text(data: bytes, paragraphs: int = 50, max_chars: int = ATTACHMENT_MAX_CHARS) -> str:
+    # Rough limit: 50 paragraphs ~ 2 pages. Reads word/document.xml incrementally
+    # rather than building the full python-docx object model.
+    text = []
+    size = 0
+    with zipfile.ZipFile(io.BytesIO(data)) as archive, archive.open("word/document.xml") as xml:
+        for _, elem in ElementTree.iterparse(xml, events=("end",)):
+            if elem.tag != _W_NS + "p":
+                continue
+            para = "".join(t.text or "" for t in elem.iter(_W_NS + "t"))
+            elem.clear()
+            text.append(para)
+            size += len(para) + 1
+            if len(text) >= paragraphs or size >= max_chars:
+                break
+    return "\n".join(text)[:max_chars]
+
+def _extract_xlsx_text(data: bytes, rows: int = 50, max_chars: int = ATTACHMENT_MAX_CHARS) -> str:
+    # read_only streams rows from the sheet XML instead of loading every cell.
+    wb = openpyxl.load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    try:
+        sheet = wb.active
+        text = []
+        size = 0
+        for i, row in enumerate(sheet.iter_rows(values_only=True)):
+            if i >= rows or size >= max_chars: break
+            # Filter None and join
+            row_text = "\t".join([str(c) if c is not None else "" for c in row])
+            if row_text.strip():
+                text.append(row_text)
+                size += len(row_text) + 1
+    finally:
+        wb.close()
+    return "\n".join(text)[:max_chars]
+
+
+_EXTRACTORS = {
+    '.pdf': ("PDF", _extract_pdf_text),
+    '.docx': ("DOCX", _extract_docx_text),
+    '.xlsx': ("XLSX", _extract_xlsx_text),
+}
+
+
+def _extract_attachment_text(lower_name: str, data: bytes) -> str:
+    for ext, (kind, extractor) in _EXTRACTORS.items():
+        if lower_name.endswith(ext):
+            try:
+                return extractor(data)
+            except MemoryError:
+                return _truncated(f"{kind} exceeded the memory limit")
+            except Exception as e:
+                return f"[Error processing {kind}: {e}]"
+    return ""
+
+
+def _truncated(reason: str) -> str:
+    return f"[TRUNCATED: {reason}]"
+
+
+def is_truncated(text: str) -> bool:
+    return text.startswith("[TRUNCATED:")
+
+
+def _sha256_b64(data_b64: str, chunk: int = 1 << 20) -> str:
+    """sha256 of base64url data, decoded a chunk at a time (chunk is a multiple of 4)."""
+    digest = hashlib.sha256()
+    for start in range(0, len(data_b64), chunk):
+        digest.update(base64.urlsafe_b64decode(data_b64[start:start + chunk]))
+    return digest.hexdigest()
+
+
+def _worker_loop(conn, memory_limit: int) -> None:
+    """Extraction process: apply the memory limit once, then parse files sent over the pipe."""
+    if resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    conn.send("ready")
+    while True:
+        try:
+            lower_name, data_b64 = conn.recv()
+        except EOFError:
+            return
+        # Decoded here, under the memory limit, rather than in the parent.
+        conn.send(_extract_attachment_text(lower_name, base64.urlsafe_b64decode(data_b64)))
+
+
+class _Worker:
+    """One long-lived extraction process. Killed and replaced if a file hangs it."""
+
+    def __init__(self):
+        self._conn, child_conn = _mp_context.Pipe()
+        self._proc = _mp_context.Process(
+            target=_worker_loop, args=(child_conn, ATTACHMENT_MEMORY_LIMIT_BYTES), daemon=True
+        )
+        self._proc.start()
+        child_conn.close()
+        # Start-up re-imports the parent's __main__ module, which can take seconds;
+        # wait for it here so it never counts against a file's parse timeout.
+        if not self._conn.poll(_WORKER_START_TIMEOUT) or self._conn.recv() != "ready":
+            self.kill()
+            raise RuntimeError("attachment extraction worker failed to start")
+
+    def extract(self, lower_name: str, data_b64: str, timeout: float) -> Optional[str]:
+        """Parsed text, or None if the worker timed out or died (it must then be discarded)."""
+        try:
+            self._conn.send((lower_name, data_b64))
+            if self._conn.poll(timeout):
+                return self._conn.recv()
+        except (EOFError, OSError):
+            pass
+        return None
+
+    def kill(self) -> None:
+        self._conn.close()
+        if self._proc.is_alive():
+            self._proc.kill()
+        self._proc.join()
+
+
+class ExtractionPool:
+    """Downloads and parses attachments in parallel, consulting the attachment cache first."""
+
+    def __init__(self, io_workers: int = ATTACHMENT_IO_WORKERS, cpu_workers: int = ATTACHMENT_CPU_WORKERS):
+        self._io_pool = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="attachment-io")
+        self._cpu_slots = threading.BoundedSemaphore(cpu_workers)
+        self._idle_workers: "queue.SimpleQueue[_Worker]" = queue.SimpleQueue()
+
+    def warm(self, workers: int = 1) -> None:
+        """Start worker processes ahead of time instead of on the first attachment."""
+        for worker in list(self._io_pool.map(lambda _: _Worker(), range(workers))):
+            self._idle_workers.put(worker)
+
+    def _parse(self, filename: str, data_b64: str, timeout: float = ATTACHMENT_TIMEOUT_SECONDS) -> str:
+        with self._cpu_slots:
+            try:
+                worker = self._idle_workers.get_nowait()
+            except queue.Empty:
+                worker = _Worker()
+            text = worker.extract(filename.lower(), data_b64, timeout)
+            if text is None:
+                worker.kill()
+                return _truncated(f"{filename} could not be parsed within {timeout:g}s and the memory limit")
+            self._idle_workers.put(worker)
+            return text
+
+    def _resolve(self, job: Dict[str, str]) -> str:
+        # Imported here so extraction processes don't pull in the Google client stack.
+        from auth.google_auth import get_gmail_service
+        from utils.attachment_cache import get_attachment_cache
+
+        cache = get_attachment_cache()
+        profile, message_id, part_key = job["profile"], job["message_id"], job["part_key"]
+        text = cache.lookup(profile, message_id, part_key)
+        if text is not None:
+            return text
+
+        size = int(job.get("size") or 0)
+        if size > ATTACHMENT_MAX_BYTES:
+            return _truncated(
+                f"{job['filename']} is {size / 2**20:.1f} MB, over the {ATTACHMENT_MAX_BYTES / 2**20:g} MB limit"
+            )
+
+        service = get_gmail_service(profile=profile)
+        data_b64 = service.users().messages().attachments().get(
+            userId="me", messageId=message_id, id=job["attachment_id"]
+        ).execute()["data"]
+        digest = _sha256_b64(data_b64)
+
+        text = cache.lookup_content(digest)
+        if text is None:
+            text = self._parse(job["filename"], data_b64)
+            if is_truncated(text):
+                # Timeouts can be load-related; try again next time instead of caching.
+                return text
+        cache.store(profile, message_id, part_key, digest, text)
+        return text
+
+    def extract(self, jobs: List[Dict[str, str]]) -> List[Optional[str]]:
+        """
+        Resolve attachment jobs concurrently. Each job is a dict with profile,
+        message_id, part_key, attachment_id, filename and (optionally) size, the
+        part's body.size. Returns texts in job order; None where the download
+        itself failed.
+        """
+        futures = [self._io_pool.submit(self._resolve, job) for job in jobs]
+        results: List[Optional[str]] = []
+        for job, future in zip(jobs, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"Failed to read attachment {job['filename']}: {e}")
+                results.append(None)
+        return results
+
+
+_pool: Optional[ExtractionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_extraction_pool() -> ExtractionPool:
+    """Return the process-wide extraction pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ExtractionPool()
+        return _pool
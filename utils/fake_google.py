@@ -0,0 +1,1077 @@
+"""
+In-process stand-in for the parts of the Gmail v1 and Calendar v3 APIs the toolsets use.
+
+It mimics the googleapiclient call chain (service.users().messages().get(...).execute())
+and sleeps `latency` seconds per HTTP round trip, so benchmarks and load tests can
+compare request patterns without network access. A batch request costs a single
+round trip. Errors are raised as googleapiclient HttpError with Google's status
+codes and JSON bodies (404 notFound, 400 invalid label, 429/403 rate limits, 503).
+
+Quota: every call costs Google's quota units (messages.get 5, batchModify 50, ...)
+from a per-user bucket refilled at `quota_per_second`; an empty bucket answers
+with a rate limit error, like Gmail does above 250 units/s. `error_rate` adds
+random 503s. Both apply to batch sub-requests one by one.
+
+Gmail search (messages.list q=) understands the operators the agents use:
+label:, in:, is:, category:, from:, to:, subject:, has:attachment, filename:,
+newer_than:/older_than:, after:/before: and free text (AND only, no OR/braces).
+Relative dates count from `now_ms`, by default the newest message in the mailbox,
+so fixtures with fixed dates answer the same whatever day the benchmark runs.
+
+Large generated mailboxes: see utils/fake_mailbox.py.
+"""
+import base64
+import bisect
+import copy
+import email
+import io
+import json
+import random
+import re
+import threading
+import time
+import zipfile
+from datetime import datetime, timezone
+from email.policy import default as default_policy
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from utils.tracing import get_tracer
+
+# Gmail API quota units per method (developers.google.com/gmail/api/reference/quota).
+GMAIL_QUOTA_UNITS = {
+    "messages.list": 5,
+    "messages.get": 5,
+    "messages.modify": 5,
+    "messages.batchModify": 50,
+    "messages.attachments.get": 5,
+    "threads.get": 10,
+    "drafts.list": 5,
+    "drafts.create": 10,
+    "labels.list": 1,
+    "labels.create": 5,
+    "history.list": 2,
+    "getProfile": 1,
+}
+
+# Most sub-requests Google accepts in one batch HTTP request.
+MAX_BATCH_REQUESTS = 100
+
+SYSTEM_LABELS = (
+    "INBOX", "UNREAD", "DRAFT", "SENT", "SPAM", "TRASH", "STARRED", "IMPORTANT",
+    "CATEGORY_PERSONAL", "CATEGORY_SOCIAL", "CATEGORY_PROMOTIONS", "CATEGORY_UPDATES", "CATEGORY_FORUMS",
+)
+
+
+def http_error(status: int, reason: str, message: str) -> HttpError:
+    """An HttpError shaped like Google's: JSON body with code, message and errors[].reason."""
+    content = {"error": {"code": status, "message": message, "errors": [{"reason": reason, "message": message}]}}
+    return HttpError(httplib2.Response({"status": str(status), "reason": reason}), json.dumps(content).encode("utf-8"))
+
+
+def _not_found() -> HttpError:
+    return http_error(404, "notFound", "Requested entity was not found.")
+
+
+class FakeRequest:
+    """Deferred call, like googleapiclient.http.HttpRequest."""
+
+    def __init__(self, backend: "FakeBackend", fn: Callable[[], Any], units: int = 1):
+        self._backend = backend
+        self._fn = fn
+        self._units = units
+
+    def execute(self) -> Any:
+        self._backend.simulate_roundtrip()
+        return self._backend.call(self._fn, self._units)
+
+
+class FakeBatchRequest:
+    """Collects requests and answers them all in one simulated round trip."""
+
+    def __init__(self, backend: "FakeBackend", callback: Optional[Callable] = None):
+        self._backend = backend
+        self._callback = callback
+        self._entries: List[tuple] = []
+
+    def add(self, request: FakeRequest, callback: Optional[Callable] = None, request_id: Optional[str] = None) -> None:
+        if request_id is None:
+            request_id = str(len(self._entries) + 1)
+        self._entries.append((request_id, request, callback or self._callback))
+
+    def execute(self) -> None:
+        if len(self._entries) > MAX_BATCH_REQUESTS:
+            raise http_error(400, "badRequest", f"Too many requests in batch ({len(self._entries)} > {MAX_BATCH_REQUESTS}).")
+        self._backend.simulate_roundtrip()
+        for request_id, request, callback in self._entries:
+            try:
+                response, exception = self._backend.call(request._fn, request._units), None
+            except Exception as e:
+                response, exception = None, e
+            if callback:
+                callback(request_id, response, exception)
+
+
+class FakeBackend:
+    """Latency, quota and random errors shared by the fake Gmail and Calendar services."""
+
+    span_name = "fake google roundtrip"
+    quota_status = 429
+
+    def __init__(self, latency: float = 0.05, quota_per_second: float = 0, error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.quota_per_second = quota_per_second
+        self.error_rate = error_rate
+        self.roundtrips = 0
+        self.calls = 0
+        self.quota_units = 0
+        self.quota_errors = 0
+        self.server_errors = 0
+        # Reentrant: a call may read the mailbox through helpers that lock again.
+        self._lock = threading.RLock()
+        self._random = random.Random(seed)
+        self._bucket = float(quota_per_second)
+        self._bucket_at = time.monotonic()
+
+    def simulate_roundtrip(self) -> None:
+        with self._lock:
+            self.roundtrips += 1
+        if self.latency:
+            # Traced like a real request, so benchmark traces show where the I/O goes.
+            with get_tracer().span("http", self.span_name):
+                time.sleep(self.latency)
+
+    def call(self, fn: Callable[[], Any], units: int) -> Any:
+        """Charge quota for one API call and run it (under the backend lock)."""
+        with self._lock:
+            self.calls += 1
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.server_errors += 1
+                raise http_error(503, "backendError", "The service is currently unavailable.")
+            if self.quota_per_second:
+                now = time.monotonic()
+                self._bucket = min(self.quota_per_second, self._bucket + (now - self._bucket_at) * self.quota_per_second)
+                self._bucket_at = now
+                if self._bucket < units:
+                    self.quota_errors += 1
+                    raise http_error(self.quota_status, "rateLimitExceeded", "User-rate limit exceeded. Retry after a moment.")
+                self._bucket -= units
+            self.quota_units += units
+            return fn()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "roundtrips": self.roundtrips,
+            "calls": self.calls,
+            "quota_units": self.quota_units,
+            "quota_errors": self.quota_errors,
+            "server_errors": self.server_errors,
+        }
+
+    def new_batch_http_request(self, callback: Optional[Callable] = None) -> FakeBatchRequest:
+        return FakeBatchRequest(self, callback)
+
+
+# --- Gmail --------------------------------------------------------------------------------
+
+
+def _shape(msg: Dict[str, Any], format: str, metadata_headers: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Cut a stored message down to what messages.get/threads.get return for `format`."""
+    if format == "metadata":
+        wanted = set(metadata_headers or [])
+        payload = msg.get("payload", {})
+        shaped = {k: copy.deepcopy(v) for k, v in msg.items() if k != "payload"}
+        shaped["payload"] = {
+            "mimeType": payload.get("mimeType"),
+            "headers": [dict(h) for h in payload.get("headers", []) if not wanted or h["name"] in wanted],
+        }
+        return shaped
+    if format == "minimal":
+        return {k: copy.deepcopy(v) for k, v in msg.items() if k != "payload"}
+    return msg
+
+
+def _ref(msg: Dict[str, Any]) -> Dict[str, Any]:
+    return {"id": msg["id"], "threadId": msg["threadId"], "labelIds": list(msg.get("labelIds", []))}
+
+
+class _SearchRecord:
+    """What messages.list q= looks at, extracted once per message."""
+
+    __slots__ = ("date", "sender", "to", "subject", "text", "filenames")
+
+    def __init__(self, msg: Dict[str, Any]):
+        headers = {h["name"].lower(): h["value"] for h in msg.get("payload", {}).get("headers", [])}
+        self.date = int(msg.get("internalDate", 0))
+        self.sender = headers.get("from", "").casefold()
+        self.to = (headers.get("to", "") + " " + headers.get("cc", "")).casefold()
+        self.subject = headers.get("subject", "").casefold()
+        self.filenames = [p["filename"].casefold() for p in _walk_parts(msg.get("payload", {})) if p.get("filename")]
+        self.text = " ".join([self.sender, self.to, self.subject, msg.get("snippet", "").casefold()] + self.filenames)
+
+
+def _walk_parts(payload: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
+    yield payload
+    for part in payload.get("parts", []) or []:
+        yield from _walk_parts(part)
+
+
+_QUERY_TERM = re.compile(r'(-?)(?:([A-Za-z_]+):("[^"]*"|\S+)|"([^"]*)"|(\S+))')
+_RELATIVE = re.compile(r"^(\d+)([hdmy])$")
+_RELATIVE_MS = {"h": 3600_000, "d": 86400_000, "m": 30 * 86400_000, "y": 365 * 86400_000}
+_IN_LABELS = {"inbox": "INBOX", "sent": "SENT", "drafts": "DRAFT", "draft": "DRAFT", "spam": "SPAM", "trash": "TRASH", "starred": "STARRED", "important": "IMPORTANT"}
+_IS_LABELS = {"unread": "UNREAD", "starred": "STARRED", "important": "IMPORTANT"}
+
+
+# Record key -> historyTypes value that selects it.
+_HISTORY_TYPES = {"messagesAdded": "messageAdded", "messagesDeleted": "messageDeleted", "labelsAdded": "labelAdded", "labelsRemoved": "labelRemoved"}
+
+
+def _date_ms(value: str) -> Optional[int]:
+    if value.isdigit():
+        return int(value) * 1000
+    try:
+        return int(datetime.strptime(value.replace("-", "/"), "%Y/%m/%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
+    except ValueError:
+        return None
+
+
+class _Messages:
+    def __init__(self, backend: "FakeGmailService"):
+        self._backend = backend
+
+    def list(
+        self,
+        userId: str,
+        q: str = "",
+        maxResults: int = 100,
+        pageToken: Optional[str] = None,
+        labelIds: Optional[List[str]] = None,
+        includeSpamTrash: bool = False,
+    ) -> FakeRequest:
+        def run():
+            found = self._backend.search(q, labelIds, includeSpamTrash)
+            start = int(pageToken or 0)
+            page = found[start:start + maxResults]
+            resp: Dict[str, Any] = {"resultSizeEstimate": len(found)}
+            if page:
+                resp["messages"] = [{"id": m["id"], "threadId": m["threadId"]} for m in page]
+            if start + maxResults < len(found):
+                resp["nextPageToken"] = str(start + maxResults)
+            return resp
+
+        return FakeRequest(self._backend, run, GMAIL_QUOTA_UNITS["messages.list"])
+
+    def get(self, userId: str, id: str, format: str = "full", metadataHeaders: Optional[List[str]] = None) -> FakeRequest:
+        return FakeRequest(
+            self._backend,
+            lambda: _shape(self._backend.get_message(id), format, metadataHeaders),
+            GMAIL_QUOTA_UNITS["messages.get"],
+        )
+
+    def modify(self, userId: str, id: str, body: Dict[str, Any]) -> FakeRequest:
+        def run():
+            return self._backend.modify_labels([id], body)[0]
+
+        return FakeRequest(self._backend, run, GMAIL_QUOTA_UNITS["messages.modify"])
+
+    def batchModify(self, userId: str, body: Dict[str, Any]) -> FakeRequest:
+        def run():
+            if len(body.get("ids", [])) > 1000:
+                raise http_error(400, "invalidArgument", "Too many ids (max 1000).")
+            self._backend.modify_labels(body.get("ids", []), body)
+            return ""
+
+        return FakeRequest(self._backend, run, GMAIL_QUOTA_UNITS["messages.batchModify"])
+
+    def attachments(self) -> "_Attachments":
+        return _Attachments(self._backend)
+
+
+class _Attachments:
+    def __init__(self, backend: "FakeGmailService"):
+        self._backend = backend
+
+    def get(self, userId: str, messageId: str, id: str) -> FakeRequest:
+        def run():
+            data = self._backend.attachments.get(id)
+            if data is None:
+                raise http_error(400, "invalidArgument", "Invalid attachment token")
+            return {"attachmentId": id, "size": len(data), "data": base64.urlsafe_b64encode(data).decode("ascii")}
+
+        return FakeRequest(self._backend, run, GMAIL_QUOTA_UNITS["messages.attachments.get"])
+
+
+class _Threads:
+    def __init__(self, backend: "FakeGmailService"):
+        self._backend = backend
+
+    def get(self, userId: str, id: str, format: str = "full", metadataHeaders: Optional[List[str]] = None) -> FakeRequest:
+        def run():
+            messages = self._backend.thread_messages(id)
+            if not messages:
+                raise _not_found()
+            return {
+                "id": id,
+                "historyId": str(self._backend.history_id),
+                "messages": [_shape(m, format, metadataHeaders) for m in messages],
+            }
+
+        return FakeRequest(self._backend, run, GMAIL_QUOTA_UNITS["threads.get"])
+
+
+class _Labels:
+    def __init__(self, backend: "FakeGmailService"):
+        self._backend = backend
+
+    def list(self, userId: str) -> FakeRequest:
+        return FakeRequest(
+            self._backend, lambda: {"labels": [dict(label) for label in self._backend.labels.values()]}, GMAIL_QUOTA_UNITS["labels.list"]
+        )
+
+    def create(self, userId: str, body: Dict[str, Any]) -> FakeRequest:
+        return FakeRequest(self._backend, lambda: dict(self._backend.create_label(body)), GMAIL_QUOTA_UNITS["labels.create"])
+
+
+class _Drafts:
+    def __init__(self, backend: "FakeGmailService"):
+        self._backend = backend
+
+    def list(self, userId: str, maxResults: int = 100, pageToken: Optional[str] = None) -> FakeRequest:
+        def run():
+            drafts = self._backend.drafts
+            start = int(pageToken or 0)
+            page = drafts[start:start + maxResults]
+            resp: Dict[str, Any] = {"resultSizeEstimate": len(drafts)}
+            if page:
+                resp["drafts"] = [copy.deepcopy(d) for d in page]
+            if start + maxResults < len(drafts):
+                resp["nextPageToken"] = str(start + maxResults)
+            return resp
+
+        return FakeRequest(self._backend, run, GMAIL_QUOTA_UNITS["drafts.list"])
+
+    def create(self, userId: str, body: Dict[str, Any]) -> FakeRequest:
+        return FakeRequest(self._backend, lambda: copy.deepcopy(self._backend.create_draft(body)), GMAIL_QUOTA_UNITS["drafts.create"])
+
+
+class _History:
+    def __init__(self, backend: "FakeGmailService"):
+        self._backend = backend
+
+    def list(
+        self,
+        userId: str,
+        startHistoryId: str,
+        historyTypes: Optional[List[str]] = None,
+        labelId: Optional[str] = None,
+        maxResults: int = 100,
+        pageToken: Optional[str] = None,
+    ) -> FakeRequest:
+        def run():
+            records = self._backend.history_since(int(startHistoryId), historyTypes, labelId)
+            start = int(pageToken or 0)
+            resp: Dict[str, Any] = {"historyId": str(self._backend.history_id)}
+            if records[start:start + maxResults]:
+                resp["history"] = records[start:start + maxResults]
+            if start + maxResults < len(records):
+                resp["nextPageToken"] = str(start + maxResults)
+            return resp
+
+        return FakeRequest(self._backend, run, GMAIL_QUOTA_UNITS["history.list"])
+
+
+class _Users:
+    def __init__(self, backend: "FakeGmailService"):
+        self._backend = backend
+
+    def messages(self) -> _Messages:
+        return _Messages(self._backend)
+
+    def threads(self) -> _Threads:
+        return _Threads(self._backend)
+
+    def labels(self) -> _Labels:
+        return _Labels(self._backend)
+
+    def drafts(self) -> _Drafts:
+        return _Drafts(self._backend)
+
+    def history(self) -> _History:
+        return _History(self._backend)
+
+    def getProfile(self, userId: str) -> FakeRequest:
+        return FakeRequest(
+            self._backend,
+            lambda: {
+                "emailAddress": self._backend.address,
+                "messagesTotal": len(self._backend.messages),
+                "threadsTotal": len(self._backend.threads),
+                "historyId": str(self._backend.history_id),
+            },
+            GMAIL_QUOTA_UNITS["getProfile"],
+        )
+
+
+class FakeGmailService(FakeBackend):
+    """
+    Stand-in for the object returned by get_gmail_service().
+
+    `messages` is the mailbox (message resources as built by make_message); add mail
+    later with deliver() so it shows up in history. Label changes, drafts and new
+    mail are recorded as history; the newest `history_limit` records are kept, an
+    older startHistoryId gets a 404 like Gmail's expired history ids.
+    """
+
+    span_name = "fake gmail roundtrip"
+
+    def __init__(
+        self,
+        messages: List[Dict[str, Any]],
+        latency: float = 0.05,
+        quota_per_second: float = 0,
+        error_rate: float = 0.0,
+        now_ms: Optional[int] = None,
+        address: str = "me@example.com",
+        history_limit: int = 100_000,
+        seed: int = 0,
+    ):
+        super().__init__(latency, quota_per_second, error_rate, seed)
+        self.messages = messages
+        self.address = address
+        self.now_ms = now_ms
+        self.attachments: Dict[str, bytes] = {}
+        self.labels: Dict[str, Dict[str, Any]] = {
+            name: {"id": name, "name": name, "type": "system"} for name in SYSTEM_LABELS
+        }
+        self.drafts: List[Dict[str, Any]] = []
+        self.history_id = 1000
+        self.history: List[Dict[str, Any]] = []
+        self.history_limit = history_limit
+        self._history_floor = self.history_id
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self.threads: Dict[str, List[Dict[str, Any]]] = {}
+        self._by_label: Dict[str, Set[str]] = {}
+        self._search: Dict[str, _SearchRecord] = {}
+        self._order: Optional[List[Dict[str, Any]]] = None
+        self._newest = 0
+        self._next_id = 1
+        for msg in messages:
+            self._index(msg)
+
+    # -- mailbox -------------------------------------------------------------------------
+
+    def _index(self, msg: Dict[str, Any]) -> None:
+        self._by_id[msg["id"]] = msg
+        thread = self.threads.setdefault(msg["threadId"], [])
+        bisect.insort(thread, msg, key=lambda m: int(m.get("internalDate", 0)))
+        for label in msg.get("labelIds", []):
+            self._by_label.setdefault(label, set()).add(msg["id"])
+        self._newest = max(self._newest, int(msg.get("internalDate", 0)))
+        self._order = None
+        try:
+            self._next_id = max(self._next_id, int(msg["id"], 16) + 1)
+        except ValueError:
+            pass
+
+    def add_message(self, msg: Dict[str, Any]) -> None:
+        """Put a message in the mailbox without a history record (building fixtures)."""
+        with self._lock:
+            self.messages.append(msg)
+            self._index(msg)
+
+    def deliver(self, msg: Dict[str, Any]) -> None:
+        """New mail arriving: add it and record messagesAdded, as Gmail's history does."""
+        with self._lock:
+            self.add_message(msg)
+            self._record("messagesAdded", [{"message": _ref(msg)}])
+
+    def new_message_id(self) -> str:
+        with self._lock:
+            msg_id = f"{self._next_id:016x}"
+            self._next_id += 1
+            return msg_id
+
+    def clock_ms(self) -> int:
+        """The mailbox's "now": now_ms if set, else just after the newest message."""
+        return self.now_ms if self.now_ms is not None else self._newest + 1
+
+    def get_message(self, message_id: str) -> Dict[str, Any]:
+        msg = self._by_id.get(message_id)
+        if msg is None:
+            raise _not_found()
+        return msg
+
+    def thread_messages(self, thread_id: str) -> List[Dict[str, Any]]:
+        """Messages of a thread, oldest first (as threads.get returns them)."""
+        return list(self.threads.get(thread_id, []))
+
+    def modify_labels(self, message_ids: List[str], body: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Apply addLabelIds/removeLabelIds to messages (400 for an unknown label, 404 for an unknown message)."""
+        add, remove = body.get("addLabelIds", []), body.get("removeLabelIds", [])
+        with self._lock:
+            unknown = [label for label in add + remove if label not in self.labels]
+            if unknown:
+                raise http_error(400, "invalidArgument", f"Invalid label: {unknown[0]}")
+            messages = [self.get_message(message_id) for message_id in message_ids]
+            added, removed = [], []
+            for msg in messages:
+                before = msg.get("labelIds", [])
+                labels = [label for label in before if label not in remove]
+                msg["labelIds"] = labels + [label for label in add if label not in labels]
+                gained = [label for label in msg["labelIds"] if label not in before]
+                lost = [label for label in before if label not in msg["labelIds"]]
+                for label in gained:
+                    self._by_label.setdefault(label, set()).add(msg["id"])
+                for label in lost:
+                    self._by_label.get(label, set()).discard(msg["id"])
+                if gained:
+                    added.append({"message": _ref(msg), "labelIds": gained})
+                if lost:
+                    removed.append({"message": _ref(msg), "labelIds": lost})
+            if added:
+                self._record("labelsAdded", added)
+            if removed:
+                self._record("labelsRemoved", removed)
+            return [_ref(m) for m in messages]
+
+    def create_label(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            name = body.get("name", "")
+            if any(label["name"].casefold() == name.casefold() for label in self.labels.values()):
+                raise http_error(409, "alreadyExists", "Label name exists or conflicts")
+            user_labels = sum(1 for label in self.labels.values() if label["type"] == "user")
+            label = dict(body, id=f"Label_{user_labels + 1}", type="user")
+            self.labels[label["id"]] = label
+            return label
+
+    def create_draft(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """drafts.create: the draft's message joins the thread (or starts one) with label DRAFT."""
+        with self._lock:
+            message = body.get("message", {})
+            thread_id = message.get("threadId")
+            if thread_id and thread_id not in self.threads:
+                raise _not_found()
+            parsed = email.message_from_bytes(base64.urlsafe_b64decode(message.get("raw", "") or ""), policy=default_policy)
+            text_part = parsed.get_body(("plain",)) if parsed.is_multipart() else parsed
+            text = text_part.get_content() if text_part is not None else ""
+            msg_id = self.new_message_id()
+            headers = [{"name": "From", "value": self.address}] + [
+                {"name": name, "value": str(parsed[name])} for name in ("To", "Subject", "In-Reply-To", "References") if parsed[name]
+            ]
+            data = base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii")
+            msg = {
+                "id": msg_id,
+                "threadId": thread_id or msg_id,
+                "labelIds": ["DRAFT"],
+                "snippet": " ".join(text.split())[:100],
+                "internalDate": str(self.clock_ms()),
+                "payload": {"mimeType": "text/plain", "headers": headers, "body": {"size": len(text.encode("utf-8")), "data": data}},
+            }
+            draft = {"id": f"r{len(self.drafts) + 1}", "message": {"id": msg["id"], "threadId": msg["threadId"]}}
+            self.drafts.append(draft)
+            self.deliver(msg)
+            return draft
+
+    # -- history -------------------------------------------------------------------------
+
+    def _record(self, kind: str, items: List[Dict[str, Any]]) -> None:
+        self.history_id += 1
+        self.history.append(
+            {"id": str(self.history_id), "messages": [{"id": i["message"]["id"], "threadId": i["message"]["threadId"]} for i in items], kind: items}
+        )
+        if len(self.history) > self.history_limit:
+            dropped = self.history[: len(self.history) - self.history_limit]
+            del self.history[: len(dropped)]
+            self._history_floor = int(dropped[-1]["id"])
+
+    def expire_history(self) -> None:
+        """Forget all history, so every stored startHistoryId gets a 404."""
+        with self._lock:
+            self.history.clear()
+            self._history_floor = self.history_id
+
+    def history_since(self, start: int, history_types: Optional[List[str]] = None, label_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        if start < self._history_floor:
+            raise _not_found()
+        first = bisect.bisect_right(self.history, start, key=lambda r: int(r["id"]))
+        out = []
+        for record in self.history[first:]:
+            kept = {}
+            for kind, history_type in _HISTORY_TYPES.items():
+                items = record.get(kind)
+                if not items or (history_types and history_type not in history_types):
+                    continue
+                if label_id:
+                    items = [i for i in items if label_id in i["message"]["labelIds"] or label_id in i.get("labelIds", [])]
+                if items:
+                    kept[kind] = items
+            if kept:
+                out.append(dict(copy.deepcopy(kept), id=record["id"], messages=copy.deepcopy(record["messages"])))
+        return out
+
+    # -- search --------------------------------------------------------------------------
+
+    def _label_id(self, name: str) -> Optional[str]:
+        wanted = name.strip('"').casefold().replace(" ", "-").replace("/", "-")
+        for label in self.labels.values():
+            if label["name"].casefold().replace(" ", "-").replace("/", "-") == wanted or label["id"].casefold() == wanted:
+                return label["id"]
+        return None
+
+    def _record_for(self, msg: Dict[str, Any]) -> _SearchRecord:
+        record = self._search.get(msg["id"])
+        if record is None:
+            record = self._search[msg["id"]] = _SearchRecord(msg)
+        return record
+
+    def search(self, q: str = "", label_ids: Optional[List[str]] = None, include_spam_trash: bool = False) -> List[Dict[str, Any]]:
+        """messages.list: matching messages, newest first."""
+        with self._lock:
+            now = self.clock_ms()
+            required: List[str] = list(label_ids or [])
+            excluded: List[str] = [] if include_spam_trash else ["SPAM", "TRASH"]
+            checks: List[tuple] = []  # (negated, predicate on _SearchRecord)
+            for negated, op, value, phrase, word in _QUERY_TERM.findall(q or ""):
+                negated = bool(negated)
+                op = op.lower()
+                value = value.strip('"')
+                if word in ("AND", "OR"):
+                    continue
+                label = None
+                if op == "label":
+                    label = self._label_id(value) or f"?{value}"
+                elif op == "in" and value.lower() in _IN_LABELS:
+                    label = _IN_LABELS[value.lower()]
+                    if label in excluded and not negated:
+                        excluded.remove(label)
+                elif op == "is" and value.lower() in _IS_LABELS:
+                    label = _IS_LABELS[value.lower()]
+                elif op == "is" and value.lower() == "read":
+                    label, negated = "UNREAD", not negated
+                elif op == "category":
+                    label = f"CATEGORY_{value.upper()}"
+                elif op == "in" and value.lower() == "anywhere":
+                    excluded = []
+                    continue
+                if label is not None:
+                    (excluded if negated else required).append(label)
+                    continue
+                checks.append((negated, self._predicate(op, value, phrase or word, now)))
+
+            if required:
+                ids = set.intersection(*(self._by_label.get(label, set()) for label in required))
+                candidates = sorted((self._by_id[i] for i in ids), key=lambda m: -int(m.get("internalDate", 0)))
+            else:
+                if self._order is None:
+                    self._order = sorted(self.messages, key=lambda m: -int(m.get("internalDate", 0)))
+                candidates = self._order
+            excluded_ids = set().union(*(self._by_label.get(label, set()) for label in excluded)) if excluded else set()
+            found = []
+            for msg in candidates:
+                if msg["id"] in excluded_ids:
+                    continue
+                if checks:
+                    record = self._record_for(msg)
+                    if not all(check(record) != negated for negated, check in checks):
+                        continue
+                found.append(msg)
+            return found
+
+    @staticmethod
+    def _predicate(op: str, value: str, text: str, now: int) -> Callable[[_SearchRecord], bool]:
+        value_cf = value.casefold()
+        if op == "from":
+            return lambda r: value_cf in r.sender
+        if op in ("to", "cc"):
+            return lambda r: value_cf in r.to
+        if op == "subject":
+            return lambda r: value_cf in r.subject
+        if op == "has" and value_cf == "attachment":
+            return lambda r: bool(r.filenames)
+        if op == "filename":
+            return lambda r: any(value_cf in name for name in r.filenames)
+        if op in ("newer_than", "older_than"):
+            match = _RELATIVE.match(value_cf)
+            if match:
+                cutoff = now - int(match.group(1)) * _RELATIVE_MS[match.group(2)]
+                return (lambda r: r.date >= cutoff) if op == "newer_than" else (lambda r: r.date < cutoff)
+        if op in ("after", "before", "newer", "older"):
+            cutoff = _date_ms(value)
+            if cutoff is not None:
+                return (lambda r: r.date >= cutoff) if op in ("after", "newer") else (lambda r: r.date < cutoff)
+        # Free text, or an operator the fake doesn't know: match the whole term as text.
+        needle = (f"{op}:{value}" if op else text).casefold()
+        return lambda r: needle in r.text
+
+    # -- fixtures ------------------------------------------------------------------------
+
+    def add_attachment(self, message: Dict[str, Any], filename: str, mime_type: str, data: bytes) -> None:
+        """Attach a file to a message built with make_message (turns it into multipart/mixed)."""
+        payload = message["payload"]
+        if payload.get("mimeType") != "multipart/mixed":
+            body_part: Dict[str, Any] = {"partId": "0", "mimeType": payload["mimeType"], "filename": ""}
+            if "parts" in payload:
+                body_part["parts"] = payload.pop("parts")
+                body_part["body"] = payload.pop("body", {"size": 0})
+            else:
+                body_part["body"] = payload.pop("body", {})
+            payload["mimeType"] = "multipart/mixed"
+            payload["parts"] = [body_part]
+        attachment_id = f"att-{message['id']}-{len(payload['parts'])}"
+        self.attachments[attachment_id] = data
+        payload["parts"].append(
+            {
+                "partId": str(len(payload["parts"])),
+                "mimeType": mime_type,
+                "filename": filename,
+                "body": {"attachmentId": attachment_id, "size": len(data)},
+            }
+        )
+        self._search.pop(message["id"], None)
+
+    def users(self) -> _Users:
+        return _Users(self)
+
+
+# --- Calendar -----------------------------------------------------------------------------
+
+
+def _parse_time(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _event_time(edge: Dict[str, Any]) -> Optional[datetime]:
+    value = edge.get("dateTime") or edge.get("date")
+    return _parse_time(value) if value else None
+
+
+def _rfc3339(moment: datetime) -> str:
+    return moment.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class _Events:
+    def __init__(self, backend: "FakeCalendarService"):
+        self._backend = backend
+
+    def list(
+        self,
+        calendarId: str,
+        timeMin: Optional[str] = None,
+        timeMax: Optional[str] = None,
+        maxResults: int = 250,
+        singleEvents: bool = False,
+        orderBy: Optional[str] = None,
+        q: Optional[str] = None,
+        pageToken: Optional[str] = None,
+    ) -> FakeRequest:
+        def run():
+            if orderBy == "startTime" and not singleEvents:
+                raise http_error(400, "invalid", "The requested ordering is not available for the particular query.")
+            found = self._backend.events_between(calendarId, timeMin, timeMax, q)
+            if orderBy == "startTime":
+                found.sort(key=lambda e: _event_time(e["start"]))
+            start = int(pageToken or 0)
+            resp: Dict[str, Any] = {
+                "kind": "calendar#events",
+                "summary": calendarId,
+                "items": [copy.deepcopy(e) for e in found[start:start + maxResults]],
+            }
+            if start + maxResults < len(found):
+                resp["nextPageToken"] = str(start + maxResults)
+            return resp
+
+        return FakeRequest(self._backend, run)
+
+    def get(self, calendarId: str, eventId: str) -> FakeRequest:
+        return FakeRequest(self._backend, lambda: copy.deepcopy(self._backend.get_event(calendarId, eventId)))
+
+    def insert(self, calendarId: str, body: Dict[str, Any], sendUpdates: str = "none") -> FakeRequest:
+        return FakeRequest(self._backend, lambda: copy.deepcopy(self._backend.insert_event(calendarId, body)))
+
+    def delete(self, calendarId: str, eventId: str, sendUpdates: str = "none") -> FakeRequest:
+        def run():
+            self._backend.delete_event(calendarId, eventId)
+            return ""
+
+        return FakeRequest(self._backend, run)
+
+
+class _Freebusy:
+    def __init__(self, backend: "FakeCalendarService"):
+        self._backend = backend
+
+    def query(self, body: Dict[str, Any]) -> FakeRequest:
+        def run():
+            calendars = {}
+            for item in body.get("items", []):
+                try:
+                    calendars[item["id"]] = {"busy": self._backend.busy(item["id"], body["timeMin"], body["timeMax"])}
+                except HttpError:
+                    calendars[item["id"]] = {"errors": [{"domain": "global", "reason": "notFound"}], "busy": []}
+            return {"kind": "calendar#freeBusy", "timeMin": body["timeMin"], "timeMax": body["timeMax"], "calendars": calendars}
+
+        return FakeRequest(self._backend, run)
+
+
+class FakeCalendarService(FakeBackend):
+    """Stand-in for the object returned by get_calendar_service(). `events` go in the primary calendar."""
+
+    span_name = "fake calendar roundtrip"
+    quota_status = 403
+
+    def __init__(
+        self,
+        events: Optional[List[Dict[str, Any]]] = None,
+        latency: float = 0.05,
+        quota_per_second: float = 0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        super().__init__(latency, quota_per_second, error_rate, seed)
+        self.calendars: Dict[str, Dict[str, Dict[str, Any]]] = {"primary": {}}
+        self._deleted: Set[str] = set()
+        self._next_id = 1
+        for event in events or []:
+            self.insert_event("primary", event)
+
+    def _calendar(self, calendar_id: str) -> Dict[str, Dict[str, Any]]:
+        calendar = self.calendars.get(calendar_id)
+        if calendar is None:
+            raise _not_found()
+        return calendar
+
+    def events_between(self, calendar_id: str, time_min: Optional[str], time_max: Optional[str], q: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Events overlapping [time_min, time_max), in insertion order."""
+        lower = _parse_time(time_min) if time_min else None
+        upper = _parse_time(time_max) if time_max else None
+        needle = (q or "").casefold()
+        found = []
+        for event in self._calendar(calendar_id).values():
+            start, end = _event_time(event["start"]), _event_time(event["end"])
+            if (lower and end <= lower) or (upper and start >= upper):
+                continue
+            if needle and needle not in (event.get("summary", "") + " " + event.get("description", "")).casefold():
+                continue
+            found.append(event)
+        return found
+
+    def get_event(self, calendar_id: str, event_id: str) -> Dict[str, Any]:
+        event = self._calendar(calendar_id).get(event_id)
+        if event is None:
+            raise _not_found()
+        return event
+
+    def insert_event(self, calendar_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            calendar = self._calendar(calendar_id)
+            start, end = _event_time(body.get("start", {})), _event_time(body.get("end", {}))
+            if start is None:
+                raise http_error(400, "required", "Missing start time.")
+            if end is None:
+                raise http_error(400, "required", "Missing end time.")
+            if end < start:
+                raise http_error(400, "timeRangeEmpty", "The specified time range is empty.")
+            event_id = body.get("id") or f"fakeevent{self._next_id:08d}"
+            self._next_id += 1
+            stamp = _rfc3339(datetime.now(timezone.utc))
+            event = dict(
+                copy.deepcopy(body),
+                id=event_id,
+                kind="calendar#event",
+                status=body.get("status", "confirmed"),
+                htmlLink=f"https://www.google.com/calendar/event?eid={event_id}",
+                iCalUID=f"{event_id}@google.com",
+                created=stamp,
+                updated=stamp,
+            )
+            calendar[event_id] = event
+            return event
+
+    def delete_event(self, calendar_id: str, event_id: str) -> None:
+        with self._lock:
+            calendar = self._calendar(calendar_id)
+            if event_id in self._deleted:
+                raise http_error(410, "deleted", "Resource has been deleted")
+            if calendar.pop(event_id, None) is None:
+                raise _not_found()
+            self._deleted.add(event_id)
+
+    def busy(self, calendar_id: str, time_min: str, time_max: str) -> List[Dict[str, str]]:
+        """Merged busy intervals of opaque, confirmed events, clipped to the window."""
+        lower, upper = _parse_time(time_min), _parse_time(time_max)
+        spans = sorted(
+            (max(_event_time(e["start"]), lower), min(_event_time(e["end"]), upper))
+            for e in self.events_between(calendar_id, time_min, time_max)
+            if e.get("transparency") != "transparent" and e.get("status") != "cancelled"
+        )
+        merged: List[List[datetime]] = []
+        for start, end in spans:
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        return [{"start": _rfc3339(start), "end": _rfc3339(end)} for start, end in merged]
+
+    def events(self) -> _Events:
+        return _Events(self)
+
+    def freebusy(self) -> _Freebusy:
+        return _Freebusy(self)
+
+
+# --- Fixtures -----------------------------------------------------------------------------
+
+
+def make_message(
+    index: int,
+    subject: str = "",
+    sender: str = "",
+    snippet: str = "",
+    body: str = "",
+    mime_type: str = "text/plain",
+    thread_id: str = "",
+    headers: Optional[Dict[str, str]] = None,
+) -> Dict[str, Any]:
+    """Build a minimal Gmail message resource for benchmarks. `headers` are added as extra headers."""
+    msg_id = f"{index:016x}"
+    encoded = base64.urlsafe_b64encode(body.encode("utf-8")).decode("ascii")
+    return {
+        "id": msg_id,
+        "threadId": thread_id or msg_id,
+        "labelIds": ["INBOX", "UNREAD"],
+        "snippet": snippet or f"Meddelande nummer {index}",
+        "internalDate": str(1_700_000_000_000 + index * 60_000),
+        "payload": {
+            "mimeType": mime_type,
+            "headers": [
+                {"name": "From", "value": sender or f"Avsändare {index} <user{index}@example.com>"},
+                {"name": "To", "value": "me@example.com"},
+                {"name": "Subject", "value": subject or f"Ämne {index}"},
+                {"name": "Date", "value": "Mon, 13 Oct 2025 08:00:00 +0200"},
+            ] + [{"name": name, "value": value} for name, value in (headers or {}).items()],
+            "body": {"size": len(body.encode("utf-8")), "data": encoded} if body else {"size": 0},
+        },
+    }
+
+
+def make_pdf(lines: List[str]) -> bytes:
+    """Build a minimal one-page PDF with the given text lines (Helvetica, no dependencies)."""
+    def escape(text: str) -> str:
+        return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    stream = "BT /F1 11 Tf 50 800 Td 14 TL " + " ".join(f"({escape(line)}) '" for line in lines) + " ET"
+    stream_bytes = stream.encode("latin-1", errors="replace")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        b"<< /Length " + str(len(stream_bytes)).encode() + b" >>\nstream\n" + stream_bytes + b"\nendstream",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def _zip(files: Dict[str, str]) -> bytes:
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return out.getvalue()
+
+
+def _xml_escape(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+
+
+def make_docx(paragraphs: List[str]) -> bytes:
+    """Build a minimal Word document with one paragraph per string (no dependencies)."""
+    body = "".join(f"<w:p><w:r><w:t xml:space=\"preserve\">{_xml_escape(p)}</w:t></w:r></w:p>" for p in paragraphs)
+    return _zip({
+        "[Content_Types].xml": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/></Types>'
+        ),
+        "_rels/.rels": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="word/document.xml"/></Relationships>'
+        ),
+        "word/document.xml": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f"<w:body>{body}</w:body></w:document>"
+        ),
+    })
+
+
+def make_xlsx(rows: List[List[Any]]) -> bytes:
+    """Build a minimal one-sheet workbook (inline strings and numbers, no dependencies)."""
+    def column(n: int) -> str:
+        name = ""
+        while n >= 0:
+            name = chr(ord("A") + n % 26) + name
+            n = n // 26 - 1
+        return name
+
+    def cell(ref: str, value: Any) -> str:
+        if isinstance(value, (int, float)):
+            return f'<c r="{ref}"><v>{value}</v></c>'
+        return f'<c r="{ref}" t="inlineStr"><is><t>{_xml_escape(str(value))}</t></is></c>'
+
+    sheet_rows = "".join(
+        f'<row r="{r + 1}">' + "".join(cell(f"{column(c)}{r + 1}", v) for c, v in enumerate(row)) + "</row>"
+        for r, row in enumerate(rows)
+    )
+    return _zip({
+        "[Content_Types].xml": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            "</Types>"
+        ),
+        "_rels/.rels": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="xl/workbook.xml"/></Relationships>'
+        ),
+        "xl/workbook.xml": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            '<sheets><sheet name="Blad1" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ),
+        "xl/_rels/workbook.xml.rels": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+            'Target="worksheets/sheet1.xml"/></Relationships>'
+        ),
+        "xl/worksheets/sheet1.xml": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            f"<sheetData>{sheet_rows}</sheetData></worksheet>"
+        ),
+    })
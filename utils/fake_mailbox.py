@@ -0,0 +1,421 @@
+import base64
+import random
+import threading
+import zlib
+from datetime import datetime, timedelta, timezone
+from email.utils import formatdate
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import (
+    FAKE_CALENDAR_EVENTS,
+    FAKE_ERROR_RATE,
+    FAKE_LATENCY_MS,
+    FAKE_MAILBOX_DRAFTS,
+    FAKE_MAILBOX_MESSAGES,
+    FAKE_QUOTA_PER_SECOND,
+    FAKE_SEED,
+)
+from utils.fake_google import FakeCalendarService, FakeGmailService, make_docx, make_pdf, make_xlsx
+
+# Synthetic mailboxes and calendars for the fake Google backend (GOOGLE_BACKEND=fake)
+# and for load tests.
+#
+# generate_mailbox builds a FakeGmailService with a mix of Swedish and English mail
+# the way a family inbox looks: conversations with quoted replies (threads up to
+# `max_thread` messages, our own replies labelled SENT), documents with PDF, DOCX
+# and XLSX attachments, HTML newsletters with List-Unsubscribe, receipts and
+# notifications from no-reply senders, and reply drafts. Recent mail is mostly
+# unread, older mail read and partly archived. Everything is derived from `seed`,
+# so the same arguments give the same mailbox.
+
+ME = "me@example.com"
+
+_SV_PEOPLE = [
+    "Anna Lindqvist", "Erik Johansson", "Maria Karlsson", "Lars Nilsson", "Karin Eriksson", "Johan Andersson",
+    "Eva Persson", "Mikael Svensson", "Sara Gustafsson", "Olle Söderqvist", "Ingrid Berg", "Per Åberg",
+    "Lena Holm", "Björn Lundgren", "Sofia Ek", "Gunnar Öhman",
+]
+_EN_PEOPLE = [
+    "James Miller", "Emily Clarke", "Daniel Brooks", "Olivia Turner", "Michael Green", "Sophie Walker",
+    "Thomas Wright", "Hannah Price",
+]
+_DOMAINS = ["gmail.com", "outlook.com", "telia.com", "foretaget.se", "example.org", "kommun.se"]
+
+# (sender name, address, language, subject templates, lines); notifications also carry their category label.
+_NEWSLETTERS = [
+    ("ICA Maxi", "nyhetsbrev@ica.se", "sv", ["Veckans erbjudanden hos ICA Maxi", "Helgens bästa priser – vecka {week}"],
+     ["Kycklingfilé 89 kr/kg", "Färska jordgubbar 2 för 50 kr", "Kaffe 3 för 99 kr", "Gäller t.o.m. söndag"]),
+    ("SJ", "nyhetsbrev@sj.se", "sv", ["Res billigt i höst med SJ", "Nya avgångar till Göteborg"],
+     ["Biljetter från 195 kr", "Boka senast på fredag", "Gäller resor mån–tors"]),
+    ("The Guardian", "newsletters@theguardian.com", "en", ["The Guardian weekly briefing", "Your weekend reading, week {week}"],
+     ["Five stories you may have missed", "Opinion: the case for slower cities", "Recipe of the week: autumn soup"]),
+    ("Medium Daily Digest", "noreply@medium.com", "en", ["Stories picked for you", "Your daily digest"],
+     ["How we cut our cloud bill in half", "Python tips you wish you knew earlier", "Writing better commit messages"]),
+]
+_NOTIFICATIONS = [
+    ("PostNord", "noreply@postnord.se", "sv", "CATEGORY_UPDATES", ["Ditt paket är redo att hämtas", "Leveransavisering {ref}"],
+     ["Ditt paket {ref} finns att hämta hos ombudet.", "Ta med legitimation och koden {code}.", "Paketet hämtas senast {date}."]),
+    ("Apoteket", "kvitto@apoteket.se", "sv", "CATEGORY_UPDATES", ["Kvitto på ditt köp", "Orderbekräftelse {ref}"],
+     ["Tack för ditt köp!", "Ordernummer: {ref}", "Totalt: {amount} kr inkl. moms"]),
+    ("BankID", "no-reply@bankid.com", "sv", "CATEGORY_UPDATES", ["Inloggning från ny enhet"],
+     ["Vi har registrerat en inloggning från en ny enhet.", "Var det inte du? Kontakta din bank."]),
+    ("Amazon", "shipment-tracking@amazon.com", "en", "CATEGORY_UPDATES", ["Your order has shipped", "Delivered: order {ref}"],
+     ["Your package is on its way.", "Order #{ref}", "Estimated delivery: {date}"]),
+    ("GitHub", "notifications@github.com", "en", "CATEGORY_UPDATES", ["[repo] New comment on issue #{code}", "Security alert for your repository"],
+     ["A new comment was added to the issue.", "Reply to this email directly or view it on GitHub."]),
+    ("Facebook", "notification@facebookmail.com", "en", "CATEGORY_SOCIAL", ["You have new notifications", "{name} commented on your post"],
+     ["See what your friends are up to.", "View on Facebook"]),
+]
+_CONVERSATIONS = {
+    "sv": [
+        ("Middag på lördag?", ["Hej!", "Vill ni komma på middag på lördag runt sex?", "Vi tänkte grilla om vädret håller."]),
+        ("Hämtning från förskolan", ["Hej,", "Kan du hämta Elsa på onsdag? Jag har möte till halv fem.", "Hör av dig!"]),
+        ("Angående offerten", ["Hej,", "Tack för offerten. Vi har några frågor om leveranstiden.", "Går det att starta redan i november?"]),
+        ("Kalas för Leo", ["Hej alla föräldrar!", "Leo fyller sju och vi bjuder in till kalas på lördag kl 14.", "OSA senast på torsdag."]),
+        ("Styrelsemöte i föreningen", ["Hej,", "Nästa styrelsemöte blir tisdag kl 19 i föreningslokalen.", "Dagordning kommer senare."]),
+        ("Semesterplanering", ["Hej!", "Har ni bestämt vilka veckor ni tar i sommar?", "Vi funderar på stugan vecka 28."]),
+    ],
+    "en": [
+        ("Lunch next week?", ["Hi,", "Are you free for lunch next Tuesday or Wednesday?", "There's a new place near the office."]),
+        ("Project update", ["Hi team,", "Quick update: the migration is on track for the end of the month.", "Let me know if you see any blockers."]),
+        ("Contract renewal", ["Hello,", "Following up on the renewal we discussed.", "Could you confirm the new terms by Friday?"]),
+        ("Conference trip", ["Hi,", "I booked the hotel for the conference in Berlin.", "Do you want me to book your flight as well?"]),
+    ],
+}
+_REPLIES = {
+    "sv": ["Låter bra, vi kommer gärna!", "Tyvärr går det inte den dagen, kan vi ta det veckan efter?", "Tack, jag återkommer imorgon.",
+           "Absolut, jag fixar det.", "Bra, då kör vi på det.", "Jag kollar med de andra och hör av mig."],
+    "en": ["Sounds good, count me in!", "Unfortunately that day doesn't work, could we do next week?", "Thanks, I'll get back to you tomorrow.",
+           "Sure, I'll take care of it.", "Great, let's go with that.", "Let me check with the others and get back to you."],
+}
+_SV_SUBJECTS = {subject for subject, _ in _CONVERSATIONS["sv"]}
+_SIGN_OFF = {"sv": "Med vänliga hälsningar,", "en": "Best regards,"}
+
+# (subject, filename, lines) per attachment kind and language.
+_DOCUMENTS = {
+    "pdf": {
+        "sv": ("Faktura {ref}", "faktura-{ref}.pdf", ["Faktura {ref}", "Förfallodatum: {date}", "Att betala: {amount} kr", "Bankgiro: 123-4567", "OCR: {code}"]),
+        "en": ("Invoice {ref}", "invoice-{ref}.pdf", ["Invoice {ref}", "Due date: {date}", "Amount due: EUR {amount}", "IBAN: SE12 3456 7890"]),
+    },
+    "docx": {
+        "sv": ("Protokoll från mötet", "protokoll-{ref}.docx", ["Protokoll styrelsemöte", "Närvarande: {name}", "§1 Mötet öppnas", "§2 Ekonomi: kassan är {amount} kr", "§3 Nästa möte {date}"]),
+        "en": ("Meeting notes", "meeting-notes-{ref}.docx", ["Meeting notes", "Attendees: {name}", "1. Status update", "2. Budget: {amount} EUR remaining", "3. Next meeting {date}"]),
+    },
+    "xlsx": {
+        "sv": ("Budget och utgifter", "budget-{ref}.xlsx", ["Post", "Belopp"]),
+        "en": ("Expense report", "expenses-{ref}.xlsx", ["Item", "Amount"]),
+    },
+}
+_MIME = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+_EXPENSES = {"sv": ["Hyra", "El", "Mat", "Förskola", "Bensin", "Försäkring"], "en": ["Hotel", "Flights", "Meals", "Taxi", "Conference fee"]}
+
+
+class _Builder:
+    """Turns one seeded random stream into message resources."""
+
+    def __init__(self, service: FakeGmailService, rng: random.Random, now_ms: int, days: int):
+        self.service = service
+        self.rng = rng
+        self.now_ms = now_ms
+        self.days = days
+        self.count = 0
+        self.owner = (rng.choice(_SV_PEOPLE), ME)
+
+    def person(self, language: str) -> Tuple[str, str]:
+        name = self.rng.choice(_SV_PEOPLE if language == "sv" else _EN_PEOPLE)
+        local = name.lower().replace(" ", ".").translate(str.maketrans("åäöé", "aaoe"))
+        return name, f"{local}@{self.rng.choice(_DOMAINS)}"
+
+    def fill(self, template: str, when_ms: int) -> str:
+        when = datetime.fromtimestamp(when_ms / 1000, timezone.utc)
+        return template.format(
+            ref=self.rng.randint(10000, 99999),
+            code=self.rng.randint(100, 9999),
+            amount=self.rng.randint(2, 400) * 25,
+            date=(when + timedelta(days=self.rng.randint(3, 30))).strftime("%Y-%m-%d"),
+            week=when.isocalendar()[1],
+            name=self.rng.choice(_SV_PEOPLE + _EN_PEOPLE),
+        )
+
+    def message(
+        self,
+        when_ms: int,
+        sender: Tuple[str, str],
+        to: str,
+        subject: str,
+        text: str,
+        labels: List[str],
+        thread_id: str = "",
+        html: str = "",
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, Any]:
+        self.count += 1
+        msg_id = f"{0x18000000000 + self.count:016x}"
+        header_list = [
+            {"name": "From", "value": f"{sender[0]} <{sender[1]}>" if sender[0] else sender[1]},
+            {"name": "To", "value": to},
+            {"name": "Subject", "value": subject},
+            {"name": "Date", "value": formatdate(when_ms / 1000)},
+            {"name": "Message-ID", "value": f"<{msg_id}@{sender[1].split('@')[1]}>"},
+        ] + [{"name": name, "value": value} for name, value in (headers or {}).items()]
+        text_body = {"size": len(text.encode("utf-8")), "data": base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii")}
+        if html:
+            payload = {
+                "mimeType": "multipart/alternative",
+                "headers": header_list,
+                "body": {"size": 0},
+                "parts": [
+                    {"partId": "0", "mimeType": "text/plain", "filename": "", "body": text_body},
+                    {"partId": "1", "mimeType": "text/html", "filename": "",
+                     "body": {"size": len(html.encode("utf-8")), "data": base64.urlsafe_b64encode(html.encode("utf-8")).decode("ascii")}},
+                ],
+            }
+        else:
+            payload = {"mimeType": "text/plain", "headers": header_list, "body": text_body}
+        return {
+            "id": msg_id,
+            "threadId": thread_id or msg_id,
+            "labelIds": labels,
+            "snippet": " ".join(text.split())[:100],
+            "historyId": "1000",
+            "internalDate": str(when_ms),
+            "sizeEstimate": len(text) + len(html) + 600,
+            "payload": payload,
+        }
+
+    def received_labels(self, when_ms: int, category: str) -> List[str]:
+        age_days = (self.now_ms - when_ms) / 86400_000
+        labels = []
+        if age_days < 30 or self.rng.random() < 0.4:
+            labels.append("INBOX")
+        if self.rng.random() < (0.7 if age_days < 2 else 0.01):
+            labels.append("UNREAD")
+        if category != "CATEGORY_PROMOTIONS" and self.rng.random() < 0.1:
+            labels.append("IMPORTANT")
+        return labels + [category]
+
+    def attach(self, msg: Dict[str, Any], kind: str, language: str, when_ms: int) -> None:
+        subject, filename, lines = _DOCUMENTS[kind][language]
+        filename = self.fill(filename, when_ms)
+        if kind == "pdf":
+            data = make_pdf([self.fill(line, when_ms) for line in lines])
+        elif kind == "docx":
+            data = make_docx([self.fill(line, when_ms) for line in lines])
+        else:
+            rows = [lines] + [[item, self.rng.randint(100, 20000)] for item in self.rng.sample(_EXPENSES[language], 4)]
+            data = make_xlsx(rows)
+        self.service.add_attachment(msg, filename, _MIME[kind], data)
+
+    def newsletter(self, when_ms: int) -> Dict[str, Any]:
+        name, address, language, subjects, lines = self.rng.choice(_NEWSLETTERS)
+        subject = self.fill(self.rng.choice(subjects), when_ms)
+        picked = self.rng.sample(lines, min(3, len(lines)))
+        unsubscribe = "Avregistrera dig här" if language == "sv" else "Unsubscribe"
+        text = "\n\n".join(picked) + f"\n\n{unsubscribe}: https://{address.split('@')[1]}/unsubscribe"
+        html = (
+            "<html><body><table width=\"600\"><tr><td>"
+            + "".join(f"<h2 style=\"color:#333\">{line}</h2><p>{line}</p>" for line in picked)
+            + f"<p style=\"font-size:10px\"><a href=\"https://{address.split('@')[1]}/unsubscribe\">{unsubscribe}</a></p>"
+            "</td></tr></table></body></html>"
+        )
+        headers = {"List-Unsubscribe": f"<https://{address.split('@')[1]}/unsubscribe>", "Precedence": "bulk"}
+        return self.message(when_ms, (name, address), ME, subject, text, self.received_labels(when_ms, "CATEGORY_PROMOTIONS"), html=html, headers=headers)
+
+    def notification(self, when_ms: int) -> Dict[str, Any]:
+        name, address, language, category, subjects, lines = self.rng.choice(_NOTIFICATIONS)
+        subject = self.fill(self.rng.choice(subjects), when_ms)
+        text = "\n".join(self.fill(line, when_ms) for line in lines)
+        return self.message(when_ms, (name, address), ME, subject, text, self.received_labels(when_ms, category), headers={"Auto-Submitted": "auto-generated"})
+
+    def document(self, when_ms: int) -> Dict[str, Any]:
+        language = "sv" if self.rng.random() < 0.6 else "en"
+        kind = self.rng.choice(list(_DOCUMENTS))
+        sender = self.person(language)
+        subject = self.fill(_DOCUMENTS[kind][language][0], when_ms)
+        text = (
+            f"Hej,\n\nSe bifogad fil.\n\n{_SIGN_OFF['sv']}\n{sender[0]}" if language == "sv"
+            else f"Hi,\n\nPlease find the attached file.\n\n{_SIGN_OFF['en']}\n{sender[0]}"
+        )
+        msg = self.message(when_ms, sender, ME, subject, text, self.received_labels(when_ms, "CATEGORY_PERSONAL"))
+        self.attach(msg, kind, language, when_ms)
+        return msg
+
+    def conversation(self, start_ms: int, length: int, attachment_rate: float) -> List[Dict[str, Any]]:
+        """A thread of `length` messages alternating between a correspondent and us, replies quoting the previous one."""
+        language = "sv" if self.rng.random() < 0.6 else "en"
+        subject, opening = self.rng.choice(_CONVERSATIONS[language])
+        other = self.person(language)
+        me = self.owner
+        thread: List[Dict[str, Any]] = []
+        when_ms = start_ms
+        previous_text = ""
+        for position in range(length):
+            ours = position % 2 == 1
+            sender, to = (me, f"{other[0]} <{other[1]}>") if ours else (other, ME)
+            own = "\n".join(opening) if position == 0 else self.rng.choice(_REPLIES[language])
+            text = f"{own}\n\n{_SIGN_OFF[language]}\n{sender[0]}"
+            if previous_text:
+                date = formatdate(int(thread[-1]["internalDate"]) / 1000)
+                previous_sender = thread[-1]["payload"]["headers"][0]["value"]
+                intro = f"Den {date} skrev {previous_sender}:" if language == "sv" else f"On {date}, {previous_sender} wrote:"
+                text += "\n\n" + intro + "\n" + "\n".join(f"> {line}" for line in previous_text.splitlines())
+            title = subject if position == 0 else ("SV: " if language == "sv" else "Re: ") + subject
+            labels = ["SENT"] if ours else self.received_labels(when_ms, "CATEGORY_PERSONAL")
+            headers = {"In-Reply-To": thread[-1]["payload"]["headers"][4]["value"]} if thread else None
+            msg = self.message(when_ms, sender, to, title, text, labels, thread_id=thread[0]["id"] if thread else "", headers=headers)
+            if self.rng.random() < attachment_rate:
+                self.attach(msg, self.rng.choice(list(_DOCUMENTS)), language, when_ms)
+            thread.append(msg)
+            previous_text = f"{own}\n\n{_SIGN_OFF[language]}\n{sender[0]}"
+            when_ms += self.rng.randint(5, 600) * 60_000
+        return thread
+
+    def draft(self, reply_to: Dict[str, Any]) -> Dict[str, Any]:
+        headers = {h["name"]: h["value"] for h in reply_to["payload"]["headers"]}
+        subject = headers["Subject"].removeprefix("Re: ").removeprefix("SV: ")
+        language = "sv" if subject in _SV_SUBJECTS else "en"
+        text = f"{self.rng.choice(_REPLIES[language])}\n\n{_SIGN_OFF[language]}\n{self.owner[0]}"
+        when_ms = int(reply_to["internalDate"]) + self.rng.randint(1, 120) * 60_000
+        msg = self.message(
+            when_ms, self.owner, headers["From"], "Re: " + subject, text, ["DRAFT"],
+            thread_id=reply_to["threadId"], headers={"In-Reply-To": headers["Message-ID"]},
+        )
+        return msg
+
+
+def _thread_length(rng: random.Random, max_thread: int) -> int:
+    roll = rng.random()
+    if roll < 0.55:
+        return 1
+    if roll < 0.8:
+        return rng.randint(2, 3)
+    if roll < 0.93:
+        return rng.randint(4, 8)
+    if roll < 0.985:
+        return rng.randint(9, min(20, max_thread))
+    return rng.randint(min(21, max_thread), max_thread)
+
+
+def generate_mailbox(
+    messages: int = 1000,
+    drafts: int = 0,
+    max_thread: int = 40,
+    attachment_rate: float = 0.05,
+    days: int = 365,
+    seed: int = 0,
+    now_ms: Optional[int] = None,
+    **service_kwargs: Any,
+) -> FakeGmailService:
+    """
+    A FakeGmailService holding `messages` mails over the last `days` days (newest at
+    now_ms, default the current time) and `drafts` reply drafts in existing threads.
+    At least one thread per 5000 messages has exactly `max_thread` messages, with
+    attachments. service_kwargs go to FakeGmailService (latency, quota_per_second, ...).
+    """
+    rng = random.Random(seed)
+    now_ms = now_ms if now_ms is not None else int(datetime.now(timezone.utc).timestamp() * 1000)
+    service = FakeGmailService([], now_ms=now_ms, seed=seed, **service_kwargs)
+    builder = _Builder(service, rng, now_ms, days)
+    span_ms = days * 86400_000
+    long_threads = max(1, messages // 5000) if messages >= max_thread else 0
+    received: List[Dict[str, Any]] = []
+    while builder.count < messages:
+        remaining = messages - builder.count
+        # Threads start early enough that their last reply is still in the past.
+        start_ms = now_ms - int(rng.random() ** 1.5 * span_ms)
+        roll = rng.random()
+        if long_threads:
+            long_threads -= 1
+            batch = builder.conversation(now_ms - span_ms // 4, max_thread, max(attachment_rate, 0.25))
+        elif roll < 0.3:
+            batch = [builder.newsletter(start_ms)]
+        elif roll < 0.55:
+            batch = [builder.notification(start_ms)]
+        elif roll < 0.6:
+            batch = [builder.document(start_ms)]
+        else:
+            length = min(_thread_length(rng, max_thread), remaining)
+            batch = builder.conversation(start_ms - length * 5 * 3600_000, length, attachment_rate)
+        for msg in batch:
+            msg["internalDate"] = str(min(int(msg["internalDate"]), now_ms))
+            service.add_message(msg)
+            if "SENT" not in msg["labelIds"]:
+                received.append(msg)
+
+    conversations = [m for m in received if "CATEGORY_PERSONAL" in m["labelIds"]] or received
+    for msg in rng.sample(conversations, min(drafts, len(conversations))):
+        draft = builder.draft(msg)
+        service.add_message(draft)
+        service.drafts.append({"id": f"r{len(service.drafts) + 1}", "message": {"id": draft["id"], "threadId": draft["threadId"]}})
+    return service
+
+
+_SV_EVENTS = ["Tandläkare", "Föräldramöte", "Fotbollsträning", "Middag hos mormor", "Utvecklingssamtal", "Simskola", "Klippning", "Bilservice"]
+_EN_EVENTS = ["Team sync", "1:1 with manager", "Dentist", "Project review", "Lunch with James", "Flight to Berlin"]
+
+
+def generate_calendar(
+    events: int = 200,
+    days: int = 60,
+    seed: int = 0,
+    now_ms: Optional[int] = None,
+    **service_kwargs: Any,
+) -> FakeCalendarService:
+    """A FakeCalendarService with `events` events spread over `days` days around now (some all-day, some free)."""
+    rng = random.Random(seed)
+    now = datetime.fromtimestamp(now_ms / 1000, timezone.utc) if now_ms is not None else datetime.now(timezone.utc)
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    bodies = []
+    for _ in range(events):
+        day = today + timedelta(days=rng.randint(-days // 2, days // 2))
+        summary = rng.choice(_SV_EVENTS if rng.random() < 0.6 else _EN_EVENTS)
+        if rng.random() < 0.08:
+            bodies.append({"summary": summary, "start": {"date": day.date().isoformat()}, "end": {"date": (day + timedelta(days=1)).date().isoformat()}, "transparency": "transparent"})
+            continue
+        # Europe/Stockholm office hours and evenings, in UTC.
+        start = day + timedelta(hours=rng.randint(6, 18), minutes=rng.choice([0, 15, 30, 45]))
+        end = start + timedelta(minutes=rng.choice([30, 45, 60, 90, 120]))
+        bodies.append({
+            "summary": summary,
+            "description": rng.choice(["", "Ta med papper.", "Zoom-länk i kallelsen.", "Bring the slides."]),
+            "start": {"dateTime": start.isoformat(), "timeZone": "Europe/Stockholm"},
+            "end": {"dateTime": end.isoformat(), "timeZone": "Europe/Stockholm"},
+        })
+    return FakeCalendarService(bodies, seed=seed, **service_kwargs)
+
+
+_services: Dict[Tuple[str, str], Any] = {}
+_services_lock = threading.Lock()
+
+
+def get_fake_service(api: str, profile: str = "default") -> Any:
+    """The fake Gmail or Calendar service of a profile, generated from the FAKE_* settings on first use."""
+    with _services_lock:
+        service = _services.get((api, profile))
+        if service is None:
+            seed = FAKE_SEED + zlib.crc32(profile.encode("utf-8"))
+            options = {"latency": FAKE_LATENCY_MS / 1000, "quota_per_second": FAKE_QUOTA_PER_SECOND, "error_rate": FAKE_ERROR_RATE}
+            if api == "gmail":
+                print(f"🧪 Genererar testbrevlåda för '{profile}' ({FAKE_MAILBOX_MESSAGES} mail, {FAKE_MAILBOX_DRAFTS} utkast)...")
+                service = generate_mailbox(FAKE_MAILBOX_MESSAGES, FAKE_MAILBOX_DRAFTS, seed=seed, **options)
+            elif api == "calendar":
+                service = generate_calendar(FAKE_CALENDAR_EVENTS, seed=seed, **options)
+            else:
+                raise ValueError(f"No fake backend for the {api} API")
+            _services[(api, profile)] = service
+        return service
+
+
+def set_fake_service(api: str, profile: str, service: Any) -> None:
+    """Use a prebuilt fake service for a profile (benchmarks with their own mailbox sizes)."""
+    with _services_lock:
+        _services[(api, profile)] = service
+
+
+def reset_fake_services() -> None:
+    with _services_lock:
+        _services.clear()
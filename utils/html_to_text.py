@@ -0,0 +1,169 @@
+import re
+from html.parser import HTMLParser
+from typing import List
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# HTML -> plain text for HTML-only mail (newsletters, school platforms).
+#
+# A single streaming pass with the stdlib parser: invisible content (scripts,
+# styles, head, hidden blocks, tracking pixels) is dropped, block elements become
+# line breaks and links keep their target as a compact "text (url)".
+
+_SKIP_TAGS = {"script", "style", "head", "title", "noscript", "template", "svg", "object"}
+_BLOCK_TAGS = {
+    "p", "div", "section", "article", "header", "footer", "main", "aside", "nav",
+    "h1", "h2", "h3", "h4", "h5", "h6", "table", "tr", "ul", "ol", "blockquote",
+    "pre", "hr", "form", "center", "address", "dl", "dt", "dd", "figure",
+}
+_VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+_HIDDEN_STYLE_RE = re.compile(r"display\s*:\s*none|visibility\s*:\s*hidden|max-height\s*:\s*0", re.IGNORECASE)
+_TRACKING_PARAM_RE = re.compile(r"^(utm_|mc_|_hs|hsa_|fbclid$|gclid$|mkt_tok$|trk|ref_?src$)", re.IGNORECASE)
+_MAX_URL_CHARS = 120
+
+
+def _compact_url(url: str) -> str:
+    """Drop tracking parameters; shorten what is still very long to host + path."""
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url[:_MAX_URL_CHARS]
+    if parts.scheme not in ("http", "https"):
+        return url if parts.scheme != "mailto" else url[len("mailto:"):]
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not _TRACKING_PARAM_RE.match(k)])
+    url = urlunsplit((parts.scheme, parts.netloc, parts.path, query, ""))
+    if len(url) > _MAX_URL_CHARS:
+        url = urlunsplit((parts.scheme, parts.netloc, parts.path, "", ""))
+        if len(url) > _MAX_URL_CHARS:
+            url = url[:_MAX_URL_CHARS]
+        url += "…"
+    return url
+
+
+def _is_tracking_pixel(attrs: dict) -> bool:
+    def tiny(value) -> bool:
+        return value is not None and value.strip().rstrip("px") in ("0", "1")
+
+    return tiny(attrs.get("width")) or tiny(attrs.get("height"))
+
+
+# Elements whose end tag is optional: a start tag from the set closes them.
+_IMPLICIT_CLOSE = {
+    "p": _BLOCK_TAGS | {"li"},
+    "li": {"li"},
+    "dt": {"dt", "dd"},
+    "dd": {"dt", "dd"},
+    "tr": {"tr"},
+    "td": {"td", "th", "tr"},
+    "th": {"td", "th", "tr"},
+    "option": {"option"},
+}
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self, skip_hidden: bool = True):
+        super().__init__(convert_charrefs=True)
+        self.skip_hidden = skip_hidden
+        self.out: List[str] = []
+        # Open elements; a hidden element is skipped until it (or anything enclosing it) closes,
+        # including implicit closes like "<p>...<p>", which never produce an end tag.
+        self._stack: List[str] = []
+        self._skip_at = None
+        self._link_href = None
+        self._link_text_start = 0
+
+    def _newline(self, count: int = 1) -> None:
+        self.out.append("\n" * count)
+
+    def _pop_to(self, depth: int) -> None:
+        del self._stack[depth:]
+        if self._skip_at is not None and depth <= self._skip_at:
+            self._skip_at = None
+
+    def handle_starttag(self, tag, attrs):
+        if self._stack and tag in _IMPLICIT_CLOSE.get(self._stack[-1], ()):
+            self._pop_to(len(self._stack) - 1)
+        if tag not in _VOID_TAGS:
+            self._stack.append(tag)
+        if self._skip_at is not None:
+            return
+        attrs = dict(attrs)
+        if tag in _SKIP_TAGS or (
+            self.skip_hidden
+            and tag not in _VOID_TAGS
+            and ("hidden" in attrs or _HIDDEN_STYLE_RE.search(attrs.get("style") or ""))
+        ):
+            self._skip_at = len(self._stack) - 1
+            return
+
+        if tag == "br":
+            self._newline()
+        elif tag == "li":
+            self.out.append("\n- ")
+        elif tag in ("td", "th"):
+            self.out.append(" ")
+        elif tag in _BLOCK_TAGS:
+            self._newline(2 if tag in ("p", "h1", "h2", "h3", "table") else 1)
+        elif tag == "a":
+            self._link_href = attrs.get("href")
+            self._link_text_start = len(self.out)
+        elif tag == "img":
+            alt = (attrs.get("alt") or "").strip()
+            if alt and not _is_tracking_pixel(attrs):
+                self.out.append(f"[{alt}]")
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag not in self._stack:
+            # Stray end tag (or one of a void element): nothing to close.
+            return
+        depth = len(self._stack) - 1 - self._stack[::-1].index(tag)
+        closes_hidden = self._skip_at is not None and depth == self._skip_at
+        self._pop_to(depth)
+        if self._skip_at is not None or closes_hidden:
+            return
+
+        if tag == "a" and self._link_href is not None:
+            href, self._link_href = self._link_href, None
+            if href.startswith("#") or href.lower().startswith("javascript:"):
+                return
+            label = "".join(self.out[self._link_text_start:]).strip()
+            url = _compact_url(href)
+            if url and url.rstrip("…/") not in label:
+                self.out.append(f" ({url})" if label else url)
+        elif tag in _BLOCK_TAGS:
+            self._newline()
+
+    def handle_data(self, data):
+        if self._skip_at is None:
+            self.out.append(data)
+
+
+def _extract(html: str, skip_hidden: bool) -> str:
+    parser = _TextExtractor(skip_hidden=skip_hidden)
+    parser.feed(html)
+    parser.close()
+    return "".join(parser.out)
+
+
+def html_to_text(html: str) -> str:
+    """
+    Readable plain text from an HTML mail body (invisible content and tracking removed).
+    If nothing visible is left, the text is extracted again without the hidden-block filter.
+    """
+    if not html:
+        return ""
+    text = _extract(html, skip_hidden=True)
+    if not text.strip():
+        # Everything was in "hidden" blocks (or the markup fooled the filter): keep the content anyway.
+        text = _extract(html, skip_hidden=False)
+    text = text.replace("\xa0", " ")
+    # Zero-width characters and soft hyphens pad newsletter preheaders.
+    text = re.sub("[\u200b\u200c\u200d\u2060\ufeff\xad]", "", text)
+    text = re.sub(r"[ \t\r\f\v]+", " ", text)
+    text = re.sub(r" ?\n ?", "\n", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
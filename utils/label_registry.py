@@ -0,0 +1,125 @@
+import json
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+from googleapiclient.errors import HttpError
+
+from config import BASE_DIR
+
+LABEL_REGISTRY_FILE = BASE_DIR / "label_registry.json"
+
+# Set on every triaged mail (by run_triage, in bulk) so it is never picked up again.
+PROCESSED_LABEL = "AI_Processed"
+
+# Labels the triage run applies; pre-resolved at watchdog startup.
+PREWARM_LABELS = [PROCESSED_LABEL]
+
+# Process-wide label name -> id registry, persisted per profile so a fresh
+# GmailToolset (one per agent build and delegation) resolves labels without a
+# labels.list call. Ids that stop working (label deleted or renamed) are dropped
+# via invalidate() and resolved again from a fresh labels.list. Creation is
+# serialized per (profile, name), so concurrent sessions never race to create
+# the same label; a 409 from another process is resolved from labels.list.
+
+
+class LabelRegistry:
+    """Label name <-> id per profile, backed by a JSON file."""
+
+    def __init__(self, path=LABEL_REGISTRY_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._labels: Dict[str, Dict[str, str]] = {}  # profile -> name -> id
+        self._create_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if self.path.exists():
+            try:
+                self._labels = json.loads(self.path.read_text(encoding="utf-8"))
+            except Exception:
+                self._labels = {}
+
+    def _save(self) -> None:
+        self.path.write_text(json.dumps(self._labels, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    def lookup(self, profile: str, name: str) -> Optional[str]:
+        with self._lock:
+            return self._labels.get(profile, {}).get(name)
+
+    def refresh(self, service, profile: str) -> Dict[str, str]:
+        """Reload all labels of the profile (one labels.list). Returns name -> id."""
+        labels = service.users().labels().list(userId="me").execute().get("labels", [])
+        names = {lbl["name"]: lbl["id"] for lbl in labels}
+        with self._lock:
+            self._labels[profile] = names
+            self._save()
+        return dict(names)
+
+    def names_by_id(self, service, profile: str) -> Dict[str, str]:
+        """Fresh id -> name map (e.g. for mirroring label names locally)."""
+        return {label_id: name for name, label_id in self.refresh(service, profile).items()}
+
+    def ensure(self, service, profile: str, name: str) -> str:
+        """Label id for name, creating the label if it doesn't exist. No network call when known."""
+        label_id = self.lookup(profile, name)
+        if label_id:
+            return label_id
+
+        with self._lock:
+            create_lock = self._create_locks.setdefault((profile, name), threading.Lock())
+        with create_lock:
+            # Another session may have resolved or created it while we waited.
+            label_id = self.lookup(profile, name) or self.refresh(service, profile).get(name)
+            if label_id:
+                return label_id
+
+            body = {
+                "labelListVisibility": "labelShow",
+                "messageListVisibility": "show",
+                "name": name,
+            }
+            try:
+                created = service.users().labels().create(userId="me", body=body).execute()
+            except HttpError as e:
+                # "Label name exists": created elsewhere (another process) in the meantime.
+                if e.resp.status != 409:
+                    raise
+                label_id = self.refresh(service, profile).get(name)
+                if not label_id:
+                    raise
+                return label_id
+            with self._lock:
+                self._labels.setdefault(profile, {})[name] = created["id"]
+                self._save()
+            return created["id"]
+
+    def invalidate(self, profile: str, name: str) -> None:
+        """Forget a label id that the API no longer accepts."""
+        with self._lock:
+            if self._labels.get(profile, {}).pop(name, None) is not None:
+                self._save()
+
+    def prewarm(self, profiles: Iterable[str], names: Iterable[str] = PREWARM_LABELS) -> None:
+        """Resolve (and create if needed) the given labels for each profile up front."""
+        from auth.google_auth import get_gmail_service
+
+        for profile in profiles:
+            try:
+                service = get_gmail_service(profile=profile)
+                for name in names:
+                    self.ensure(service, profile, name)
+            except Exception as e:
+                print(f"⚠️ Kunde inte förvärma etiketter för '{profile}': {e}")
+
+
+_registry: Optional[LabelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_label_registry() -> LabelRegistry:
+    """Return the process-wide label registry."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = LabelRegistry()
+        return _registry
@@ -0,0 +1,173 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from googleapiclient.errors import HttpError
+
+from auth.google_auth import get_gmail_service
+from config import BASE_DIR, TRIAGE_MAX_ATTEMPTS, UNREAD_TRIAGE_QUERY
+
+SYNC_STATE_FILE = BASE_DIR / "sync_state.json"
+
+# Messages carrying any of these labels are never triage candidates.
+_SKIP_LABELS = {"DRAFT", "SENT", "SPAM", "TRASH"}
+
+# How many recently returned ids we remember to avoid handing out duplicates
+# (a message can show up both in the seed scan and in the next history delta).
+_RECENT_IDS_LIMIT = 500
+
+
+def list_history(service, start_history_id: str, history_types: Optional[List[str]] = None, label_id: Optional[str] = None) -> Tuple[List[dict], str]:
+    """
+    Page through users.history.list from start_history_id.
+    Returns (history records, latest historyId). Raises HttpError 404 if the
+    start id is too old for Gmail to answer (it keeps roughly a week).
+    """
+    records: List[dict] = []
+    latest = start_history_id
+    page_token = None
+    while True:
+        kwargs: Dict[str, Any] = {"userId": "me", "startHistoryId": start_history_id}
+        if history_types:
+            kwargs["historyTypes"] = history_types
+        if label_id:
+            kwargs["labelId"] = label_id
+        if page_token:
+            kwargs["pageToken"] = page_token
+        resp = service.users().history().list(**kwargs).execute() or {}
+        records.extend(resp.get("history", []))
+        latest = resp.get("historyId", latest)
+        page_token = resp.get("nextPageToken")
+        if not page_token:
+            return records, latest
+
+
+class MailboxSync:
+    """
+    Incremental new-mail detection per profile via the Gmail history API.
+    Stores the last seen historyId per profile, so an idle poll is a single
+    history.list call instead of a full search over the triage window.
+
+    Every id a poll hands out stays in the persisted "pending" list until ack()
+    confirms it was triaged, so mail survives a crash or kill mid-run: the next
+    process returns it again. Within one process an id is handed out once until
+    it is acked or requeued. Failed triage attempts are counted per id; after
+    TRIAGE_MAX_ATTEMPTS the id moves to the "dead_letter" list and is not
+    returned again.
+    """
+
+    def __init__(self):
+        self._load_state()
+        self._in_flight: Dict[str, set] = {}
+
+    def _load_state(self):
+        if SYNC_STATE_FILE.exists():
+            try:
+                self.state = json.loads(SYNC_STATE_FILE.read_text(encoding="utf-8"))
+            except Exception:
+                self.state = {}
+        else:
+            self.state = {}
+
+    def _save_state(self):
+        SYNC_STATE_FILE.write_text(json.dumps(self.state), encoding="utf-8")
+
+    def _profile_state(self, profile: str) -> Dict[str, Any]:
+        pstate = self.state.setdefault(profile, {"history_id": None, "pending": [], "recent": []})
+        pstate.setdefault("attempts", {})
+        pstate.setdefault("dead_letter", [])
+        return pstate
+
+    def poll(self, profile: str = "default") -> List[str]:
+        """Return ids of unread messages that arrived since the last poll (plus unacked and requeued ones)."""
+        service = get_gmail_service(profile=profile)
+        pstate = self._profile_state(profile)
+
+        if not pstate.get("history_id"):
+            new_ids = self._seed(service, pstate)
+        else:
+            try:
+                new_ids = self._delta(service, pstate)
+            except HttpError as e:
+                if e.resp.status != 404:
+                    raise
+                print(f"⚠️ historyId för '{profile}' har gått ut, gör om full skanning.")
+                new_ids = self._seed(service, pstate)
+
+        recent = set(pstate["recent"])
+        fresh = [i for i in new_ids if i not in recent]
+        pstate["pending"] = list(dict.fromkeys(pstate["pending"] + fresh))
+        pstate["recent"] = (pstate["recent"] + fresh)[-_RECENT_IDS_LIMIT:]
+        # Saved before the ids are handed out: the history cursor only moves together with them.
+        self._save_state()
+        in_flight = self._in_flight.setdefault(profile, set())
+        result = [i for i in pstate["pending"] if i not in in_flight]
+        in_flight.update(result)
+        return result
+
+    def ack(self, profile: str, message_ids: List[str]) -> None:
+        """Confirm message ids as triaged; they are never returned again."""
+        done = set(message_ids)
+        pstate = self._profile_state(profile)
+        pstate["pending"] = [i for i in pstate["pending"] if i not in done]
+        for message_id in done:
+            pstate["attempts"].pop(message_id, None)
+        self._in_flight.get(profile, set()).difference_update(done)
+        self._save_state()
+
+    def requeue(self, profile: str, message_ids: List[str], attempted: bool = True) -> None:
+        """
+        Hand message ids back so the next poll returns them again. attempted=True
+        (a failed triage) counts an attempt; ids out of attempts go to the dead-letter list.
+        """
+        pstate = self._profile_state(profile)
+        retry = list(message_ids)
+        if attempted:
+            attempts = pstate["attempts"]
+            dead = []
+            for message_id in message_ids:
+                attempts[message_id] = attempts.get(message_id, 0) + 1
+                if attempts[message_id] >= TRIAGE_MAX_ATTEMPTS:
+                    dead.append(message_id)
+            if dead:
+                print(
+                    f"☠️ {len(dead)} mail misslyckades {TRIAGE_MAX_ATTEMPTS} gånger och lämnas omärkta "
+                    f"(dead_letter i {SYNC_STATE_FILE.name}): {', '.join(dead)}"
+                )
+                dead_ids = set(dead)
+                retry = [i for i in retry if i not in dead_ids]
+                pstate["pending"] = [i for i in pstate["pending"] if i not in dead_ids]
+                pstate["dead_letter"] = list(dict.fromkeys(pstate["dead_letter"] + dead))[-_RECENT_IDS_LIMIT:]
+                for message_id in dead:
+                    attempts.pop(message_id, None)
+        pstate["pending"] = list(dict.fromkeys(pstate["pending"] + retry))
+        self._in_flight.get(profile, set()).difference_update(message_ids)
+        self._save_state()
+
+    def is_retry(self, profile: str, message_id: str) -> bool:
+        """True if an earlier triage of the message failed (it is not new mail)."""
+        return message_id in self._profile_state(profile)["attempts"]
+
+    def _seed(self, service, pstate: Dict[str, Any]) -> List[str]:
+        # Read the historyId BEFORE listing, so nothing arriving in between is missed.
+        history_id = service.users().getProfile(userId="me").execute()["historyId"]
+        resp = (
+            service.users()
+            .messages()
+            .list(userId="me", q=UNREAD_TRIAGE_QUERY, maxResults=500)
+            .execute()
+            or {}
+        )
+        pstate["history_id"] = history_id
+        return [ref["id"] for ref in resp.get("messages", [])]
+
+    def _delta(self, service, pstate: Dict[str, Any]) -> List[str]:
+        records, latest = list_history(service, pstate["history_id"], history_types=["messageAdded"])
+        pstate["history_id"] = latest
+        new_ids: List[str] = []
+        for record in records:
+            for added in record.get("messagesAdded", []):
+                msg = added.get("message", {})
+                labels = set(msg.get("labelIds", []))
+                if "UNREAD" in labels and not labels & _SKIP_LABELS:
+                    new_ids.append(msg["id"])
+        return new_ids
@@ -0,0 +1,464 @@
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from googleapiclient.errors import HttpError
+
+from config import MESSAGE_STORE_DIR, MESSAGE_STORE_REFRESH_SECONDS
+
+# Local mirror of message metadata (and optionally decoded bodies) per profile.
+# gmail_search answers common queries from here in milliseconds and only falls
+# back to the API for Gmail syntax that translate_query() does not understand.
+#
+# The table key (sort_key) is derived from internalDate, so "newest first" is a
+# plain descending rowid scan for both the table and the FTS index; SQLite can
+# stop after `limit` hits instead of sorting every match.
+#
+# Derived indexes (utils/subject_index.py) follow the store through subject_log:
+# triggers append a row with an ever-increasing seq whenever a message is
+# inserted, deleted or gets a new subject/sender, whatever its internalDate.
+# Only the latest entry per message is kept.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    sort_key INTEGER PRIMARY KEY,
+    id TEXT UNIQUE NOT NULL,
+    thread_id TEXT,
+    from_addr TEXT,
+    to_addr TEXT,
+    subject TEXT,
+    date TEXT,
+    internal_date INTEGER,
+    snippet TEXT,
+    body TEXT,
+    labels TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    from_addr, to_addr, subject, snippet, body,
+    content='messages', content_rowid='sort_key',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, from_addr, to_addr, subject, snippet, body)
+    VALUES (new.sort_key, new.from_addr, new.to_addr, new.subject, new.snippet, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, from_addr, to_addr, subject, snippet, body)
+    VALUES ('delete', old.sort_key, old.from_addr, old.to_addr, old.subject, old.snippet, old.body);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_au AFTER UPDATE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, from_addr, to_addr, subject, snippet, body)
+    VALUES ('delete', old.sort_key, old.from_addr, old.to_addr, old.subject, old.snippet, old.body);
+    INSERT INTO messages_fts(rowid, from_addr, to_addr, subject, snippet, body)
+    VALUES (new.sort_key, new.from_addr, new.to_addr, new.subject, new.snippet, new.body);
+END;
+CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS subject_log (seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS subject_log_id ON subject_log(id);
+CREATE TRIGGER IF NOT EXISTS subject_log_ai AFTER INSERT ON messages BEGIN
+    DELETE FROM subject_log WHERE id = new.id;
+    INSERT INTO subject_log(id) VALUES (new.id);
+END;
+CREATE TRIGGER IF NOT EXISTS subject_log_au AFTER UPDATE OF subject, from_addr ON messages
+WHEN old.subject IS NOT new.subject OR old.from_addr IS NOT new.from_addr BEGIN
+    DELETE FROM subject_log WHERE id = new.id;
+    INSERT INTO subject_log(id) VALUES (new.id);
+END;
+CREATE TRIGGER IF NOT EXISTS subject_log_ad AFTER DELETE ON messages BEGIN
+    DELETE FROM subject_log WHERE id = old.id;
+    INSERT INTO subject_log(id) VALUES (old.id);
+END;
+"""
+
+_UPSERT_SQL = """
+INSERT INTO messages(sort_key, id, thread_id, from_addr, to_addr, subject, date, internal_date, snippet, body, labels)
+VALUES (:sort_key, :id, :thread_id, :from_addr, :to_addr, :subject, :date, :internal_date, :snippet, :body, :labels)
+ON CONFLICT(id) DO UPDATE SET
+    thread_id = excluded.thread_id, from_addr = excluded.from_addr, to_addr = excluded.to_addr,
+    subject = excluded.subject, date = excluded.date, snippet = excluded.snippet,
+    body = COALESCE(excluded.body, messages.body), labels = excluded.labels
+"""
+
+_QUERY_TOKEN = re.compile(r'(-?)(?:(\w+):)?("[^"]*"|\S+)')
+_FTS_COLUMNS = {"from": "from_addr", "to": "to_addr", "subject": "subject"}
+_RELATIVE_UNITS = {"d": 1, "m": 30, "y": 365}
+
+
+def _fts_term(value: str) -> str:
+    value = value.strip('"').replace('"', '""')
+    return f'"{value}"*'
+
+
+def _label_key(name: str) -> str:
+    # Gmail matches labels case-insensitively and treats spaces as dashes.
+    return name.strip('"').lower().replace(" ", "-")
+
+
+def _parse_date(value: str) -> Optional[datetime]:
+    for fmt in ("%Y/%m/%d", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt).replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+    return None
+
+
+def _sort_key(internal_date: int, message_id: str) -> int:
+    # ms timestamp * 1000 plus three digits from the id to separate same-ms messages.
+    try:
+        suffix = int(message_id[-4:], 16) % 1000
+    except ValueError:
+        suffix = sum(map(ord, message_id)) % 1000
+    return internal_date * 1000 + suffix
+
+
+def translate_query(query: str, now: Optional[datetime] = None) -> Optional[Tuple[Optional[str], List[str], List[Any]]]:
+    """
+    Translate a Gmail search query into (FTS5 match expression, SQL clauses, params).
+    Supports free text, quoted phrases, from:/to:/subject:, label:/-label:,
+    newer_than:/older_than: and after:/before:. Returns None for anything else
+    (OR, grouping, has:, in:, ...) so the caller can fall back to the API.
+    Clauses reference the sort key as {key} and the message row as m.
+    """
+    if any(ch in query for ch in "(){}") or re.search(r"\bOR\b|\bAND\b", query):
+        return None
+
+    now = now or datetime.now(timezone.utc)
+    fts_terms: List[str] = []
+    clauses: List[str] = []
+    params: List[Any] = []
+
+    for negated, op, value in _QUERY_TOKEN.findall(query):
+        op = op.lower()
+        if not op:
+            if negated:
+                return None
+            fts_terms.append(_fts_term(value))
+        elif op in _FTS_COLUMNS and not negated:
+            fts_terms.append(f"{_FTS_COLUMNS[op]} : {_fts_term(value)}")
+        elif op == "label":
+            clauses.append(f"m.labels {'NOT ' if negated else ''}LIKE ?")
+            params.append(f"% {_label_key(value)} %")
+        elif op in ("newer_than", "older_than") and not negated:
+            match = re.fullmatch(r"(\d+)([dmy])", value.lower())
+            if not match:
+                return None
+            cutoff = now - timedelta(days=int(match.group(1)) * _RELATIVE_UNITS[match.group(2)])
+            clauses.append("{key} >= ?" if op == "newer_than" else "{key} < ?")
+            params.append(int(cutoff.timestamp() * 1000) * 1000)
+        elif op in ("after", "before") and not negated:
+            parsed = _parse_date(value)
+            if not parsed:
+                return None
+            clauses.append("{key} >= ?" if op == "after" else "{key} < ?")
+            params.append(int(parsed.timestamp() * 1000) * 1000)
+        else:
+            return None
+
+    return (" AND ".join(fts_terms) or None), clauses, params
+
+
+class MessageStore:
+    """SQLite + FTS5 mirror of one Gmail profile."""
+
+    def __init__(self, profile: str, path=None):
+        self.profile = profile
+        self.path = path or (MESSAGE_STORE_DIR / f"{profile}.sqlite")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        with self._conn:
+            # Stores created before subject_log existed: log every message once.
+            if self._conn.execute("SELECT NOT EXISTS (SELECT 1 FROM subject_log)").fetchone()[0]:
+                self._conn.execute("INSERT INTO subject_log(id) SELECT id FROM messages ORDER BY sort_key")
+        self._last_refresh = 0.0
+
+    # --- State -----------------------------------------------------------
+
+    def _get_state(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key: str, value: str) -> None:
+        self._conn.execute(
+            "INSERT INTO sync_state(key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+    def is_ready(self) -> bool:
+        """True once a full sync has completed."""
+        with self._lock:
+            return self._get_state("history_id") is not None
+
+    @property
+    def has_bodies(self) -> bool:
+        with self._lock:
+            return self._get_state("with_bodies") == "1"
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    # --- Writes ----------------------------------------------------------
+
+    def upsert_many(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Insert or update message rows (see _row_from_message for the shape)."""
+        rows = [dict(r, sort_key=_sort_key(r["internal_date"], r["id"])) for r in rows]
+        with self._lock, self._conn:
+            try:
+                self._conn.executemany(_UPSERT_SQL, rows)
+            except sqlite3.IntegrityError:
+                # Two messages in the same millisecond with colliding suffixes:
+                # redo row by row, bumping the key until it is free.
+                for row in rows:
+                    while True:
+                        try:
+                            self._conn.execute(_UPSERT_SQL, row)
+                            break
+                        except sqlite3.IntegrityError:
+                            row["sort_key"] += 1
+        return len(rows)
+
+    def delete_many(self, message_ids: Iterable[str]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM messages WHERE id = ?", [(i,) for i in message_ids])
+
+    # --- Reads -----------------------------------------------------------
+
+    def search(self, query: str, limit: int = 5) -> Optional[List[Dict[str, Any]]]:
+        """Answer a Gmail query locally, newest first. None if the syntax is unsupported."""
+        translated = translate_query(query)
+        if translated is None:
+            return None
+        match, clauses, params = translated
+        columns = "m.id, m.thread_id, m.from_addr, m.to_addr, m.subject, m.date, m.snippet"
+        if match:
+            key = "messages_fts.rowid"
+            where = " AND ".join(["messages_fts MATCH ?"] + clauses)
+            params = [match] + params
+            source = "messages_fts JOIN messages m ON m.sort_key = messages_fts.rowid"
+        else:
+            key = "m.sort_key"
+            where = " AND ".join(clauses) or "1=1"
+            source = "messages m"
+        sql = f"SELECT {columns} FROM {source} WHERE {where.format(key=key)} ORDER BY {key} DESC LIMIT ?"
+        try:
+            with self._lock:
+                rows = self._conn.execute(sql, params + [limit]).fetchall()
+        except sqlite3.OperationalError as e:
+            # FTS5 rejects some inputs (e.g. lone operators); let the API handle those.
+            print(f"⚠️ Local search failed for '{query}': {e}")
+            return None
+        return [
+            {
+                "message_id": r[0],
+                "thread_id": r[1],
+                "from": r[2],
+                "to": r[3],
+                "subject": r[4],
+                "date": r[5],
+                "snippet": r[6],
+            }
+            for r in rows
+        ]
+
+    def get_many(self, message_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Stored rows by id (ids not in the store are left out)."""
+        if not message_ids:
+            return {}
+        placeholders = ",".join("?" * len(message_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, thread_id, from_addr, to_addr, subject, date, internal_date, snippet, labels "
+                f"FROM messages WHERE id IN ({placeholders})",
+                list(message_ids),
+            ).fetchall()
+        keys = ("id", "thread_id", "from_addr", "to_addr", "subject", "date", "internal_date", "snippet", "labels")
+        return {r[0]: dict(zip(keys, r)) for r in rows}
+
+    def last_subject_seq(self) -> int:
+        """Highest subject_log seq ever handed out (0 for a new store)."""
+        with self._lock:
+            row = self._conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'subject_log'").fetchone()
+        return row[0] if row else 0
+
+    def iter_subject_changes(
+        self, after_seq: int = 0, batch: int = 5000
+    ) -> Iterable[List[Tuple[int, str, bool, Optional[str], Optional[str]]]]:
+        """
+        (seq, id, exists, from_addr, subject) for messages added, changed or deleted after
+        after_seq, in seq order and in batches. Deleted messages have exists=False.
+        """
+        last = after_seq
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT l.seq, l.id, m.id IS NOT NULL, m.from_addr, m.subject "
+                    "FROM subject_log l LEFT JOIN messages m ON m.id = l.id "
+                    "WHERE l.seq > ? ORDER BY l.seq LIMIT ?",
+                    (last, batch),
+                ).fetchall()
+            if not rows:
+                return
+            yield rows
+            last = rows[-1][0]
+
+    # --- Sync ------------------------------------------------------------
+
+    def _label_names(self, service) -> Dict[str, str]:
+        from utils.label_registry import get_label_registry
+
+        return get_label_registry().names_by_id(service, self.profile)
+
+    def _row_from_message(self, msg: dict, label_names: Dict[str, str], with_bodies: bool) -> Dict[str, Any]:
+        from tools.gmail_tools import _decode_body, _headers_map
+
+        headers = _headers_map(msg.get("payload", {}).get("headers", []))
+        labels = [_label_key(label_names.get(i, i)) for i in msg.get("labelIds", [])]
+        body = None
+        if with_bodies:
+            body = _decode_body(msg.get("payload", {})).get("text", "")
+        return {
+            "id": msg["id"],
+            "thread_id": msg.get("threadId"),
+            "from_addr": headers.get("From", ""),
+            "to_addr": headers.get("To", ""),
+            "subject": headers.get("Subject", ""),
+            "date": headers.get("Date", ""),
+            "internal_date": int(msg.get("internalDate") or 0),
+            "snippet": msg.get("snippet", ""),
+            "body": body,
+            "labels": f" {' '.join(labels)} ",
+        }
+
+    def _fetch_rows(self, service, message_ids: List[str], label_names: Dict[str, str], with_bodies: bool) -> List[Dict[str, Any]]:
+        from tools.gmail_tools import LIST_METADATA_HEADERS, _batch_get_messages
+
+        if with_bodies:
+            msgs = _batch_get_messages(service, message_ids, format="full")
+        else:
+            msgs = _batch_get_messages(service, message_ids, metadata_headers=LIST_METADATA_HEADERS)
+        return [self._row_from_message(m, label_names, with_bodies) for m in msgs]
+
+    def full_sync(self, service, with_bodies: bool = True, page_size: int = 500) -> int:
+        """
+        Mirror the whole mailbox. Slow on big mailboxes; run once via sync_message_store.py.
+        Rows of messages the listing no longer returns (deleted in Gmail) are removed.
+        """
+        # Read the historyId first so changes made during the scan are replayed by refresh().
+        history_id = service.users().getProfile(userId="me").execute()["historyId"]
+        label_names = self._label_names(service)
+
+        synced = 0
+        seen = set()
+        page_token = None
+        while True:
+            resp = (
+                service.users()
+                .messages()
+                .list(userId="me", maxResults=page_size, pageToken=page_token)
+                .execute()
+                or {}
+            )
+            ids = [ref["id"] for ref in resp.get("messages", [])]
+            seen.update(ids)
+            synced += self.upsert_many(self._fetch_rows(service, ids, label_names, with_bodies))
+            print(f"  [{self.profile}] {synced} meddelanden synkade...")
+            page_token = resp.get("nextPageToken")
+            if not page_token:
+                break
+
+        # Anything added after the scan started is replayed by the next refresh().
+        with self._lock:
+            stored = [row[0] for row in self._conn.execute("SELECT id FROM messages")]
+        gone = [message_id for message_id in stored if message_id not in seen]
+        if gone:
+            self.delete_many(gone)
+            print(f"  [{self.profile}] {len(gone)} borttagna meddelanden rensade.")
+
+        with self._lock, self._conn:
+            self._set_state("history_id", str(history_id))
+            self._set_state("with_bodies", "1" if with_bodies else "0")
+        self._last_refresh = time.monotonic()
+        return synced
+
+    def refresh(self, service, rebuild: bool = False) -> int:
+        """
+        Apply mailbox changes since the last sync via the history API. Returns changed count.
+        If the stored history id has expired, a full sync is only run with rebuild=True
+        (sync_message_store.py); otherwise the store is marked not ready, so searches
+        use the API until it is rebuilt.
+        """
+        from utils.mailbox_sync import list_history
+
+        with self._lock:
+            history_id = self._get_state("history_id")
+            with_bodies = self._get_state("with_bodies") == "1"
+        if history_id is None:
+            return 0
+
+        try:
+            records, latest = list_history(service, history_id)
+        except HttpError as e:
+            if e.resp.status != 404:
+                raise
+            if rebuild:
+                print(f"⚠️ Message store för '{self.profile}' är för gammal, gör full synk.")
+                return self.full_sync(service, with_bodies=with_bodies)
+            # A full sync takes minutes on a large mailbox: never inside an agent's tool call.
+            print(
+                f"⚠️ Message store för '{self.profile}' är för gammal; sökningar går mot API:t "
+                "tills `python sync_message_store.py` har byggt om det."
+            )
+            with self._lock, self._conn:
+                self._conn.execute("DELETE FROM sync_state WHERE key = 'history_id'")
+            return 0
+
+        changed: Dict[str, None] = {}
+        deleted: Dict[str, None] = {}
+        for record in records:
+            for key in ("messagesAdded", "labelsAdded", "labelsRemoved"):
+                for entry in record.get(key, []):
+                    changed[entry["message"]["id"]] = None
+            for entry in record.get("messagesDeleted", []):
+                deleted[entry["message"]["id"]] = None
+
+        if changed:
+            ids = [i for i in changed if i not in deleted]
+            self.upsert_many(self._fetch_rows(service, ids, self._label_names(service), with_bodies))
+        if deleted:
+            self.delete_many(deleted)
+
+        with self._lock, self._conn:
+            self._set_state("history_id", str(latest))
+        self._last_refresh = time.monotonic()
+        return len(changed) + len(deleted)
+
+    def refresh_if_stale(self, service) -> None:
+        if time.monotonic() - self._last_refresh < MESSAGE_STORE_REFRESH_SECONDS:
+            return
+        try:
+            self.refresh(service)
+        except Exception as e:
+            # A stale answer beats no answer; the next search will try again.
+            print(f"⚠️ Could not refresh message store for '{self.profile}': {e}")
+            self._last_refresh = time.monotonic()
+
+
+_stores: Dict[str, MessageStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_message_store(profile: str) -> MessageStore:
+    """Return the process-wide store for a profile."""
+    with _stores_lock:
+        if profile not in _stores:
+            _stores[profile] = MessageStore(profile)
+        return _stores[profile]
@@ -0,0 +1,96 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from google.genai import types
+
+from config import TRIAGE_CONCURRENCY, TRIAGE_EMAIL_TIMEOUT_SECONDS
+from utils.thinking_budget import stopped_by_ceiling
+
+# Per-email triage: every prefetched mail gets its own session on a shared runner,
+# at most `concurrency` at a time. Sessions don't see each other's mail, so the
+# context stays one mail long, and a mail that makes its session fail (or hang
+# past the timeout) only fails itself. The per-mail summaries are merged in input
+# order afterwards.
+
+
+def _final_text(events: List[Any]) -> str:
+    """The model's last non-thought text in a session."""
+    for event in reversed(events):
+        content = getattr(event, "content", None)
+        if getattr(event, "partial", False) or content is None or content.role != "model":
+            continue
+        text = "".join(p.text for p in content.parts or [] if p.text and not p.thought).strip()
+        if text:
+            return text
+    return ""
+
+
+async def _triage_one(
+    runner, item: Dict[str, Any], prompt: str, on_event: Optional[Callable[[Any], None]], timeout: float
+) -> Dict[str, Any]:
+    result = {"message_id": item["message_id"], "subject": item.get("subject"), "events": []}
+    started = time.perf_counter()
+
+    async def run() -> None:
+        session = await runner.session_service.create_session(app_name=runner.app_name, user_id="triage")
+        async for event in runner.run_async(
+            user_id=session.user_id,
+            session_id=session.id,
+            new_message=types.Content(role="user", parts=[types.Part(text=prompt)]),
+        ):
+            result["events"].append(event)
+            if on_event:
+                on_event(event)
+
+    try:
+        await asyncio.wait_for(run(), timeout)
+        if stopped_by_ceiling(result["events"]):
+            # The mail was not (fully) triaged; leave it for the next run.
+            result["error"] = "stoppad av tokentaket"
+        else:
+            result["summary"] = _final_text(result["events"]) or "Ingen sammanfattning."
+    except asyncio.TimeoutError:
+        result["error"] = f"timeout efter {timeout:g}s"
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = round(time.perf_counter() - started, 2)
+    return result
+
+
+async def triage_each(
+    runner,
+    items: List[Dict[str, Any]],
+    build_prompt: Callable[[Dict[str, Any]], str],
+    on_event: Optional[Callable[[Any], None]] = None,
+    concurrency: int = TRIAGE_CONCURRENCY,
+    timeout: float = TRIAGE_EMAIL_TIMEOUT_SECONDS,
+) -> List[Dict[str, Any]]:
+    """
+    Triage every item in its own session. Returns one result per item, in input
+    order: message_id, subject, events, seconds and either summary or error.
+    Items that already failed in prefetch are passed through as errors.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def bounded(item: Dict[str, Any]) -> Dict[str, Any]:
+        if "error" in item:
+            return {"message_id": item["message_id"], "error": item["error"], "events": [], "seconds": 0.0}
+        async with semaphore:
+            return await _triage_one(runner, item, build_prompt(item), on_event, timeout)
+
+    return list(await asyncio.gather(*(bounded(item) for item in items)))
+
+
+def format_summaries(results: List[Dict[str, Any]]) -> str:
+    """Merged report of a per-email run."""
+    lines = []
+    for r in results:
+        title = r.get("subject") or r["message_id"]
+        if "error" in r:
+            lines.append(f"❌ {title} ({r['message_id']}): {r['error']}")
+        else:
+            lines.append(f"✉️ {title}: {r['summary']}")
+    failed = sum(1 for r in results if "error" in r)
+    lines.append(f"\n{len(results) - failed}/{len(results)} mail triagerade" + (f", {failed} misslyckades." if failed else "."))
+    return "\n".join(lines)
@@ -0,0 +1,90 @@
+import asyncio
+import json
+from typing import Any, Dict, List
+
+from googleapiclient.errors import HttpError
+
+from auth.google_auth import get_gmail_service
+from config import GOOGLE_RETRY_ATTEMPTS, PREFETCH_BODY_CHARS, PREFETCH_CONCURRENCY, PREFETCH_THREAD_MESSAGES
+from tools.gmail_tools import GmailToolset, _batch_get_messages
+from utils.api_retry import is_retryable, retry_delay
+
+# Code-driven ingestion ahead of the manager agent: the unread batch and its
+# (normalized, quote-stripped) threads are fetched concurrently before the
+# model is called, so no model turns are spent on gmail_list_unread /
+# gmail_get_thread. The agent gets one compact, structured batch instead.
+# Rate-limited and 5xx thread fetches are retried with backoff (utils/api_retry.py).
+
+_EARLIER_CHARS = 300
+
+
+def _compact(thread: Dict[str, Any], message_id: str) -> Dict[str, Any]:
+    """The fields the manager needs to decide, from a gmail_get_thread result."""
+    headers = thread.get("headers", {})
+    earlier = [
+        {
+            "from": m.get("from"),
+            "date": m.get("date"),
+            "text": (m.get("body", {}).get("text") or m.get("snippet") or "")[:_EARLIER_CHARS],
+        }
+        for m in thread.get("thread", [])
+        if m.get("message_id") != message_id
+    ]
+    item = {
+        "message_id": message_id,
+        "thread_id": thread.get("thread_id"),
+        "from": headers.get("From"),
+        "to": headers.get("To"),
+        "subject": headers.get("Subject"),
+        "date": headers.get("Date"),
+        "body": thread.get("body", {}).get("text", ""),
+    }
+    if earlier:
+        item["earlier_in_thread"] = earlier
+    if thread.get("omitted_messages"):
+        item["omitted_messages"] = thread["omitted_messages"]
+    return item
+
+
+async def prefetch_batch(message_ids: List[str], account: str = "default") -> List[Dict[str, Any]]:
+    """
+    Fetch the threads of message_ids concurrently (at most PREFETCH_CONCURRENCY at a
+    time). Returns one compact item per message, in input order; failures become
+    {"message_id", "error"} items so the agent can still report them (and the run
+    leaves them unlabelled).
+    """
+    gmail = GmailToolset()
+    # Resolve all thread ids in one batch request instead of one lookup per thread.
+    service = get_gmail_service(profile=account)
+    minimal = await asyncio.to_thread(_batch_get_messages, service, message_ids, "minimal")
+    thread_ids = {m["id"]: m.get("threadId", "") for m in minimal}
+
+    semaphore = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+
+    async def fetch(message_id: str) -> Dict[str, Any]:
+        for attempt in range(GOOGLE_RETRY_ATTEMPTS + 1):
+            try:
+                async with semaphore:
+                    thread = await gmail.gmail_get_thread(
+                        message_id,
+                        account,
+                        thread_id=thread_ids.get(message_id, ""),
+                        max_messages=PREFETCH_THREAD_MESSAGES,
+                        max_body_chars=PREFETCH_BODY_CHARS,
+                    )
+                break
+            except HttpError as e:
+                if attempt == GOOGLE_RETRY_ATTEMPTS or not is_retryable(e):
+                    return {"message_id": message_id, "error": f"HTTP {e.resp.status}: {e}"}
+            # Back off outside the semaphore, so other fetches keep going.
+            await asyncio.sleep(retry_delay(attempt))
+        if "error" in thread:
+            return {"message_id": message_id, "error": thread["error"]}
+        return _compact(thread, message_id)
+
+    return list(await asyncio.gather(*(fetch(mid) for mid in message_ids)))
+
+
+def format_batch(items: List[Dict[str, Any]]) -> str:
+    """Compact JSON for the prompt (one line per mail)."""
+    return "\n".join(json.dumps(item, ensure_ascii=False, separators=(",", ":")) for item in items)
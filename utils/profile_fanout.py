@@ -0,0 +1,83 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+
+from config import PROFILE_FANOUT_WORKERS, PROFILE_TIMEOUT_SECONDS
+
+# Runs one blocking call per profile concurrently, so multi-profile tools take
+# as long as the slowest profile instead of the sum. Results come back in the
+# order the profiles were given, whatever order they finish in.
+#
+# The calls run on a dedicated, bounded pool (never the loop's default executor,
+# which asyncio.to_thread callers like prefetch share). A call that times out
+# can't be stopped: it is cancelled if it hasn't started, otherwise abandoned.
+# At most one abandoned call per profile is allowed; while it still runs, that
+# profile answers with an error at once instead of taking another worker.
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_abandoned: Dict[str, Future] = {}  # profile -> timed-out call that is still running
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PROFILE_FANOUT_WORKERS, thread_name_prefix="profile-fanout")
+        return _executor
+
+
+def fan_out(
+    profiles: List[str], fn: Callable[[str], T], timeout: float = PROFILE_TIMEOUT_SECONDS
+) -> List[Tuple[str, Optional[T], Optional[str]]]:
+    """
+    Call fn(profile) for every profile in parallel.
+    Returns (profile, result, error) per profile in input order; error is set (and
+    result None) if fn raised or didn't finish within `timeout` seconds of the start.
+    A timed-out call keeps running in the background but is no longer waited for.
+    """
+    profiles = list(dict.fromkeys(profiles))
+    if len(profiles) == 1:
+        # No point in a thread hop (or a timeout) for a single profile.
+        try:
+            return [(profiles[0], fn(profiles[0]), None)]
+        except Exception as e:
+            return [(profiles[0], None, str(e))]
+
+    executor = _get_executor()
+    futures: List[Tuple[str, Optional[Future]]] = []
+    for profile in profiles:
+        with _executor_lock:
+            hanging = profile in _abandoned
+        futures.append((profile, None if hanging else executor.submit(fn, profile)))
+    deadline = time.monotonic() + timeout
+    results: List[Tuple[str, Optional[T], Optional[str]]] = []
+    for profile, future in futures:
+        if future is None:
+            results.append((profile, None, "previous call still hasn't answered"))
+            continue
+        try:
+            results.append((profile, future.result(timeout=max(0.0, deadline - time.monotonic())), None))
+        except TimeoutError:
+            if not future.cancel():
+                _abandon(profile, future)
+            results.append((profile, None, f"no answer within {timeout:g}s"))
+        except Exception as e:
+            results.append((profile, None, str(e)))
+    return results
+
+
+def _abandon(profile: str, future: Future) -> None:
+    def release(_future: Future) -> None:
+        with _executor_lock:
+            if _abandoned.get(profile) is future:
+                del _abandoned[profile]
+
+    with _executor_lock:
+        _abandoned[profile] = future
+        count = len(_abandoned)
+    print(f"⚠️ Profilen '{profile}' svarar inte; anropet lämnas kvar i bakgrunden ({count} hängande).")
+    future.add_done_callback(release)
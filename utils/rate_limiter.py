@@ -0,0 +1,74 @@
+import asyncio
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from config import MODEL_CALLS_PER_MINUTE, MODEL_RATE_BURST
+
+# Process-wide token bucket for model calls. Every agent registers
+# throttle_model_call as its before_model_callback, so the manager sessions of a
+# concurrent triage and the sub-agents they delegate to share one budget.
+#
+# acquire() only takes the (thread) lock long enough to reserve a slot and then
+# sleeps outside it, so the limiter is not tied to one event loop (every one-off
+# asyncio.run is a new loop).
+
+
+class RateLimiter:
+    def __init__(self, per_minute: float, burst: int = 1):
+        self.rate = per_minute / 60.0
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.throttled = 0
+        self.waited_seconds = 0.0
+
+    def _reserve(self) -> float:
+        """Take one token (going negative reserves a future one). Returns seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.calls += 1
+            if wait:
+                self.throttled += 1
+                self.waited_seconds += wait
+            return wait
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        wait = self._reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "throttled": self.throttled,
+                "waited_seconds": round(self.waited_seconds, 2),
+            }
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_model_rate_limiter() -> RateLimiter:
+    """Return the process-wide model call limiter."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter(MODEL_CALLS_PER_MINUTE, MODEL_RATE_BURST)
+        return _limiter
+
+
+async def throttle_model_call(callback_context, llm_request) -> None:
+    """before_model_callback: wait for the shared limiter, then let the call through."""
+    await get_model_rate_limiter().acquire()
+    return None
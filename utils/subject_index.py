@@ -0,0 +1,228 @@
+import atexit
+import os
+import re
+import threading
+import time
+import zlib
+from email.utils import parseaddr
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import MESSAGE_STORE_DIR
+from utils.message_store import MessageStore
+
+# Near-duplicate subject index per profile, for gmail_find_related.
+#
+# Each subject is normalized (reply/forward prefixes in any language stripped,
+# punctuation dropped), cut into character 3-gram shingles and reduced to a
+# MinHash signature. The fraction of equal signature slots estimates the Jaccard
+# similarity of two subjects, so one vectorized comparison against the whole
+# signature matrix ranks every mirrored message in a few milliseconds. A match
+# on the sender's domain adds a small bonus.
+#
+# The index is fed from the local message store: built once, saved next to it,
+# and caught up through the store's subject_log, so messages added (whatever
+# their internalDate), changed or deleted since the last update are applied.
+# Saving rewrites the whole file, so it is debounced (every _SAVE_EVERY_CHANGES
+# changes or _SAVE_EVERY_SECONDS, and at exit) and atomic (temp file + rename).
+# An index saved behind the store just catches up from its last seq on load.
+
+_NUM_PERM = 64
+_SHINGLE = 3
+_DOMAIN_WEIGHT = 0.05
+MIN_SIMILARITY = 0.4
+_SAVE_EVERY_CHANGES = 1000
+_SAVE_EVERY_SECONDS = 600
+
+_PREFIX_RE = re.compile(
+    r"^\s*((re|sv|svar|vs|fw|fwd|vb|aw|wg|antw|tr|rv|ref|ang|odp)\s*(\[\d+\]|\(\d+\))?\s*:\s*)+",
+    re.IGNORECASE,
+)
+_NON_WORD_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+_rng = np.random.default_rng(20251013)
+# Multiply-shift hashing: (a * x + b) mod 2**64, top 32 bits. a must be odd.
+_A = _rng.integers(1, 2**63, size=_NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_B = _rng.integers(0, 2**63, size=_NUM_PERM, dtype=np.uint64)
+
+
+def strip_reply_prefixes(subject: str) -> str:
+    """'SV: VB: Re[2]: Kalas' -> 'Kalas'."""
+    return _PREFIX_RE.sub("", subject or "").strip()
+
+
+def normalize_subject(subject: str) -> str:
+    return " ".join(_NON_WORD_RE.sub(" ", strip_reply_prefixes(subject).lower()).split())
+
+
+def sender_domain(from_addr: str) -> str:
+    """Registrable-ish domain of the sender: 'Anna <a@mail.skola.se>' -> 'skola.se'."""
+    domain = parseaddr(from_addr or "")[1].rpartition("@")[2].lower()
+    labels = domain.split(".")
+    # Keep three labels for second-level registries like co.uk / com.au.
+    keep = 3 if len(labels) >= 3 and len(labels[-1]) == 2 and len(labels[-2]) <= 3 else 2
+    return ".".join(labels[-keep:])
+
+
+def _shingles(text: str) -> np.ndarray:
+    padded = f" {text} "
+    grams = {padded[i:i + _SHINGLE] for i in range(max(1, len(padded) - _SHINGLE + 1))}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+def signature(subject: str) -> np.ndarray:
+    """MinHash signature (uint32[_NUM_PERM]) of a subject."""
+    shingles = _shingles(normalize_subject(subject))
+    hashed = (_A[:, None] * shingles[None, :] + _B[:, None]) >> np.uint64(32)
+    return hashed.min(axis=1).astype(np.uint32)
+
+
+def _domain_hash(from_addr: str) -> int:
+    domain = sender_domain(from_addr)
+    return zlib.crc32(domain.encode("utf-8")) if domain else 0
+
+
+class SubjectIndex:
+    """MinHash signatures of every subject in one profile's message store."""
+
+    def __init__(self, store: MessageStore, path=None):
+        self.store = store
+        self.path = path or (MESSAGE_STORE_DIR / f"{store.profile}.subjects.npz")
+        self._lock = threading.Lock()
+        self._ids = np.empty(0, dtype="U32")
+        self._signatures = np.empty((0, _NUM_PERM), dtype=np.uint32)
+        self._domains = np.empty(0, dtype=np.uint32)
+        self._last_seq = 0
+        self._unsaved = 0
+        self._saved_at = time.monotonic()
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            with np.load(self.path) as data:
+                # Indexes saved before subject_log (keyed on sort_key) are rebuilt.
+                if data["signatures"].shape[1] != _NUM_PERM or "last_seq" not in data:
+                    return
+                self._ids = data["ids"]
+                self._signatures = data["signatures"]
+                self._domains = data["domains"]
+                self._last_seq = int(data["last_seq"])
+        except Exception as e:
+            print(f"⚠️ Could not load subject index {self.path}: {e}")
+
+    def _save(self) -> None:
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                ids=self._ids,
+                signatures=self._signatures,
+                domains=self._domains,
+                last_seq=np.int64(self._last_seq),
+            )
+        os.replace(tmp_path, self.path)
+        self._unsaved = 0
+        self._saved_at = time.monotonic()
+
+    def flush(self) -> None:
+        """Save changes not written yet."""
+        with self._lock:
+            if self._unsaved:
+                self._save()
+
+    def update(self) -> int:
+        """Apply messages the store has added, changed or deleted since the last update. Returns how many."""
+        with self._lock:
+            if self._last_seq > self.store.last_subject_seq():
+                # The store was rebuilt from scratch: so is the index.
+                self._ids = self._ids[:0]
+                self._signatures = self._signatures[:0]
+                self._domains = self._domains[:0]
+                self._last_seq = 0
+            # Latest state per message id; None = deleted.
+            changes: Dict[str, Optional[Tuple[str, str]]] = {}
+            for rows in self.store.iter_subject_changes(after_seq=self._last_seq):
+                for seq, message_id, exists, from_addr, subject in rows:
+                    changes[message_id] = (from_addr, subject) if exists else None
+                self._last_seq = rows[-1][0]
+            if not changes:
+                return 0
+            keep = ~np.isin(self._ids, list(changes))
+            current = [(message_id, row) for message_id, row in changes.items() if row is not None]
+            ids = np.array([message_id for message_id, _ in current], dtype="U32")
+            sigs = np.array([signature(subject or "") for _, (_, subject) in current], dtype=np.uint32)
+            domains = np.array([_domain_hash(from_addr) for _, (from_addr, _) in current], dtype=np.uint32)
+            self._ids = np.concatenate([self._ids[keep], ids])
+            self._signatures = np.concatenate([self._signatures[keep], sigs.reshape(-1, _NUM_PERM)])
+            self._domains = np.concatenate([self._domains[keep], domains])
+            self._unsaved += len(changes)
+            if self._unsaved >= _SAVE_EVERY_CHANGES or time.monotonic() - self._saved_at >= _SAVE_EVERY_SECONDS:
+                self._save()
+            return len(changes)
+
+    def related(
+        self, subject: str, from_addr: str = "", exclude_id: Optional[str] = None, limit: int = 10
+    ) -> List[Tuple[str, float]]:
+        """(message id, score) of the most similar subjects, best first."""
+        query = signature(subject)
+        with self._lock:
+            if not len(self._ids):
+                return []
+            similarity = np.count_nonzero(self._signatures == query, axis=1) / _NUM_PERM
+            domain = _domain_hash(from_addr)
+            score = similarity + (_DOMAIN_WEIGHT * (self._domains == domain) if domain else 0.0)
+            score[similarity < MIN_SIMILARITY] = 0.0
+            if exclude_id is not None:
+                score[self._ids == exclude_id] = 0.0
+            top = min(limit, int(np.count_nonzero(score)))
+            if top == 0:
+                return []
+            best = np.argpartition(-score, top - 1)[:top]
+            best = best[np.argsort(-score[best], kind="stable")]
+            return [(str(self._ids[i]), round(float(score[i]), 3)) for i in best]
+
+    def related_messages(
+        self, subject: str, from_addr: str = "", exclude_id: Optional[str] = None, limit: int = 10
+    ) -> List[Dict[str, Any]]:
+        """Like related(), with the stored message fields (messages deleted since are skipped)."""
+        # Ask for a few extra in case some hits were deleted from the store.
+        ranked = self.related(subject, from_addr, exclude_id, limit + 5)
+        rows = self.store.get_many([message_id for message_id, _ in ranked])
+        results = []
+        for message_id, score in ranked:
+            row = rows.get(message_id)
+            if row is None:
+                continue
+            results.append({**row, "similarity": score})
+            if len(results) == limit:
+                break
+        return results
+
+
+_indexes: Dict[str, SubjectIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+@atexit.register
+def _flush_all() -> None:
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    for index in indexes:
+        try:
+            index.flush()
+        except Exception as e:
+            print(f"⚠️ Could not save subject index {index.path}: {e}")
+
+
+def get_subject_index(store: MessageStore) -> SubjectIndex:
+    """Return the process-wide subject index for a store's profile."""
+    with _indexes_lock:
+        if store.profile not in _indexes:
+            _indexes[store.profile] = SubjectIndex(store)
+        return _indexes[store.profile]
@@ -0,0 +1,253 @@
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from config import BASE_DIR, RUN_TOKEN_CEILING, THINKING_ADAPTIVE, THINKING_MIN_BUDGET
+
+# Per-call thinking budget for every agent in the hierarchy.
+#
+# The planner's budget (4000 for the manager, 12000 for research, ...) is the
+# ceiling; schedule_thinking (a before_model_callback) scales it down from cheap
+# signals in the request:
+#   - size of the task text (the mail, or the delegated question + mail context)
+#   - thread depth and number of attachments in it
+#   - follow-up turns (after a tool result) need less than the first decision
+# and from history: how many thought tokens similar calls (same agent, same
+# complexity bucket) actually used. If none of them ran into their budget, the
+# budget is capped a bit above the most they used.
+#
+# Thought summaries (include_thoughts) are only requested where they are shown:
+# the manager's story log. Sub-agent answers are only ever read as final text.
+#
+# On top, a per-run token ceiling: budgets shrink as the run nears it, and once
+# it is spent further model calls are answered locally with a stop message that
+# carries error_code TOKEN_CEILING_ERROR. Whoever reads the events (per-email
+# triage, the batch run, delegations) treats such a session as failed, not done.
+#
+# A call's budget waits in _pending from before_model to after_model. A call that
+# fails gets no after_model: forget_model_call (an on_model_error_callback)
+# drops it, and entries older than _PENDING_MAX_SECONDS (cancelled calls) are
+# evicted, so the long-running watch process doesn't accumulate them.
+
+THINKING_HISTORY_FILE = BASE_DIR / "thinking_history.json"
+THOUGHTS_SHOWN_FOR = {"email_hub_manager"}
+_HISTORY_KEEP = 20
+_HISTORY_MIN_SAMPLES = 5
+_SATURATED = 0.9  # used >= 90% of the budget: the call wanted more
+_ATTACHMENT_MARKER = "--- BITOGAD FIL: "
+TOKEN_CEILING_ERROR = "TOKEN_CEILING"
+_PENDING_MAX_SECONDS = 600
+
+
+def _task_text(llm_request) -> str:
+    for content in llm_request.contents or []:
+        if content.role == "user":
+            text = "".join(p.text or "" for p in content.parts or [])
+            if text:
+                return text
+    return ""
+
+
+def stopped_by_ceiling(events: List[Any]) -> bool:
+    """Whether any of a session's events is a model call the token ceiling stopped."""
+    return any(getattr(event, "error_code", None) == TOKEN_CEILING_ERROR for event in events)
+
+
+def _is_follow_up(llm_request) -> bool:
+    contents = llm_request.contents or []
+    return bool(contents) and any(p.function_response for p in contents[-1].parts or [])
+
+
+def complexity(text: str) -> float:
+    """0..1 estimate of how hard a task is, from its text alone."""
+    depth = text.count('"from":') + text.count("\nFrån:") + text.count("\nFrom:")
+    attachments = text.count(_ATTACHMENT_MARKER)
+    score = 0.15
+    score += 0.45 * min(len(text) / 8000, 1.0)
+    score += 0.2 * min(max(depth - 1, 0) / 4, 1.0)
+    score += 0.2 * min(attachments / 2, 1.0)
+    return min(score, 1.0)
+
+
+class ThinkingScheduler:
+    def __init__(
+        self,
+        min_budget: int = THINKING_MIN_BUDGET,
+        ceiling: int = RUN_TOKEN_CEILING,
+        adaptive: bool = THINKING_ADAPTIVE,
+        history_path=THINKING_HISTORY_FILE,
+    ):
+        self.min_budget = min_budget
+        self.ceiling = ceiling
+        self.adaptive = adaptive
+        self.history_path = history_path
+        self._history: Dict[str, List[Tuple[int, int]]] = self._load_history()
+        self._pending: Dict[Tuple[str, str], Tuple[str, int, int, float]] = {}
+        self._lock = threading.Lock()
+        self.start_run()
+
+    def _load_history(self) -> Dict[str, List[Tuple[int, int]]]:
+        if self.history_path is None or not self.history_path.exists():
+            return {}
+        try:
+            data = json.loads(self.history_path.read_text(encoding="utf-8"))
+            return {key: [tuple(sample) for sample in samples] for key, samples in data.items()}
+        except Exception as e:
+            print(f"⚠️ Could not load thinking history: {e}")
+            return {}
+
+    def save_history(self) -> None:
+        if self.history_path is None:
+            return
+        with self._lock:
+            data = json.dumps(self._history)
+        tmp = self.history_path.with_suffix(".tmp")
+        tmp.write_text(data, encoding="utf-8")
+        tmp.replace(self.history_path)
+
+    def start_run(self, ceiling: Optional[int] = None) -> None:
+        """Reset the per-run token account (and statistics)."""
+        with self._lock:
+            if ceiling is not None:
+                self.ceiling = ceiling
+            self.used_tokens = 0
+            self.calls = 0
+            self.stopped = 0
+            self.budget_total = 0
+            self.fixed_total = 0
+            self.thought_tokens = 0
+            self.model_seconds = 0.0
+
+    def budget(self, agent: str, fixed: int, llm_request) -> Tuple[str, int]:
+        """(history key, thinking budget) for one call of `agent` whose planner budget is `fixed`."""
+        score = complexity(_task_text(llm_request))
+        if _is_follow_up(llm_request):
+            score *= 0.5
+        key = f"{agent}:{int(score * 4)}"
+        budget = int(self.min_budget + (fixed - self.min_budget) * score)
+        with self._lock:
+            samples = self._history.get(key, [])
+            if len(samples) >= _HISTORY_MIN_SAMPLES:
+                if any(used >= _SATURATED * given for used, given in samples):
+                    budget = int(budget * 1.5)
+                else:
+                    budget = min(budget, int(1.25 * max(used for used, _ in samples)))
+            if self.ceiling:
+                budget = min(budget, max(self.ceiling - self.used_tokens, 0) // 4)
+        return key, max(self.min_budget, min(budget, fixed))
+
+    def before_model(self, callback_context, llm_request) -> Optional[LlmResponse]:
+        with self._lock:
+            over = self.ceiling and self.used_tokens >= self.ceiling
+            if over:
+                self.stopped += 1
+        if over:
+            message = f"⛔ Tokentaket för körningen ({self.ceiling}) är nått – avbryter här."
+            return LlmResponse(
+                content=types.Content(role="model", parts=[types.Part(text=message)]),
+                error_code=TOKEN_CEILING_ERROR,
+                error_message=message,
+            )
+
+        config = llm_request.config.thinking_config if llm_request.config else None
+        agent = callback_context.agent_name
+        fixed = config.thinking_budget if config and config.thinking_budget else 0
+        key, budget = ("", fixed)
+        if fixed > 0 and self.adaptive:
+            key, budget = self.budget(agent, fixed, llm_request)
+            # The planner shares one ThinkingConfig across calls: replace it, never mutate it.
+            llm_request.config.thinking_config = types.ThinkingConfig(
+                thinking_budget=budget,
+                include_thoughts=bool(config.include_thoughts) and agent in THOUGHTS_SHOWN_FOR,
+            )
+        now = time.perf_counter()
+        with self._lock:
+            stale = [k for k, entry in self._pending.items() if now - entry[3] > _PENDING_MAX_SECONDS]
+            for k in stale:
+                del self._pending[k]
+            self._pending[(callback_context.invocation_id, agent)] = (key, budget, fixed, now)
+        return None
+
+    def on_model_error(self, callback_context) -> None:
+        """Drop the pending entry of a model call that raised (it gets no after_model)."""
+        with self._lock:
+            self._pending.pop((callback_context.invocation_id, callback_context.agent_name), None)
+
+    def after_model(self, callback_context, llm_response) -> None:
+        if getattr(llm_response, "partial", False):
+            return None
+        usage = llm_response.usage_metadata
+        with self._lock:
+            key, budget, fixed, started = self._pending.pop(
+                (callback_context.invocation_id, callback_context.agent_name), ("", 0, 0, time.perf_counter())
+            )
+            thoughts = (usage.thoughts_token_count or 0) if usage else 0
+            self.used_tokens += (usage.total_token_count or 0) if usage else 0
+            self.calls += 1
+            self.budget_total += budget
+            self.fixed_total += fixed
+            self.thought_tokens += thoughts
+            self.model_seconds += time.perf_counter() - started
+            if key and usage:
+                self._history[key] = (self._history.get(key, []) + [(thoughts, budget)])[-_HISTORY_KEEP:]
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "budget_total": self.budget_total,
+                "fixed_total": self.fixed_total,
+                "thought_tokens": self.thought_tokens,
+                "used_tokens": self.used_tokens,
+                "ceiling": self.ceiling,
+                "stopped": self.stopped,
+                "model_seconds": round(self.model_seconds, 2),
+            }
+
+    def report(self) -> None:
+        s = self.stats()
+        if not s["calls"]:
+            return
+        saved = s["fixed_total"] - s["budget_total"]
+        ceiling = f" av tak {s['ceiling']}" if s["ceiling"] else ""
+        print(
+            f"🧠 Tankebudget: {s['calls']} modellanrop, budget {s['budget_total']} "
+            f"(fast {s['fixed_total']}, {saved} mindre), {s['thought_tokens']} tanketokens använda, "
+            f"{s['used_tokens']} tokens totalt{ceiling}."
+        )
+        if s["stopped"]:
+            print(f"⛔ Tokentaket stoppade {s['stopped']} modellanrop.")
+
+
+_scheduler: Optional[ThinkingScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_thinking_scheduler() -> ThinkingScheduler:
+    """Return the process-wide thinking budget scheduler."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ThinkingScheduler()
+        return _scheduler
+
+
+def schedule_thinking(callback_context, llm_request) -> Optional[LlmResponse]:
+    """before_model_callback: pick this call's thinking budget (or stop at the token ceiling)."""
+    return get_thinking_scheduler().before_model(callback_context, llm_request)
+
+
+def record_model_usage(callback_context, llm_response) -> None:
+    """after_model_callback: account the call's tokens against the run and the history."""
+    return get_thinking_scheduler().after_model(callback_context, llm_response)
+
+
+def forget_model_call(callback_context, llm_request, error) -> Optional[LlmResponse]:
+    """on_model_error_callback: forget the failed call's budget; the error is raised as usual."""
+    get_thinking_scheduler().on_model_error(callback_context)
+    return None
@@ -0,0 +1,364 @@
+import contextvars
+import itertools
+import json
+import re
+import statistics
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import httplib2
+from google.adk.plugins.base_plugin import BasePlugin
+
+from config import TRACE_DIR, TRACE_KEEP_RUNS, TRACING_ENABLED
+
+# Per-run tracing: a tree of timed spans for one triage run.
+#
+#   run > phase (fast path, prefetch, agent, labelling)
+#       > agent (manager session / sub-agent run) > model (one LLM call)
+#                                                 > tool / delegation (ask_*) > agent > ...
+#                                                                             > http
+#
+# Agents, model calls and tools are recorded by TracingPlugin, which every runner
+# from agents/registry.py carries; Google API requests by TracedHttp (the pooled
+# clients' transport); the rest with tracer.span(). The parent of a new span is
+# the current span of the asyncio task (or thread, via asyncio.to_thread), so
+# concurrent sessions form separate subtrees.
+#
+# Spans are only recorded while a run is active. finish_run() writes the run to
+# TRACE_DIR as JSONL (one span per line) and as a Chrome trace-event file, then
+# deletes all but the newest keep_runs runs. Run ids carry a random suffix, so
+# runs started in the same second (or by two processes) never share files.
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("trace_span", default=None)
+_ID_SEGMENT_RE = re.compile(r"/(?=[0-9a-zA-Z_-]*\d)[0-9a-zA-Z_-]{10,}|/\d+(?=/|$)")
+
+
+class Span:
+    __slots__ = ("id", "parent", "kind", "name", "start", "end", "thread", "attrs")
+
+    def __init__(self, span_id: int, parent: Optional["Span"], kind: str, name: str, attrs: Dict[str, Any]):
+        self.id = span_id
+        self.parent = parent
+        self.kind = kind
+        self.name = name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.thread = threading.current_thread().name
+        self.attrs = attrs
+
+    @property
+    def seconds(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+
+class Tracer:
+    def __init__(self, enabled: bool = TRACING_ENABLED, trace_dir: Path = TRACE_DIR, keep_runs: int = TRACE_KEEP_RUNS):
+        self.enabled = enabled
+        self.trace_dir = trace_dir
+        self.keep_runs = keep_runs
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._spans: List[Span] = []
+        self._open: Dict[Any, Span] = {}
+        self.root: Optional[Span] = None
+        self.run_id = ""
+
+    @property
+    def active(self) -> bool:
+        return self.enabled and self.root is not None and self.root.end is None
+
+    def start_run(self, name: str = "triage") -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._spans = []
+            self._open = {}
+            self.run_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+            self.root = Span(next(self._ids), None, "run", name, {})
+            self._spans.append(self.root)
+        _current.set(self.root)
+
+    def start(self, kind: str, name: str, parent: Optional[Span] = None, key: Any = None, **attrs) -> Optional[Span]:
+        """Open a span (child of the current one). With `key`, it can be ended from another callback."""
+        if not self.active:
+            return None
+        with self._lock:
+            span = Span(next(self._ids), parent or _current.get() or self.root, kind, name, attrs)
+            self._spans.append(span)
+            if key is not None:
+                self._open[key] = span
+        return span
+
+    def end(self, span: Optional[Span] = None, key: Any = None, **attrs) -> Optional[Span]:
+        with self._lock:
+            if key is not None:
+                span = self._open.pop(key, None)
+            if span is None or span.end is not None:
+                return None
+            span.end = time.perf_counter()
+            span.attrs.update(attrs)
+        return span
+
+    @contextmanager
+    def span(self, kind: str, name: str, **attrs) -> Iterator[Optional[Span]]:
+        span = self.start(kind, name, **attrs)
+        if span is None:
+            yield None
+            return
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.attrs["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current.reset(token)
+            self.end(span)
+
+    def finish_run(self) -> Optional[Tuple[Path, Path]]:
+        """Close the run (and spans left open by errors) and export it. Returns the file paths."""
+        if not self.active:
+            return None
+        now = time.perf_counter()
+        with self._lock:
+            for span in self._spans:
+                if span.end is None:
+                    span.end = now
+                    if span is not self.root:
+                        span.attrs["unfinished"] = True
+            self._open.clear()
+        try:
+            paths = self.export()
+        except Exception as e:
+            print(f"⚠️ Could not write trace: {e}")
+            return None
+        self._prune()
+        return paths
+
+    def _prune(self) -> None:
+        """Delete the files of all but the newest keep_runs runs."""
+        if self.keep_runs <= 0:
+            return
+        try:
+            runs = sorted(self.trace_dir.glob("*.jsonl"), key=lambda p: p.stat().st_mtime, reverse=True)
+            for jsonl_path in runs[self.keep_runs:]:
+                jsonl_path.unlink(missing_ok=True)
+                jsonl_path.with_name(jsonl_path.stem + ".trace.json").unlink(missing_ok=True)
+        except OSError as e:
+            print(f"⚠️ Could not prune old traces: {e}")
+
+    def _records(self) -> List[Dict[str, Any]]:
+        t0 = self.root.start
+        return [
+            {
+                "id": s.id,
+                "parent": s.parent.id if s.parent else None,
+                "kind": s.kind,
+                "name": s.name,
+                "start_ms": round((s.start - t0) * 1000, 3),
+                "duration_ms": round(s.seconds * 1000, 3),
+                "thread": s.thread,
+                **s.attrs,
+            }
+            for s in self._spans
+        ]
+
+    def export(self) -> Tuple[Path, Path]:
+        self.trace_dir.mkdir(parents=True, exist_ok=True)
+        records = self._records()
+        jsonl_path = self.trace_dir / f"{self.run_id}.jsonl"
+        with open(jsonl_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+        # One lane (tid) per top-level subtree, so concurrent sessions don't overlap in the viewer.
+        by_id = {s.id: s for s in self._spans}
+        lanes: Dict[int, int] = {}
+
+        def lane(span: Span) -> int:
+            top = span
+            while top.parent is not None and top.parent is not self.root:
+                top = top.parent
+            return lanes.setdefault(top.id, len(lanes))
+
+        events = []
+        for record in records:
+            tid = lane(by_id[record["id"]])
+            args = {k: v for k, v in record.items() if k not in ("name", "start_ms", "duration_ms")}
+            events.append({
+                "name": record["name"],
+                "cat": record["kind"],
+                "ph": "X",
+                "ts": int(record["start_ms"] * 1000),
+                "dur": max(int(record["duration_ms"] * 1000), 1),
+                "pid": 1,
+                "tid": tid,
+                "args": args,
+            })
+        for top_id, tid in lanes.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": by_id[top_id].name}})
+        chrome_path = self.trace_dir / f"{self.run_id}.trace.json"
+        chrome_path.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}, default=str), encoding="utf-8")
+        return jsonl_path, chrome_path
+
+    def spans(self, kind: str, name: Optional[str] = None) -> List[Span]:
+        """Spans of this kind (and name) in the current or last run."""
+        with self._lock:
+            return [s for s in self._spans if s.kind == kind and (name is None or s.name == name)]
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Spans aggregated by kind and name, slowest total first."""
+        groups: Dict[Tuple[str, str], List[Span]] = {}
+        with self._lock:
+            for span in self._spans:
+                if span is not self.root:
+                    groups.setdefault((span.kind, span.name), []).append(span)
+        rows = []
+        for (kind, name), spans in groups.items():
+            durations = [s.seconds for s in spans]
+            row = {
+                "kind": kind,
+                "name": name,
+                "count": len(spans),
+                "total_s": sum(durations),
+                "p50_ms": statistics.median(durations) * 1000,
+                "max_ms": max(durations) * 1000,
+            }
+            for attr in ("prompt_tokens", "thought_tokens", "output_tokens", "request_bytes", "response_bytes"):
+                row[attr] = sum(s.attrs.get(attr) or 0 for s in spans)
+            rows.append(row)
+        return sorted(rows, key=lambda r: -r["total_s"])
+
+    def print_summary(self, limit: int = 15) -> None:
+        if self.root is None:
+            return
+        rows = self.summary()
+        print(f"\n--- 🧵 Spårning ({self.root.seconds:.1f}s) ---")
+        print(
+            f"{'typ':<10} {'namn':<34} {'antal':>5} {'total':>8} {'p50':>9} {'max':>9} "
+            f"{'prompt':>8} {'tankar':>7} {'svar':>6} {'bytes in/ut':>14}"
+        )
+        for r in rows[:limit]:
+            print(
+                f"{r['kind']:<10} {r['name'][:34]:<34} {r['count']:>5} {r['total_s']:>7.2f}s "
+                f"{r['p50_ms']:>7.0f}ms {r['max_ms']:>7.0f}ms {r['prompt_tokens']:>8} {r['thought_tokens']:>7} "
+                f"{r['output_tokens']:>6} {r['request_bytes']:>6}/{r['response_bytes']:<7}"
+            )
+        if len(rows) > limit:
+            print(f"... {len(rows) - limit} till i spårfilen.")
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Return the process-wide tracer."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+        return _tracer
+
+
+def _json_size(value: Any) -> int:
+    try:
+        return len(json.dumps(value, ensure_ascii=False, default=str))
+    except Exception:
+        return 0
+
+
+class TracingPlugin(BasePlugin):
+    """ADK plugin recording agent runs, model calls and tool calls as spans."""
+
+    def __init__(self):
+        super().__init__(name="tracing")
+
+    async def before_agent_callback(self, *, agent, callback_context):
+        tracer = get_tracer()
+        span = tracer.start("agent", agent.name, key=("agent", callback_context.invocation_id, agent.name))
+        if span is not None:
+            _current.set(span)
+        return None
+
+    async def after_agent_callback(self, *, agent, callback_context):
+        span = get_tracer().end(key=("agent", callback_context.invocation_id, agent.name))
+        if span is not None:
+            _current.set(span.parent)
+        return None
+
+    async def before_model_callback(self, *, callback_context, llm_request):
+        get_tracer().start(
+            "model",
+            callback_context.agent_name,
+            key=("model", callback_context.invocation_id, callback_context.agent_name),
+            request_bytes=sum(len(c.model_dump_json(exclude_none=True)) for c in llm_request.contents or []),
+        )
+        return None
+
+    async def after_model_callback(self, *, callback_context, llm_response):
+        if llm_response.partial:
+            return None
+        usage = llm_response.usage_metadata
+        get_tracer().end(
+            key=("model", callback_context.invocation_id, callback_context.agent_name),
+            prompt_tokens=usage.prompt_token_count if usage else None,
+            thought_tokens=usage.thoughts_token_count if usage else None,
+            output_tokens=usage.candidates_token_count if usage else None,
+            response_bytes=len(llm_response.content.model_dump_json(exclude_none=True)) if llm_response.content else 0,
+        )
+        return None
+
+    async def on_model_error_callback(self, *, callback_context, llm_request, error):
+        get_tracer().end(
+            key=("model", callback_context.invocation_id, callback_context.agent_name),
+            error=f"{type(error).__name__}: {error}",
+        )
+        return None
+
+    async def before_tool_callback(self, *, tool, tool_args, tool_context):
+        kind = "delegation" if tool.name.startswith("ask_") else "tool"
+        span = get_tracer().start(
+            kind, tool.name, key=("tool", tool_context.function_call_id), request_bytes=_json_size(tool_args)
+        )
+        if span is not None:
+            _current.set(span)
+        return None
+
+    async def after_tool_callback(self, *, tool, tool_args, tool_context, result):
+        span = get_tracer().end(key=("tool", tool_context.function_call_id), response_bytes=_json_size(result))
+        if span is not None:
+            _current.set(span.parent)
+        return None
+
+    async def on_tool_error_callback(self, *, tool, tool_args, tool_context, error):
+        span = get_tracer().end(key=("tool", tool_context.function_call_id), error=f"{type(error).__name__}: {error}")
+        if span is not None:
+            _current.set(span.parent)
+        return None
+
+
+def http_span_name(method: str, uri: str) -> str:
+    """'GET /gmail/v1/users/me/messages/:id' (ids collapsed, so requests aggregate by endpoint)."""
+    return f"{method} {_ID_SEGMENT_RE.sub('/:id', urlparse(uri).path)}"
+
+
+class TracedHttp(httplib2.Http):
+    """httplib2 transport that records every request (batch requests count once) as an http span."""
+
+    def request(self, uri, method="GET", body=None, headers=None, *args, **kwargs):
+        # One tracer reference for the whole request; the run may end (span None) in between.
+        tracer = get_tracer()
+        if not tracer.active:
+            return super().request(uri, method, body, headers, *args, **kwargs)
+        with tracer.span("http", http_span_name(method, uri), request_bytes=len(body or b"")) as span:
+            response, content = super().request(uri, method, body, headers, *args, **kwargs)
+            if span is not None:
+                span.attrs.update(status=response.status, response_bytes=len(content or b""))
+            return response, content
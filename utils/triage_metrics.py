@@ -0,0 +1,67 @@
+import time
+from typing import Any, Dict, Optional
+
+# Per-run triage metrics, fed with the runner's events as they stream in.
+#
+# model turns:             model responses (each one a full LLM round trip)
+# time to first decision:  from the start of the run (prefetch included) to the
+#                          first action on a mail, i.e. a write/delegation tool
+#                          call, or the final answer if the model takes none.
+
+# Tools that only read (fetch/list/search) don't count as a decision.
+_READ_TOOLS = {
+    "gmail_list_unread",
+    "gmail_get_thread",
+    "gmail_search",
+    "gmail_find_related",
+    "gmail_reply_draft_exists",
+    "calendar_list_events",
+}
+
+
+class TriageMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.prefetch_seconds = 0.0
+        self.model_turns = 0
+        self.tool_calls = 0
+        self.first_decision: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    def prefetch_done(self) -> None:
+        self.prefetch_seconds = time.perf_counter() - self.started
+
+    def observe(self, event: Any) -> None:
+        content = getattr(event, "content", None)
+        if getattr(event, "partial", False) or content is None or getattr(content, "role", None) != "model":
+            return
+        self.model_turns += 1
+        calls = event.get_function_calls() if hasattr(event, "get_function_calls") else []
+        self.tool_calls += len(calls)
+        decided = any(call.name not in _READ_TOOLS for call in calls) or (
+            not calls and hasattr(event, "is_final_response") and event.is_final_response()
+        )
+        if decided and self.first_decision is None:
+            self.first_decision = time.perf_counter() - self.started
+
+    def finish(self) -> Dict[str, Any]:
+        self.finished = time.perf_counter() - self.started
+        return self.summary()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "model_turns": self.model_turns,
+            "tool_calls": self.tool_calls,
+            "prefetch_seconds": round(self.prefetch_seconds, 2),
+            "time_to_first_decision": None if self.first_decision is None else round(self.first_decision, 2),
+            "total_seconds": None if self.finished is None else round(self.finished, 2),
+        }
+
+    def report(self) -> None:
+        s = self.summary()
+        first = "–" if s["time_to_first_decision"] is None else f"{s['time_to_first_decision']:.1f}s"
+        print(
+            f"📈 Triage-mått: {s['model_turns']} modellturer, {s['tool_calls']} verktygsanrop, "
+            f"första beslut efter {first} (varav prefetch {s['prefetch_seconds']:.1f}s), "
+            f"totalt {s['total_seconds'] or 0:.1f}s."
+        )
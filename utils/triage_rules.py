@@ -0,0 +1,263 @@
+import json
+import re
+import threading
+import time
+from email.utils import parseaddr
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import BASE_DIR, GMAIL_BATCH_SIZE, SENDER_HISTORY_MIN
+from tools.gmail_tools import _batch_get_messages, _headers_map
+
+# Deterministic fast path in front of the triage agent.
+#
+# Mail that is obviously a newsletter, receipt or notification (List-Unsubscribe,
+# Precedence: bulk, Auto-Submitted, no-reply senders, ...) is categorized and
+# labelled from its headers alone; only the rest reaches the model. The rules
+# live in triage_rules.json (private, falls back to triage_rules.default.json);
+# the first rule whose conditions all match wins:
+#
+#   headers        any of these headers is present
+#   header_values  {header: regex} all match (case-insensitive)
+#   from           regex on the sender address
+#   domains        sender domain is one of these (or a subdomain)
+#   subject        regex on the subject
+#   not_subject    regex the subject must NOT match (e.g. "Re:"/"Sv:")
+#   bulk           true: the mail must also look machine-sent (list or
+#                  Precedence/Auto-Submitted header, or a no-reply sender), so a
+#                  subject rule never catches mail from a person
+#   enabled        false: the rule is skipped. The default no-reply and mailing
+#                  list rules ship disabled, because school and club platforms
+#                  send exactly such mail, and it is where calendar events come from.
+#
+# Senders in "never" always go to the agent. On top of the rules, a sender whose
+# last SENDER_HISTORY_MIN mails all matched the same rule category keeps it. The
+# history only learns from rule hits (never from its own decisions), and never
+# for senders the user has written to (in:sent to:<address>, checked for the
+# whole batch in one batch HTTP request).
+
+SENDER_HISTORY_FILE = BASE_DIR / "sender_history.json"
+_HISTORY_KEEP = 5
+_AGENT = "agent"  # history marker: the mail went to the model
+_HISTORY_RULE = "avsändarhistorik"
+_BASE_HEADERS = ["From", "Subject"]
+_BULK_HEADERS = ["List-Unsubscribe", "List-Id", "Precedence", "Auto-Submitted"]
+_BULK_PRECEDENCE_RE = re.compile(r"^(bulk|list|junk)$", re.IGNORECASE)
+_NO_REPLY_RE = re.compile(r"(no-?reply|do-?not-?reply|notifications?|notiser|mailer-daemon|postmaster)@", re.IGNORECASE)
+# How long "the user has never written to this sender" is trusted before asking Gmail again.
+_REPLIED_RECHECK_SECONDS = 24 * 3600
+
+
+def _load_rules() -> Dict[str, Any]:
+    rules_file = BASE_DIR / "triage_rules.json"
+    if not rules_file.exists():
+        rules_file = BASE_DIR / "triage_rules.default.json"
+    try:
+        return json.loads(rules_file.read_text(encoding="utf-8"))
+    except Exception as e:
+        print(f"⚠️ Could not load triage rules {rules_file}: {e}")
+        return {"rules": []}
+
+
+def _domain_matches(domain: str, domains: List[str]) -> bool:
+    return any(domain == d or domain.endswith("." + d) for d in domains)
+
+
+def _is_bulk(headers: Dict[str, str], address: str) -> bool:
+    """Whether the mail carries a list/bulk/auto header or comes from a no-reply sender."""
+    return bool(
+        headers.get("List-Unsubscribe")
+        or headers.get("List-Id")
+        or _BULK_PRECEDENCE_RE.match(headers.get("Precedence", "").strip())
+        or headers.get("Auto-Submitted", "").strip().lower().startswith("auto-")
+        or _NO_REPLY_RE.search(address)
+    )
+
+
+class FastPathClassifier:
+    def __init__(self, rules: Optional[Dict[str, Any]] = None, history_path=SENDER_HISTORY_FILE):
+        config = rules if rules is not None else _load_rules()
+        self.rules: List[Dict[str, Any]] = []
+        rules = [rule for rule in config.get("rules", []) if rule.get("enabled", True)]
+        for rule in rules:
+            compiled = dict(rule)
+            for key in ("from", "subject", "not_subject"):
+                if key in rule:
+                    compiled[key] = re.compile(rule[key], re.IGNORECASE)
+            if "header_values" in rule:
+                compiled["header_values"] = {
+                    name: re.compile(pattern, re.IGNORECASE) for name, pattern in rule["header_values"].items()
+                }
+            self.rules.append(compiled)
+        never = config.get("never", {})
+        self.never_from = [s.lower() for s in never.get("from", [])]
+        self.never_domains = [d.lower() for d in never.get("domains", [])]
+
+        # Only the headers some rule looks at are fetched.
+        names = set(_BASE_HEADERS)
+        for rule in rules:
+            names.update(rule.get("headers", []))
+            names.update(rule.get("header_values", {}))
+            if rule.get("bulk"):
+                names.update(_BULK_HEADERS)
+        self.headers = sorted(names)
+
+        self.history_path = history_path
+        self._history: Dict[str, List[str]] = self._load_history()
+        # address -> (has the user written to it, when that was checked)
+        self._replied: Dict[str, Tuple[bool, float]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.total = 0
+
+    def _load_history(self) -> Dict[str, List[str]]:
+        if not self.history_path.exists():
+            return {}
+        try:
+            return json.loads(self.history_path.read_text(encoding="utf-8"))
+        except Exception as e:
+            print(f"⚠️ Could not load sender history: {e}")
+            return {}
+
+    def _save_history(self) -> None:
+        tmp = self.history_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self._history, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(self.history_path)
+
+    def _match(self, rule: Dict[str, Any], headers: Dict[str, str], address: str, domain: str) -> bool:
+        if "headers" in rule and not any(headers.get(name) for name in rule["headers"]):
+            return False
+        for name, pattern in rule.get("header_values", {}).items():
+            if not pattern.search(headers.get(name, "")):
+                return False
+        if "from" in rule and not rule["from"].search(address):
+            return False
+        if "domains" in rule and not _domain_matches(domain, rule["domains"]):
+            return False
+        if "subject" in rule and not rule["subject"].search(headers.get("Subject", "")):
+            return False
+        if "not_subject" in rule and rule["not_subject"].search(headers.get("Subject", "")):
+            return False
+        if rule.get("bulk") and not _is_bulk(headers, address):
+            return False
+        return True
+
+    def classify(self, headers: Dict[str, str]) -> Optional[Dict[str, str]]:
+        """{"rule", "category", "label"} for a fast-path mail, None if the agent should decide."""
+        address = parseaddr(headers.get("From", ""))[1].lower()
+        domain = address.rpartition("@")[2]
+        if any(s in address for s in self.never_from) or _domain_matches(domain, self.never_domains):
+            return None
+        for rule in self.rules:
+            if self._match(rule, headers, address, domain):
+                return {"rule": rule["name"], "category": rule["category"], "label": rule.get("label", "")}
+        with self._lock:
+            recent = self._history.get(address, [])[-SENDER_HISTORY_MIN:]
+        if SENDER_HISTORY_MIN and len(recent) == SENDER_HISTORY_MIN and len(set(recent)) == 1:
+            category, label = recent[0].split("|", 1) if "|" in recent[0] else (recent[0], "")
+            if category != _AGENT:
+                return {"rule": _HISTORY_RULE, "category": category, "label": label}
+        return None
+
+    def _check_replied(self, service, addresses: List[str]) -> Dict[str, bool]:
+        """
+        Whether the user has sent mail to each address (cached; positives for good).
+        Uncached addresses are looked up with one batch HTTP request per GMAIL_BATCH_SIZE.
+        """
+        now = time.time()
+        replied: Dict[str, bool] = {}
+        missing: List[str] = []
+        with self._lock:
+            for address in dict.fromkeys(addresses):
+                cached = self._replied.get(address)
+                if cached and (cached[0] or now - cached[1] < _REPLIED_RECHECK_SECONDS):
+                    replied[address] = cached[0]
+                else:
+                    missing.append(address)
+
+        def on_response(request_id, response, exception):
+            address = missing[int(request_id)]
+            if exception is not None:
+                # Unknown: treat as a correspondent, i.e. let the agent decide.
+                print(f"⚠️ Could not check sent mail to {address}: {exception}")
+                replied[address] = True
+                return
+            replied[address] = bool((response or {}).get("messages"))
+            with self._lock:
+                self._replied[address] = (replied[address], now)
+
+        for start in range(0, len(missing), GMAIL_BATCH_SIZE):
+            batch = service.new_batch_http_request(callback=on_response)
+            for i in range(start, min(start + GMAIL_BATCH_SIZE, len(missing))):
+                batch.add(
+                    service.users().messages().list(userId="me", q=f"in:sent to:{missing[i]}", maxResults=1),
+                    request_id=str(i),
+                )
+            try:
+                batch.execute()
+            except Exception as e:
+                print(f"⚠️ Could not check sent mail: {e}")
+                for address in missing[start:start + GMAIL_BATCH_SIZE]:
+                    replied.setdefault(address, True)
+        return replied
+
+    def classify_batch(self, service, message_ids: List[str]) -> Tuple[Dict[str, Dict[str, str]], List[str]]:
+        """
+        Classify a whole batch from one batched metadata fetch.
+        Returns (fast-path decisions by message id, ids left for the agent, in input order).
+        """
+        messages = _batch_get_messages(service, message_ids, metadata_headers=self.headers)
+        classified = []
+        for msg in messages:
+            headers = _headers_map(msg.get("payload", {}).get("headers", []))
+            address = parseaddr(headers.get("From", ""))[1].lower()
+            classified.append((msg, headers, address, self.classify(headers)))
+        # Every fast-path sender needs the "has the user written to it" check; do them all at once.
+        replied = self._check_replied(service, [address for _, _, address, decision in classified if decision and address])
+
+        decisions: Dict[str, Dict[str, str]] = {}
+        for msg, headers, address, decision in classified:
+            if decision and decision["rule"] == _HISTORY_RULE and replied.get(address, True):
+                decision = None
+            if decision:
+                decisions[msg["id"]] = {**decision, "from": headers.get("From", ""), "subject": headers.get("Subject", "")}
+            if not address:
+                continue
+            if decision is None:
+                entry = _AGENT
+            elif decision["rule"] == _HISTORY_RULE or replied.get(address, True):
+                # The history only learns from rule hits on senders the user doesn't write to.
+                continue
+            else:
+                entry = f"{decision['category']}|{decision['label']}"
+            with self._lock:
+                self._history[address] = (self._history.get(address, []) + [entry])[-_HISTORY_KEEP:]
+        with self._lock:
+            self.total += len(message_ids)
+            self.hits += len(decisions)
+            try:
+                self._save_history()
+            except Exception as e:
+                print(f"⚠️ Could not save sender history: {e}")
+        # Ids the metadata fetch failed on go to the agent, which reports them.
+        return decisions, [mid for mid in message_ids if mid not in decisions]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "total": self.total,
+                "hit_rate": round(self.hits / self.total, 3) if self.total else 0.0,
+            }
+
+
+_classifier: Optional[FastPathClassifier] = None
+_classifier_lock = threading.Lock()
+
+
+def get_fast_path_classifier() -> FastPathClassifier:
+    """Return the process-wide fast-path classifier."""
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None:
+            _classifier = FastPathClassifier()
+        return _classifier
@@ -0,0 +1,197 @@
+import asyncio
+import signal
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from config import WATCH_BACKOFF, WATCH_BATCH_WINDOW, WATCH_MAX_INTERVAL, WATCH_MIN_INTERVAL
+
+# Long-lived watch mode. The whole session runs on one event loop, so the agent
+# registry, the model clients and the pooled Google clients are built once and
+# stay warm between polls instead of being rebuilt by a new asyncio.run per run.
+#
+# The poll interval adapts: an idle poll multiplies it by `backoff` (up to
+# `maximum`), a poll that finds mail drops it to `minimum`. When mail is found
+# the daemon keeps polling every `batch_window` seconds while more arrives, so a
+# burst is triaged as one run. Mails a run triaged are acked to the sync engine;
+# the ones it reports as failed are requeued for the next poll (the sync engine
+# gives up on a mail after a few attempts). Retried mails are not new mail: they
+# don't reset the interval, and a run of only retries doesn't count against the
+# safety limits. SIGINT/SIGTERM stop it after the current run; a second signal
+# cancels the run and hands its mails back to the sync engine.
+
+
+class AdaptiveInterval:
+    def __init__(
+        self,
+        initial: float,
+        minimum: float = WATCH_MIN_INTERVAL,
+        maximum: float = WATCH_MAX_INTERVAL,
+        backoff: float = WATCH_BACKOFF,
+    ):
+        self.minimum = max(0.0, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.backoff = max(1.0, backoff)
+        self.current = min(max(initial, self.minimum), self.maximum)
+
+    def next(self, new_mails: int) -> float:
+        """Seconds to wait before the next poll, given how many mails the last one found."""
+        if new_mails:
+            self.current = self.minimum
+        else:
+            self.current = min(self.maximum, self.current * self.backoff) if self.current else self.maximum
+        return self.current
+
+
+class Watchdog:
+    def __init__(
+        self,
+        poll: Callable[[], Awaitable[List[str]]],
+        triage: Callable[[List[str]], Awaitable[Optional[List[str]]]],
+        requeue: Callable[[List[str], bool], None],
+        limit: int,
+        interval: AdaptiveInterval,
+        batch_window: float = WATCH_BATCH_WINDOW,
+        safety: Optional[Any] = None,
+        ack: Optional[Callable[[List[str]], None]] = None,
+        is_retry: Optional[Callable[[str], bool]] = None,
+    ):
+        self._poll = poll
+        self._triage = triage
+        self._requeue = requeue
+        self._ack = ack
+        self._is_retry = is_retry or (lambda message_id: False)
+        self.limit = max(1, limit)
+        self.interval = interval
+        self.batch_window = batch_window
+        self.safety = safety
+        self._stop: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.polls = 0
+        self.runs = 0
+        self.mails = 0
+        self.failures = 0
+
+    @property
+    def stopping(self) -> bool:
+        return self._stop is not None and self._stop.is_set()
+
+    def stop(self) -> None:
+        """Finish the current run and exit; called a second time, cancel the run."""
+        if self._stop is None:
+            return
+        if self._stop.is_set():
+            if self._task is not None:
+                self._task.cancel()
+            return
+        print("\n🛑 Watchdog stoppas efter pågående körning (signalera igen för att avbryta direkt)...")
+        self._stop.set()
+
+    async def run(self) -> None:
+        self._stop = asyncio.Event()
+        self._task = asyncio.current_task()
+        installed = self._install_signal_handlers()
+        try:
+            while not self.stopping:
+                if self.safety is not None and not self.safety.check_limits():
+                    print("🛑 Circuit Breaker triggered. Waiting (60s)...")
+                    await self._sleep(60)
+                    continue
+
+                message_ids = await self._collect()
+                new_mails = sum(not self._is_retry(mid) for mid in message_ids)
+                if message_ids:
+                    await self._triage_chunks(message_ids)
+                delay = self.interval.next(new_mails)
+                if message_ids and not self.stopping:
+                    print(f"🐕 Nästa koll om {delay:g}s.")
+                await self._sleep(delay)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            loop = asyncio.get_running_loop()
+            for sig in installed:
+                loop.remove_signal_handler(sig)
+        print(f"🛑 Watchdog stoppad: {self.polls} kontroller, {self.runs} körningar, {self.mails} mail.")
+
+    def _install_signal_handlers(self) -> List[int]:
+        loop = asyncio.get_running_loop()
+        installed = []
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+                installed.append(sig)
+            except (NotImplementedError, RuntimeError):
+                # Windows: Ctrl+C still arrives as KeyboardInterrupt from asyncio.run.
+                pass
+        return installed
+
+    async def _sleep(self, seconds: float) -> None:
+        """Sleep, but wake up immediately when the daemon is asked to stop."""
+        try:
+            await asyncio.wait_for(self._stop.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _poll_once(self) -> List[str]:
+        self.polls += 1
+        try:
+            return await self._poll()
+        except Exception as e:
+            print(f"Watchdog Error during check: {e}")
+            return []
+
+    async def _collect(self) -> List[str]:
+        """Poll; while mail keeps arriving within the batch window, keep adding it to the run."""
+        message_ids = await self._poll_once()
+        if not message_ids:
+            return []
+        while self.batch_window > 0 and len(message_ids) < self.limit and not self.stopping:
+            await self._sleep(self.batch_window)
+            more = await self._poll_once()
+            if not more:
+                break
+            message_ids = list(dict.fromkeys(message_ids + more))
+        return message_ids
+
+    async def _triage_chunks(self, message_ids: List[str]) -> None:
+        print(f"\n📨 Hittade {len(message_ids)} nya olästa mail! Väckte agenten...")
+        # Triage in chunks of `limit`; hand failed or unstarted chunks back to the sync engine.
+        for start in range(0, len(message_ids), self.limit):
+            if self.stopping and start:
+                self._requeue(message_ids[start:], False)
+                return
+            chunk = message_ids[start:start + self.limit]
+            rest = message_ids[start + self.limit:]
+            only_retries = all(self._is_retry(mid) for mid in chunk)
+            try:
+                failed = await self._triage(chunk) or []
+            except asyncio.CancelledError:
+                self._requeue(chunk, True)
+                self._requeue(rest, False)
+                raise
+            except Exception as e:
+                print(f"❌ Fel under triage-körning: {e}")
+                import traceback
+                traceback.print_exc()
+                self.failures += 1
+                self._requeue(chunk, True)
+                self._requeue(rest, False)
+                return
+            if self._ack is not None:
+                failed_ids = set(failed)
+                self._ack([mid for mid in chunk if mid not in failed_ids])
+            if failed:
+                self._requeue(failed, True)
+            self.runs += 1
+            self.mails += len(chunk) - len(failed)
+            # RECORD SUCCESS for safety limits (retries alone must not trip the breaker)
+            if self.safety is not None and not only_retries:
+                self.safety.record_run()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "polls": self.polls,
+            "runs": self.runs,
+            "mails": self.mails,
+            "failures": self.failures,
+            "interval": self.interval.current,
+        }